@@ -0,0 +1,82 @@
+import sys
+import time
+import random
+import difflib
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.parse_hh.areas_index import load_area_resolver_from_file, build_fuzzy_index
+
+
+
+AREAS_PATH = Path(__file__).resolve().parent.parent / 'src' / 'parse_hh' / 'areas.json'
+ALPHABET = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+
+
+def make_typo(rng: random.Random, s: str) -> str:
+    '''одна случайная опечатка: пропуск, замена, вставка или перестановка соседних букв'''
+    i = rng.randrange(len(s))
+    kind = rng.choice(['delete', 'replace', 'insert', 'swap'])
+
+    if kind == 'delete':
+        return s[:i] + s[i + 1:]
+    if kind == 'replace':
+        return s[:i] + rng.choice(ALPHABET) + s[i + 1:]
+    if kind == 'insert':
+        return s[:i] + rng.choice(ALPHABET) + s[i:]
+
+    i = min(i, len(s) - 2)
+    return s[:i] + s[i + 1] + s[i] + s[i + 2:]
+
+
+def measure(fn, queries):
+    timings, results = [], []
+
+    for q in queries:
+        start = time.perf_counter()
+        results.append(fn(q))
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return timings, results
+
+
+def report(title, timings):
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95)]
+    print(f'{title:>10}: mean {statistics.mean(timings):8.3f} ms  p50 {statistics.median(timings):8.3f} ms  p95 {p95:8.3f} ms')
+
+
+def run_benchmark(count: int = 200, seed: int = 42):
+    resolver = load_area_resolver_from_file(str(AREAS_PATH))
+
+    # тот же индекс, что опрашивает AreaResolver.match: без латинских ключей транслитерации.
+    # difflib сравнивается на том же списке имен
+    start = time.perf_counter()
+    index = build_fuzzy_index(resolver.all_names)
+    names = index.names
+    print(f'построение триграммного индекса: {(time.perf_counter() - start) * 1000:.1f} ms, имён: {len(names)}')
+
+    rng = random.Random(seed)
+    originals = [n for n in rng.sample(names, count * 2) if len(n) >= 4][:count]
+    queries = [make_typo(rng, n) for n in originals]
+
+    difflib_timings, difflib_results = measure(lambda q: difflib.get_close_matches(q, names, n=3, cutoff=0.75), queries)
+    index_timings, index_results = measure(lambda q: index.search(q, limit=3, cutoff=0.75), queries)
+
+    print(f'\nзапросов с опечаткой: {len(queries)}')
+    report('difflib', difflib_timings)
+    report('trigram', index_timings)
+
+    same_top = sum(1 for a, b in zip(difflib_results, index_results) if a[:1] == b[:1])
+    difflib_recall = sum(1 for o, r in zip(originals, difflib_results) if o in r)
+    index_recall = sum(1 for o, r in zip(originals, index_results) if o in r)
+
+    print(f'\nсовпадение лучшего кандидата: {same_top}/{len(queries)}')
+    print(f'исходное имя среди кандидатов: difflib {difflib_recall}/{len(queries)}, trigram {index_recall}/{len(queries)}')
+    print(f'ускорение (mean): x{statistics.mean(difflib_timings) / statistics.mean(index_timings):.1f}')
+
+
+if __name__ == "__main__":
+    run_benchmark()
\ No newline at end of file
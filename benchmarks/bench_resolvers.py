@@ -0,0 +1,203 @@
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.parse_hh.areas_index import AreaResolver, build_area_resolver_data, normalize_name as area_normalize_name
+from src.parse_hh.metro_index import MetroResolver, build_metro_resolver_data, normalize_name as metro_normalize_name
+from src.parse_hh.resolution import Resolution, EXACT, PART, FUZZY, FALLBACK
+
+
+
+BENCH_DIR = Path(__file__).resolve().parent
+PARSE_HH_DIR = BENCH_DIR.parent / 'src' / 'parse_hh'
+CORPUS_PATH = BENCH_DIR / 'resolver_corpus.json'
+BASELINE_PATH = BENCH_DIR / 'resolver_baseline.json'
+
+KINDS = [EXACT, PART, FUZZY, FALLBACK]
+
+# справочник -> (json, построение резолвера из разобранного json, нормализация ввода)
+DICTIONARIES: dict[str, tuple[Path, Callable[[Any], Any], Callable[[str], str]]] = {
+    'areas': (PARSE_HH_DIR / 'areas.json', lambda raw: AreaResolver(*build_area_resolver_data(raw)), area_normalize_name),
+    'metro': (PARSE_HH_DIR / 'metro.json', lambda raw: MetroResolver(*build_metro_resolver_data(raw)), metro_normalize_name),
+}
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def measure_build(path: Path, build: Callable[[Any], Any], repeat: int) -> tuple[Any, dict[str, float]]:
+    '''лучшее время построения индекса из уже разобранного json и память, которую он занимает (tracemalloc)'''
+    raw = json.loads(path.read_text(encoding='utf-8'))
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resolver = build(raw)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # отдельным проходом: под tracemalloc построение в разы медленнее
+    del resolver
+    tracemalloc.start()
+    resolver = build(raw)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return resolver, {'build_ms': round(min(timings), 2), 'memory_kb': current // 1024, 'peak_memory_kb': peak // 1024}
+
+
+def measure_queries(resolver: Any, normalize: Callable[[str], str], corpus: list[dict[str, Any]], repeat: int) -> dict[str, Any]:
+    '''
+    каждый запрос корпуса - normalize + match без memo (холодный путь), лучший из repeat замеров.
+    замеры идут кругами по всему корпусу, чтобы короткий всплеск нагрузки на машине не задел все замеры одного запроса.
+    задержки группируются по пути, которым найдено совпадение, точность - по категориям корпуса
+    '''
+    timings: list[list[float]] = [[] for _ in corpus]
+    resolutions: list[Resolution] = []
+
+    for _ in range(repeat):
+        resolutions.clear()
+
+        for entry, entry_timings in zip(corpus, timings):
+            start = time.perf_counter()
+            resolutions.append(resolver.match(normalize(entry['input'])))
+            entry_timings.append((time.perf_counter() - start) * 1000)
+
+    latency: dict[str, list[float]] = {kind: [] for kind in KINDS}
+    hits: dict[str, list[bool]] = {}
+    misses = []
+
+    for entry, entry_timings, resolution in zip(corpus, timings, resolutions):
+        latency[resolution.kind].append(min(entry_timings))
+
+        hit = set(resolution.ids) == set(entry['expected'])
+        hits.setdefault(entry['category'], []).append(hit)
+
+        if not hit:
+            misses.append({'input': entry['input'], 'expected': entry['expected'], 'got': list(resolution.ids), 'kind': resolution.kind})
+
+    every = [hit for category in hits.values() for hit in category]
+
+    return {
+        'latency_ms': {
+            kind: {
+                'count': len(values),
+                'p50': round(percentile(sorted(values), 0.5), 4),
+                'p95': round(percentile(sorted(values), 0.95), 4),
+                'p99': round(percentile(sorted(values), 0.99), 4)
+            }
+            for kind, values in latency.items() if values
+        },
+        'accuracy': {
+            'overall': round(sum(every) / len(every), 4),
+            **{category: round(sum(values) / len(values), 4) for category, values in hits.items()}
+        },
+        'misses': misses
+    }
+
+
+def run_benchmark(repeat: int = 5) -> dict[str, Any]:
+    corpus = json.loads(CORPUS_PATH.read_text(encoding='utf-8'))
+    result: dict[str, Any] = {'python': platform.python_version(), 'machine': platform.machine(), 'dictionaries': {}}
+
+    for name, (path, build, normalize) in DICTIONARIES.items():
+        resolver, build_stats = measure_build(path, build, repeat)
+        result['dictionaries'][name] = {**build_stats, 'queries': len(corpus[name]), **measure_queries(resolver, normalize, corpus[name], repeat)}
+
+    return result
+
+
+def report(result: dict[str, Any]) -> None:
+    for name, stats in result['dictionaries'].items():
+        print(f'\n{name}: построение {stats["build_ms"]} ms, память {stats["memory_kb"]} KB (пик {stats["peak_memory_kb"]} KB), запросов {stats["queries"]}')
+
+        for kind, values in stats['latency_ms'].items():
+            print(f'{kind:>10}: n {values["count"]:3}  p50 {values["p50"]:8.4f} ms  p95 {values["p95"]:8.4f} ms  p99 {values["p99"]:8.4f} ms')
+
+        print('  точность: ' + ', '.join(f'{category} {value:.0%}' for category, value in stats['accuracy'].items()))
+
+        for miss in stats['misses']:
+            print(f'    промах {miss["input"]!r}: ожидалось {miss["expected"]}, получено {miss["got"]} ({miss["kind"]})')
+
+
+def compare(result: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    '''
+    регрессии относительно сохраненного baseline: любое падение точности в категории и время
+    (построение, p50/p95 пути совпадения) или память больше baseline * (1 + tolerance).
+    min_delta отсекает шум: p95 по десятку запросов в доли миллисекунды легко скачет в полтора раза
+    '''
+    regressions = []
+
+    def check(label: str, value: float, base: float | None, min_delta: float = 0.0, lower_is_better: bool = True) -> None:
+        if base is None:
+            return
+
+        if lower_is_better:
+            ratio = value / base if base else 1.0
+            print(f'{label:>34}: {base:>10} -> {value:>10}  x{ratio:.2f}')
+
+            if base and value > base * (1 + tolerance) and value - base > min_delta:
+                regressions.append(f'{label}: {base} -> {value}')
+        else:
+            print(f'{label:>34}: {base:>10} -> {value:>10}')
+
+            if value < base:
+                regressions.append(f'{label}: {base} -> {value}')
+
+    for name, stats in result['dictionaries'].items():
+        base = baseline['dictionaries'].get(name)
+        if base is None:
+            continue
+
+        print(f'\n{name} относительно baseline (python {baseline.get("python")}):')
+
+        check(f'{name} build_ms', stats['build_ms'], base.get('build_ms'), min_delta=20.0)
+        check(f'{name} memory_kb', stats['memory_kb'], base.get('memory_kb'), min_delta=256)
+
+        for kind, values in stats['latency_ms'].items():
+            for q in ('p50', 'p95'):
+                check(f'{name} {kind} {q}', values[q], base['latency_ms'].get(kind, {}).get(q), min_delta=0.2)
+
+        for category, value in stats['accuracy'].items():
+            check(f'{name} accuracy {category}', value, base['accuracy'].get(category), lower_is_better=False)
+
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='замеры резолверов areas/metro на корпусе resolver_corpus.json')
+    parser.add_argument('--repeat', type=int, default=5, help='замеров на запрос и построений индекса')
+    parser.add_argument('--save-baseline', action='store_true', help='сохранить результат как новый baseline')
+    parser.add_argument('--check', action='store_true', help='код возврата 1 при регрессии относительно baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='допустимый рост времени и памяти (доля)')
+    args = parser.parse_args()
+
+    result = run_benchmark(args.repeat)
+    report(result)
+
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f'\nbaseline сохранен в {BASELINE_PATH.name}')
+        return 0
+
+    if not BASELINE_PATH.exists():
+        print('\nbaseline нет: python benchmarks/bench_resolvers.py --save-baseline')
+        return 0
+
+    regressions = compare(result, json.loads(BASELINE_PATH.read_text(encoding='utf-8')), args.tolerance)
+
+    if regressions:
+        print('\nрегрессии:\n  ' + '\n  '.join(regressions))
+
+    return 1 if regressions and args.check else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
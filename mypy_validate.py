@@ -20,7 +20,26 @@ def run_mypy_checks():
         ("parse_hh/helpers.py", "src/parse_hh/helpers.py"),
         ("areas_index.py", "src/parse_hh/areas_index.py"),
         ("metro_index.py", "src/parse_hh/metro_index.py"),
+        ("ngram_index.py", "src/parse_hh/ngram_index.py"),
+        ("symspell_index.py", "src/parse_hh/symspell_index.py"),
+        ("geo_index.py", "src/parse_hh/geo_index.py"),
+        ("snapshot.py", "src/parse_hh/snapshot.py"),
+        ("shared_index.py", "src/parse_hh/shared_index.py"),
+        ("resolver_slot.py", "src/parse_hh/resolver_slot.py"),
+        ("memo.py", "src/parse_hh/memo.py"),
+        ("resolution.py", "src/parse_hh/resolution.py"),
+        ("prefix_index.py", "src/parse_hh/prefix_index.py"),
+        ("refresher.py", "src/parse_hh/refresher.py"),
+        ("translit.py", "src/parse_hh/translit.py"),
+        ("crawler.py", "src/parse_hh/crawler.py"),
         ("dependencies.py", "src/parse_hh/dependencies.py"),
+        ("client.py", "src/parse_hh/client.py"),
+        ("cache.py", "src/parse_hh/cache.py"),
+        ("singleflight.py", "src/parse_hh/singleflight.py"),
+        ("rate_limit.py", "src/parse_hh/rate_limit.py"),
+        ("circuit_breaker.py", "src/parse_hh/circuit_breaker.py"),
+        ("hedging.py", "src/parse_hh/hedging.py"),
+        ("hh_stub.py", "src/parse_hh/hh_stub.py"),
         ("api.py", "src/api.py")
     ]
 
@@ -1,5 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional, Annotated
+
+from .exceptions import bad_page_range_exc
 
 
 
@@ -35,6 +37,45 @@ class AuthGetVacanciesModel(BaseModel):
     responses_count_enabled: Optional[bool] = True
 
 
+class AuthGetAllVacanciesModel(AuthGetVacanciesModel):
+    per_page: Optional[int] = 100
+    page_to: Optional[int] = Field(None, ge=0)  # последняя страница (включительно), по умолчанию - все доступные
+    max_items: Optional[int] = Field(None, ge=1)  # сколько вакансий нужно набрать
+    region: Optional[str] = None  # регион (как area), вне которого вакансии отбрасываются после загрузки
+
+    @model_validator(mode='after')
+    def check_page_range(self) -> 'AuthGetAllVacanciesModel':
+        if self.page_to is not None and self.page_to < (self.page or 0):
+            raise bad_page_range_exc
+        return self
+
+
+class VacancyDetailsRequest(BaseModel):
+    ids: list[Annotated[str, Field(pattern=r'^\d+$')]] = Field(min_length=1, max_length=100)
+
+
+class SuggestModel(BaseModel):
+    q: str = Field(min_length=1, max_length=100)
+    limit: int = Field(10, ge=1, le=50)
+
+
+class NearbyMetroModel(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+    radius_km: Optional[float] = Field(None, gt=0, le=50)  # без радиуса - limit ближайших станций
+    limit: int = Field(10, ge=1, le=50)
+
+
+class CrawledVacanciesModel(BaseModel):
+    offset: int = Field(0, ge=0)
+    limit: int = Field(100, ge=1, le=1000)
+
+
+class ResolveBatchRequest(BaseModel):
+    areas: list[Annotated[str, Field(max_length=200)]] = Field(default_factory=list, max_length=1000)
+    metro: list[Annotated[str, Field(max_length=200)]] = Field(default_factory=list, max_length=1000)
+
+
 class AddVacancyRequest(BaseModel):
     name: str
     experience: str
@@ -1,6 +1,6 @@
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
 
 import os
@@ -44,6 +44,179 @@ class DBSettings(BaseSettings):
 db_settings = DBSettings()
 
 
+class HHClientSettings(BaseSettings):
+    '''настройки общего httpx-клиента для API HH (переменные окружения с префиксом HH_)'''
+    model_config = SettingsConfigDict(env_prefix='HH_')
+
+    base_url: str = 'https://api.hh.ru'  # для нагрузочных тестов - адрес hh_stub
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False  # требует установленного пакета h2
+
+    connect_timeout: float = 5.0
+    read_timeout: float = 10.0
+    write_timeout: float = 5.0
+    pool_timeout: float = 5.0
+
+    passthrough: bool = True  # отдавать тело ответа HH клиенту без разбора json
+
+    fanout_concurrency: int = 5  # одновременных запросов страниц в /authenticated/get_vacancies/all
+    details_concurrency: int = 10  # одновременных запросов /vacancies/{id} в /authenticated/get_vacancies/details
+
+hh_client_settings = HHClientSettings()
+
+
+class CacheSettings(BaseSettings):
+    '''настройки кэша поиска вакансий (переменные окружения с префиксом HH_CACHE_)'''
+    model_config = SettingsConfigDict(env_prefix='HH_CACHE_')
+
+    max_entries: int = 1024
+    max_bytes: int = 64 * 1024 * 1024
+    ttl: float = 60.0
+    stale_ttl: float = 300.0  # сколько после ttl запись еще отдается, пока обновляется в фоне
+
+cache_settings = CacheSettings()
+
+
+class DetailCacheSettings(CacheSettings):
+    '''кэш описаний вакансий: они меняются редко, поэтому ttl долгий (префикс HH_DETAIL_CACHE_)'''
+    model_config = SettingsConfigDict(env_prefix='HH_DETAIL_CACHE_')
+
+    max_entries: int = 4096
+    ttl: float = 6 * 60 * 60
+    stale_ttl: float = 60 * 60
+
+detail_cache_settings = DetailCacheSettings()
+
+
+class RateLimitSettings(BaseSettings):
+    '''лимит запросов к API HH под одним ACCESS_TOKEN (переменные окружения с префиксом HH_RATE_)'''
+    model_config = SettingsConfigDict(env_prefix='HH_RATE_')
+
+    rate: float = 10.0  # запросов в секунду
+    burst: int = 20
+    queue_timeout: float = 10.0  # сколько запрос может ждать токен (с учетом повторов), прежде чем упасть
+
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+
+rate_limit_settings = RateLimitSettings()
+
+
+class CircuitBreakerSettings(BaseSettings):
+    '''circuit breaker для API HH (переменные окружения с префиксом HH_BREAKER_)'''
+    model_config = SettingsConfigDict(env_prefix='HH_BREAKER_')
+
+    window: float = 30.0  # скользящее окно в секундах
+    min_calls: int = 20  # меньше вызовов в окне - breaker не срабатывает
+    failure_rate: float = 0.5
+    slow_call_seconds: float = 5.0
+    slow_call_rate: float = 0.8
+    open_seconds: float = 15.0
+    half_open_calls: int = 3
+
+circuit_breaker_settings = CircuitBreakerSettings()
+
+
+class HedgingSettings(BaseSettings):
+    '''hedged requests к API HH (переменные окружения с префиксом HH_HEDGE_)'''
+    model_config = SettingsConfigDict(env_prefix='HH_HEDGE_')
+
+    enabled: bool = False
+    sample_size: int = 200
+    min_samples: int = 20
+    min_delay: float = 0.05
+
+hedging_settings = HedgingSettings()
+
+
+class HHStubSettings(BaseSettings):
+    '''поведение локальной замены API HH (parse_hh/hh_stub.py), префикс HH_STUB_'''
+    model_config = SettingsConfigDict(env_prefix='HH_STUB_')
+
+    latency_median_ms: float = 50.0  # задержка распределена логнормально
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0  # доля ответов 500/502/503
+    throttle_rate: float = 0.0  # доля ответов 429
+    retry_after: int = 1
+    not_found_rate: float = 0.0  # доля 404 на /vacancies/{id}
+
+    max_found: int = 5000
+    snippet_bytes: int = 200
+    description_bytes: int = 3000
+    public_url: str = 'http://localhost:10001'
+    data_dir: str | None = None  # каталог с areas.json/metro.json для /areas и /metro, по умолчанию - parse_hh
+
+hh_stub_settings = HHStubSettings()
+
+
+class SnapshotSettings(BaseSettings):
+    '''бинарные снапшоты индексов areas/metro (переменные окружения с префиксом HH_SNAPSHOT_)'''
+    model_config = SettingsConfigDict(env_prefix='HH_SNAPSHOT_')
+
+    enabled: bool = True
+    dir: str | None = None  # по умолчанию - parse_hh/snapshots рядом с json
+    shared: bool = False  # индексы в отображаемом в память файле, общем для всех воркеров (parse_hh/shared_index.py)
+
+snapshot_settings = SnapshotSettings()
+
+
+class ResolveMemoSettings(BaseSettings):
+    '''LRU-memo результатов resolve() справочников areas/metro (переменные окружения с префиксом HH_RESOLVE_MEMO_)'''
+    model_config = SettingsConfigDict(env_prefix='HH_RESOLVE_MEMO_')
+
+    max_entries: int = 4096  # на каждый уровень (raw и normalized) каждого справочника; 0 - без memo
+    max_scopes: int = 64  # наборов городов метро с отдельными memo и индексом опечаток
+    scope_max_entries: int = 256  # memo одного набора городов, на каждый уровень
+
+resolve_memo_settings = ResolveMemoSettings()
+
+
+class ResolverLoadSettings(BaseSettings):
+    '''загрузка справочников areas/metro при старте (переменные окружения с префиксом HH_RESOLVERS_)'''
+    model_config = SettingsConfigDict(env_prefix='HH_RESOLVERS_')
+
+    background: bool = True  # грузить в потоке, пока сервер уже принимает запросы
+    lazy_metro: bool = False  # метро - только при первом запросе, которому оно нужно
+    wait_timeout: float = 10.0  # сколько запрос ждет еще не загруженный справочник, прежде чем получить 503
+
+resolver_load_settings = ResolverLoadSettings()
+
+
+class RefreshSettings(BaseSettings):
+    '''фоновое обновление справочников areas/metro из API HH (переменные окружения с префиксом HH_REFRESH_)'''
+    model_config = SettingsConfigDict(env_prefix='HH_REFRESH_')
+
+    enabled: bool = False
+    interval: float = 6 * 3600.0  # секунд между проверками; запрос условный, неизменившийся справочник - это 304
+    watch_interval: float = 30.0  # как часто воркер проверяет, не обновил ли (или откатил) справочник другой воркер
+    dir: str | None = None  # куда сохраняются скачанные json, по умолчанию - parse_hh/dictionaries
+    max_removed_share: float = 0.2  # если из справочника пропала большая доля id, новая версия не применяется
+
+refresh_settings = RefreshSettings()
+
+
+class CrawlerSettings(BaseSettings):
+    '''фоновые задания обхода всех страниц поиска (переменные окружения с префиксом HH_CRAWLER_)'''
+    model_config = SettingsConfigDict(env_prefix='HH_CRAWLER_')
+
+    enabled: bool = True
+    workers: int = 2  # заданий одновременно в одном процессе
+    page_concurrency: int = 3  # одновременных запросов страниц одного задания (общий лимит запросов - HH_RATE_*)
+    per_page: int = 100  # максимум API HH: 20 страниц до предела в 2000 вакансий
+    poll_interval: float = 5.0  # как часто свободный воркер ищет задания, созданные другими процессами
+    heartbeat_timeout: float = 120.0  # задание running без отметки дольше этого считается брошенным и подхватывается
+    heartbeat_interval: float = 30.0  # как часто воркер обновляет отметку задания, пока оно обходится (меньше heartbeat_timeout)
+    page_attempts: int = 3  # попыток на страницу при лимитере, открытом breaker и сетевых ошибках
+    retry_delay: float = 2.0  # пауза перед повтором страницы, секунд (растет с каждой попыткой)
+    max_active_per_user: int = 3  # ожидающих и выполняемых заданий одного пользователя одновременно
+
+crawler_settings = CrawlerSettings()
+
+
 def configure_logging(level: int = logging.INFO):
     logging.basicConfig(
         level=level,
@@ -1,7 +1,9 @@
-from sqlalchemy import String, ForeignKey
+from sqlalchemy import String, ForeignKey, DateTime, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase, relationship
 
 from datetime import datetime
+from typing import Any, Optional
 
 
 class Base(DeclarativeBase):
@@ -17,6 +19,9 @@ class User(Base):
     password: Mapped[str] = mapped_column(String(1024), nullable=False)
 
     vacancies: Mapped[list["Vacancy"]] = relationship("Vacancy", back_populates="user", cascade="all, delete-orphan")
+    crawl_jobs: Mapped[list["CrawlJob"]] = relationship(
+        "CrawlJob", back_populates="user", cascade="all, delete-orphan", passive_deletes=True
+    )
 
 
 class Vacancy(Base):
@@ -34,4 +39,36 @@ class Vacancy(Base):
     premium: Mapped[bool] = mapped_column(nullable=False)
 
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
-    user: Mapped[User] = relationship("User", back_populates="vacancies")
\ No newline at end of file
+    user: Mapped[User] = relationship("User", back_populates="vacancies")
+
+
+class CrawlJob(Base):
+    __tablename__ = 'crawl_jobs'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, index=True)  # pending / running / done / failed / cancelled
+    query_params: Mapped[dict[str, Any]] = mapped_column(JSONB, nullable=False)  # параметры поиска HH, разрешенные при создании
+    pages: Mapped[Optional[int]] = mapped_column(nullable=True)  # сколько страниц обходится; известно после первой
+    found: Mapped[Optional[int]] = mapped_column(nullable=True)
+    pages_done: Mapped[int] = mapped_column(nullable=False, default=0)  # страницы [0, pages_done) уже в базе
+    items_count: Mapped[int] = mapped_column(nullable=False, default=0)
+    error: Mapped[Optional[str]] = mapped_column(nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    claimed_by: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)  # токен аренды воркера, который обходит задание
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    user: Mapped[User] = relationship("User", back_populates="crawl_jobs")
+
+
+class CrawledVacancy(Base):
+    __tablename__ = 'crawled_vacancies'
+    __table_args__ = (UniqueConstraint('job_id', 'hh_id'),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    hh_id: Mapped[str] = mapped_column(String(32), nullable=False)
+    page: Mapped[int] = mapped_column(nullable=False)
+    data: Mapped[dict[str, Any]] = mapped_column(JSONB, nullable=False)  # вакансия из выдачи HH как есть
+
+    job_id: Mapped[int] = mapped_column(ForeignKey("crawl_jobs.id", ondelete="CASCADE"), nullable=False)
\ No newline at end of file
@@ -59,4 +59,54 @@ user_exists_exc = HTTPException(
 api_hh_exc = HTTPException(
     status_code=status.HTTP_400_BAD_REQUEST,
     detail='Ошибка подключения к API HH'
+)
+
+
+hh_rate_limit_exc = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail='Превышен лимит запросов к API HH. Попробуйте позже.',
+    headers={'Retry-After': '1'}
+)
+
+
+hh_unavailable_exc = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail='API HH временно недоступно. Попробуйте позже.',
+    headers={'Retry-After': '15'}
+)
+
+
+resolver_not_ready_exc = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail='Справочник регионов или метро еще загружается. Попробуйте позже.',
+    headers={'Retry-After': '1'}
+)
+
+unknown_dictionary_exc = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail='Неизвестный справочник. Доступны areas и metro.'
+)
+
+
+no_previous_dictionary_exc = HTTPException(
+    status_code=status.HTTP_409_CONFLICT,
+    detail='Справочник не обновлялся или уже откачен: предыдущей версии нет.'
+)
+
+
+crawl_job_not_found_exc = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail='Задание обхода не найдено.'
+)
+
+
+too_many_crawl_jobs_exc = HTTPException(
+    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+    detail='Слишком много незавершенных заданий обхода. Дождитесь их завершения или отмените одно из них.'
+)
+
+
+bad_page_range_exc = HTTPException(
+    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    detail='page_to не может быть меньше page.'
 )
\ No newline at end of file
@@ -6,8 +6,12 @@ import logging
 from pathlib import Path
 
 from .database.database import create_db_and_tables
-from .parse_hh import load_area_resolver_from_file, load_metro_resolver_from_file
-from .config import configure_logging
+from .parse_hh import (
+    load_area_resolver_from_file, load_metro_resolver_from_file, metro_city_station_counts, ResolverSlot,
+    AreaResolver, DictionaryRefresher, dictionary_path, CrawlerPool, CrawlJobStore,
+    create_hh_client, TTLCache, SingleFlight, TokenBucket, CircuitBreaker, Hedger
+)
+from .config import configure_logging, detail_cache_settings, resolver_load_settings, refresh_settings, crawler_settings
 
 from .auth import router as auth_router
 from .templates import router as templates_router
@@ -22,14 +26,72 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.area_resolver = load_area_resolver_from_file(str(Path(__file__).resolve().parent / "parse_hh" / "areas.json"))
-    logger.info('преобразователь areas в id загружен')
-    
-    app.state.metro_resolver = load_metro_resolver_from_file(str(Path(__file__).resolve().parent / "parse_hh" / "metro.json"))
-    logger.info('преобразователь metro в id загружен')
+    parse_hh_dir = Path(__file__).resolve().parent / "parse_hh"
+
+    # справочники грузятся в потоке, пока сервер уже принимает запросы; зависимости ждут их с таймаутом.
+    # города с метро поднимаются в подсказках areas тем выше, чем больше в них станций.
+    # json берется скачанный фоновым обновлением, если он есть, иначе лежащий в репозитории
+    def load_areas(path: str) -> AreaResolver:
+        return load_area_resolver_from_file(
+            path, weights=metro_city_station_counts(str(dictionary_path('metro', parse_hh_dir)))
+        )
+
+    loaders = {'areas': load_areas, 'metro': load_metro_resolver_from_file}
+
+    app.state.area_resolver = ResolverSlot('areas', lambda: load_areas(str(dictionary_path('areas', parse_hh_dir))))
+    app.state.metro_resolver = ResolverSlot(
+        'metro', lambda: load_metro_resolver_from_file(str(dictionary_path('metro', parse_hh_dir))),
+        lazy=resolver_load_settings.lazy_metro
+    )
+
+    eager = [slot for slot in (app.state.area_resolver, app.state.metro_resolver) if not slot.lazy]
+
+    for slot in eager:
+        slot.start()
+
+    if not resolver_load_settings.background:
+        for slot in eager:
+            await slot.get()
+
+    app.state.hh_rate_limiter = TokenBucket.from_settings()
+    app.state.hh_breaker = CircuitBreaker()
+    app.state.hh_hedger = Hedger()
+    app.state.hh_client = create_hh_client(
+        rate_limiter=app.state.hh_rate_limiter, breaker=app.state.hh_breaker, hedger=app.state.hh_hedger
+    )
+    logger.info('клиент API HH создан')
+
+    app.state.dictionary_refresher = DictionaryRefresher(
+        app.state.hh_client, {'areas': app.state.area_resolver, 'metro': app.state.metro_resolver}, loaders, parse_hh_dir
+    )
+
+    if refresh_settings.enabled:
+        app.state.dictionary_refresher.start()
+
+    app.state.vacancies_cache = TTLCache.from_settings()
+    app.state.vacancy_details_cache = TTLCache.from_settings(detail_cache_settings)
+    app.state.vacancies_flight = SingleFlight()
 
     await create_db_and_tables()
-    yield
+
+    # задания обхода, прерванные прошлой остановкой, воркеры подхватят сами: они в базе со своими pages_done
+    app.state.crawl_job_store = CrawlJobStore()
+    app.state.crawler_pool = CrawlerPool(app.state.hh_client, app.state.crawl_job_store)
+
+    if crawler_settings.enabled:
+        app.state.crawler_pool.start()
+
+    try:
+        yield
+    finally:
+        await app.state.crawler_pool.aclose()
+        await app.state.dictionary_refresher.aclose()
+        await app.state.area_resolver.aclose()
+        await app.state.metro_resolver.aclose()
+        await app.state.vacancies_cache.aclose()
+        await app.state.vacancy_details_cache.aclose()
+        await app.state.hh_client.aclose()
+        logger.info('клиент API HH закрыт')
 
 
 app = FastAPI(title='parser_hh', lifespan=lifespan)
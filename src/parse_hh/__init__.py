@@ -1,26 +1,75 @@
 __all__ = [
-    'router', 'get_vacancies', 'auth_get_vacancies', 'get_metro', 'get_areas',
+    'router', 'get_vacancies', 'auth_get_vacancies', 'auth_get_all_vacancies', 'auth_get_vacancy_details',
+    'get_metro', 'get_areas', 'suggest_areas', 'suggest_metro', 'nearby_metro',
     'map_education', 'map_employment_form', 'map_experience', 'map_schedule', 'map_work_format',
-    'create_query_params', 'auth_create_query_params',
+    'create_query_params', 'auth_create_query_params', 'build_params_for_httpx', 'filter_by_region',
     'normalize_name', 'build_area_index', 'choose_best_candidate', 'load_area_resolver_from_file',
-    'AreaResolver', 'FALLBACK_IDS', 'PREFIXES_RE', 'NON_ALNUM_RE',
-    'get_area_resolver', 'get_metro_resolver',
+    'AreaResolver', 'AreaTable', 'FALLBACK_IDS', 'PREFIXES_RE', 'NON_ALNUM_RE',
+    'get_area_resolver', 'get_metro_resolver', 'get_hh_client',
+    'create_hh_client', 'fetch_upstream', 'UpstreamResponse', 'fetch_cached', 'fetch_vacancies',
+    'fetch_vacancies_pages', 'fetch_vacancy_details', 'HH_MAX_DEPTH',
+    'get_vacancies_cache', 'get_vacancy_details_cache', 'TTLCache', 'CacheEntry', 'make_cache_key',
+    'get_vacancies_flight', 'SingleFlight',
+    'get_hh_rate_limiter', 'TokenBucket', 'RateLimitedTransport', 'RateLimitExceeded', 'parse_retry_after',
+    'get_hh_breaker', 'CircuitBreaker', 'CircuitBreakerTransport', 'CircuitOpenError',
+    'get_hh_hedger', 'Hedger', 'HedgingTransport',
     'metro_normalize_name', 'build_metro_index', 'metro_choose_best_candidate',
-    'load_metro_resolver_from_file', 'Metroresolver', 'METRO_PREFIXES_RE', 'METRO_NON_ALNUM_RE'
+    'load_metro_resolver_from_file', 'MetroResolver', 'MetroTable', 'METRO_PREFIXES_RE', 'METRO_NON_ALNUM_RE',
+    'TrigramIndex', 'make_grams', 'SymSpellIndex', 'levenshtein', 'GeoGrid', 'haversine_km', 'parse_coordinates',
+    'load_or_build', 'snapshot_path', 'read_snapshot', 'write_snapshot', 'ResolveMemo',
+    'prefix_range', 'top_by_prefix',
+    'load_or_build_shared', 'MappedFile', 'MappedWriter', 'MappedStrings', 'MappedMultiMap',
+    'ResolverSlot', 'ResolverNotReady', 'readiness', 'get_metro_resolver_for_query', 'get_resolver_slots', 'get_ready',
+    'metro_city_station_counts', 'resolve_names', 'Resolution', 'resolve_batch', 'wait_resolver',
+    'DictionaryRefresher', 'DictionaryState', 'RefreshRejected', 'NoPreviousDictionary', 'dictionary_path',
+    'get_dictionary_refresher', 'get_dictionaries', 'refresh_dictionaries', 'rollback_dictionary',
+    'latin_key', 'has_latin', 'add_alternate_keys', 'AREA_ALIASES', 'WORD_ABBREVIATIONS',
+    'CrawlerPool', 'CrawlJobStore', 'CrawlJobNotFound', 'TooManyCrawlJobs', 'JobStore', 'job_summary', 'get_crawler_pool', 'get_crawl_job_store',
+    'create_crawl_job', 'get_crawl_jobs', 'get_crawl_job', 'get_crawled_vacancies', 'cancel_crawl_job'
 ]
 
 
-from .parse_hh import router, get_vacancies, auth_get_vacancies, get_metro, get_areas
-from .dependencies import get_area_resolver, get_metro_resolver
+from .parse_hh import (
+    router, get_vacancies, auth_get_vacancies, auth_get_all_vacancies, auth_get_vacancy_details, get_metro, get_areas,
+    suggest_areas, suggest_metro, nearby_metro, get_ready, resolve_names, get_dictionaries, refresh_dictionaries, rollback_dictionary,
+    create_crawl_job, get_crawl_jobs, get_crawl_job, get_crawled_vacancies, cancel_crawl_job
+)
+from .dependencies import (
+    get_area_resolver, get_metro_resolver, get_hh_client, get_vacancies_cache, get_vacancies_flight,
+    get_hh_rate_limiter, get_hh_breaker, get_hh_hedger, get_vacancy_details_cache, get_metro_resolver_for_query,
+    get_resolver_slots, wait_resolver, get_dictionary_refresher, get_crawler_pool, get_crawl_job_store
+)
+from .client import (
+    create_hh_client, fetch_upstream, UpstreamResponse, fetch_cached, fetch_vacancies, fetch_vacancies_pages,
+    fetch_vacancy_details, HH_MAX_DEPTH
+)
+from .cache import TTLCache, CacheEntry, make_cache_key
+from .singleflight import SingleFlight
+from .rate_limit import TokenBucket, RateLimitedTransport, RateLimitExceeded, parse_retry_after
+from .circuit_breaker import CircuitBreaker, CircuitBreakerTransport, CircuitOpenError
+from .hedging import Hedger, HedgingTransport
+from .ngram_index import TrigramIndex, make_grams
+from .symspell_index import SymSpellIndex, levenshtein
+from .geo_index import GeoGrid, haversine_km
+from .snapshot import load_or_build, snapshot_path, read_snapshot, write_snapshot
+from .memo import ResolveMemo
+from .prefix_index import prefix_range, top_by_prefix
+from .translit import latin_key, has_latin, add_alternate_keys, AREA_ALIASES, WORD_ABBREVIATIONS
+from .shared_index import load_or_build_shared, MappedFile, MappedWriter, MappedStrings, MappedMultiMap
+from .resolver_slot import ResolverSlot, ResolverNotReady, readiness
+from .resolution import Resolution, resolve_batch
+from .refresher import DictionaryRefresher, DictionaryState, RefreshRejected, NoPreviousDictionary, dictionary_path
+from .crawler import CrawlerPool, CrawlJobStore, CrawlJobNotFound, TooManyCrawlJobs, JobStore, job_summary
 from .areas_index import (
     normalize_name, build_area_index, choose_best_candidate, load_area_resolver_from_file,
-    AreaResolver, FALLBACK_IDS, PREFIXES_RE, NON_ALNUM_RE
+    AreaResolver, AreaTable, FALLBACK_IDS, PREFIXES_RE, NON_ALNUM_RE
 )
 from .metro_index import (
     normalize_name as metro_normalize_name, build_metro_index, choose_best_candidate as metro_choose_best_candidate,
-    load_metro_resolver_from_file, MetroResolver, PREFIXES_RE as METRO_PREFIXES_RE, NON_ALNUM_RE as METRO_NON_ALNUM_RE
+    load_metro_resolver_from_file, metro_city_station_counts, MetroResolver, MetroTable, PREFIXES_RE as METRO_PREFIXES_RE, NON_ALNUM_RE as METRO_NON_ALNUM_RE,
+    parse_coordinates
 )
 from .helpers import (
     map_education, map_employment_form, map_experience, map_schedule, map_work_format, 
-    create_query_params, auth_create_query_params
+    create_query_params, auth_create_query_params, build_params_for_httpx, filter_by_region
 )
\ No newline at end of file
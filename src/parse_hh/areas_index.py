@@ -1,14 +1,25 @@
-import json
 import re
-import difflib
-import pathlib
+import sys
 
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
+from collections.abc import Iterable, Mapping, Sequence
 from typing import Any
 
+from .memo import ResolveMemo
+from .resolution import Resolution, EXACT, PART, FUZZY, FALLBACK
+from .ngram_index import TrigramIndex
+from .prefix_index import top_by_prefix
+from .translit import AREA_ALIASES, add_alternate_keys, frozen_name_map, has_latin, latin_key
+from .snapshot import load_or_build
+from .shared_index import MappedFile, MappedWriter, load_or_build_shared
+from ..config import SnapshotSettings, snapshot_settings
+
 
 
 FALLBACK_IDS = ["113", "1"]  # Россия (113), Москва (1)
+FALLBACK_RESOLUTION = Resolution(tuple(FALLBACK_IDS), FALLBACK, 0.0)
 
 # префиксы/шаблоны, которые будут убираться из названий ввода
 PREFIXES_RE = re.compile(
@@ -33,107 +44,377 @@ def normalize_name(name: str) -> str:
 
 
 
-def build_area_index(area_json: list[dict[str, Any]]) -> tuple[dict[str, list[dict[str, Any]]], list[str]]:
+class AreaTable:
+    '''
+    узлы дерева areas в параллельных массивах, узел - его номер в порядке обхода (родитель раньше детей).
+    вместо словаря с готовым "path" на каждый узел хранятся id числом, интернированное имя,
+    глубина и указатель на родителя; путь собирается по родителям только когда его запросили.
+
+    номер узла - это и есть время входа в обходе в глубину, ends[node] - время выхода (номер первого
+    узла после его поддерева). поэтому все потомки узла - непрерывный диапазон range(node, ends[node]),
+    а проверка "a - предок b" - два сравнения чисел
+    '''
+    def __init__(
+        self, ids: Sequence[int], names: Sequence[str], depths: Sequence[int], parents: Sequence[int],
+        ends: Sequence[int], sorted_ids: Sequence[int], by_id: Sequence[int]
+    ) -> None:
+        # колонки - array при сборке из json или memoryview поверх общего файла (shared_index)
+        self.ids = ids
+        self.names = names
+        self.depths = depths
+        self.parents = parents  # -1 у корня (страны)
+        self.ends = ends
+        # поиск узла по id без словаря на все узлы: sorted_ids - id по возрастанию, by_id - их узлы
+        self.sorted_ids = sorted_ids
+        self.by_id = by_id
+
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+    def area_id(self, node: int) -> str:
+        return str(self.ids[node])
+
+
+    def path(self, node: int) -> str:
+        names = []
+
+        while node >= 0:
+            names.append(self.names[node])
+            node = self.parents[node]
+
+        return " > ".join(reversed(names))
+
+
+    def entry(self, node: int) -> dict[str, Any]:
+        '''узел в прежнем словарном виде {id, name, depth, path} - для ответов API'''
+        return {"id": self.area_id(node), "name": self.names[node], "depth": self.depths[node], "path": self.path(node)}
+
+
+    def nodes_by_id(self) -> dict[str, int]:
+        '''id -> узел; строится по запросу и не хранится'''
+        return {str(area_id): node for node, area_id in enumerate(self.ids)}
+
+
+    def node(self, area_id: str) -> int:
+        '''узел по id двоичным поиском по sorted_ids; -1 - такого id нет'''
+        if not area_id.isdigit():
+            return -1
+
+        key = int(area_id)
+        i = bisect_left(self.sorted_ids, key)
+
+        if i < len(self.sorted_ids) and self.sorted_ids[i] == key:
+            return self.by_id[i]
+
+        return -1
+
+
+    def is_ancestor(self, ancestor: int, node: int) -> bool:
+        '''ancestor совпадает с node или лежит выше него в дереве'''
+        return ancestor <= node < self.ends[ancestor]
+
+
+    def descendants(self, node: int) -> range:
+        '''узел и все его потомки - один непрерывный диапазон номеров'''
+        return range(node, self.ends[node])
+
+
+
+def subtree_ends(parents: Sequence[int]) -> Sequence[int]:
+    '''времена выхода обхода в глубину: номер первого узла после поддерева (parents - в порядке обхода)'''
+    ends = array('I', range(1, len(parents) + 1))
+
+    # потомки идут после предка, поэтому от конца к началу каждое поддерево уже посчитано
+    for node in range(len(parents) - 1, 0, -1):
+        parent = parents[node]
+
+        if parent >= 0 and ends[node] > ends[parent]:
+            ends[parent] = ends[node]
+
+    return ends
+
+
+
+def build_area_index(area_json: list[dict[str, Any]]) -> tuple[AreaTable, Mapping[str, Sequence[int]], list[str]]:
     '''
     преобразует древовидный JSON областей в индекс:
-      name_map: normalized_name -> list of entries {id, name, depth, path}
-    возвращает (name_map, all_names_list)
+      table: AreaTable со всеми узлами (корень depth=0 - страна, глубже = регион/город)
+      name_map: normalized_name -> номера узлов в table
+    возвращает (table, name_map, all_names_list)
     '''
-    name_map: dict[str, list[dict[str, Any]]] = defaultdict(list)
-    all_names: list[str] = []
+    ids, depths, parents = array('I'), array('B'), array('i')
+    names: list[str] = []
+    name_map: dict[str, list[int]] = defaultdict(list)
 
+    # обход в глубину без рекурсии и без копирования списка пути на каждом уровне
+    stack: list[tuple[dict[str, Any], int]] = [(root, -1) for root in reversed(area_json)]
 
-    def dfs(node: dict[str, Any], path: list[str]) -> None:
-        node_id = node.get("id")
-        node_name = node.get("name", "")
-        depth = len(path)  # корень depth=0 (страна), глубже = город/населённый пункт
+    while stack:
+        node, parent = stack.pop()
+        index = len(ids)
 
-        entry = {
-            "id": str(node_id),
-            "name": node_name,
-            "depth": depth,
-            "path": " > ".join(path + [node_name])
-        }
+        ids.append(int(node["id"]))
+        names.append(sys.intern(node.get("name", "")))
+        depths.append(depths[parent] + 1 if parent >= 0 else 0)
+        parents.append(parent)
 
-        norm = normalize_name(node_name)
+        norm = normalize_name(names[index])
 
         if norm:
-            name_map[norm].append(entry)
-            all_names.append(norm)
+            name_map[sys.intern(norm)].append(index)
 
-        for child in node.get("areas", []):
-            dfs(child, path + [node_name])
+        stack.extend((child, index) for child in reversed(node.get("areas", [])))
 
+    # транслит, сокращения слов и общепринятые сокращения городов ("спб", "moskva") - тоже точные ключи
+    add_alternate_keys(name_map, AREA_ALIASES, normalize_name)
 
-    for root in area_json:
-        dfs(root, [])
+    # уникальные имена - те же объекты строк, что и ключи name_map
+    all_names = sorted(name_map)
+    by_id = array('I', sorted(range(len(ids)), key=ids.__getitem__))
+    sorted_ids = array('I', (ids[node] for node in by_id))
 
-    # уникальные all_names
-    all_names = sorted(set(all_names))
-    return name_map, all_names
+    table = AreaTable(ids, names, depths, parents, subtree_ends(parents), sorted_ids, by_id)
+    return table, frozen_name_map(name_map), all_names
 
 
 
-def choose_best_candidate(candidates: list[dict[str, Any]]) -> list[str]:
+def choose_best_candidate(table: AreaTable, candidates: Sequence[int]) -> list[str]:
     '''
-    возвращает список id лучших кандидатов среди candidates
-    логика: выбираем записи с максимальной глубиной (глубже = обычно город),
+    возвращает список id лучших кандидатов среди узлов candidates
+    логика: выбираем узлы с максимальной глубиной (глубже = обычно город),
     если несколько одинаковой глубины — возвращаем все их id (HH допускает несколько)
     '''
     if not candidates:
         return []
-    
-    max_depth = max(c["depth"] for c in candidates)
-    best = [c for c in candidates if c["depth"] == max_depth]
+
+    max_depth = max(table.depths[c] for c in candidates)
 
     # уникальные ids
-    return list({c["id"] for c in best})
+    return list(dict.fromkeys(table.area_id(c) for c in candidates if table.depths[c] == max_depth))
+
+
+
+def build_fuzzy_index(all_names: Sequence[str]) -> TrigramIndex:
+    '''
+    триграммный индекс только по кириллическим именам: латинские ключи находятся точным совпадением,
+    а нечеткий поиск по ним вдвое увеличил бы индекс и находил бы "города" для латинского мусора
+    '''
+    return TrigramIndex([name for name in all_names if not has_latin(name)])
 
 
 
 class AreaResolver:
-    def __init__(self, name_map: dict[str, list[dict[str, Any]]], all_names: list[str]) -> None:
+    def __init__(
+        self, table: AreaTable, name_map: Mapping[str, Sequence[int]], all_names: Sequence[str],
+        fuzzy_index: TrigramIndex | None = None, memo: ResolveMemo | None = None, weights: dict[str, int] | None = None
+    ) -> None:
+        self.table = table
         self.name_map = name_map
         self.all_names = all_names
+        self.fuzzy_index = fuzzy_index or build_fuzzy_index(all_names)
+        self.memo = memo or ResolveMemo.from_settings()
+
+        # вес узла в подсказках: крупные города (например число станций метро) идут первыми
+        nodes = table.nodes_by_id() if weights else {}
+        self.weights = {nodes[area_id]: weight for area_id, weight in (weights or {}).items() if area_id in nodes}
+
+
+    def ancestor_ids(self, area_ids: Iterable[str]) -> dict[str, tuple[str, ...]]:
+        '''для каждого id - он сам и все его предки до страны; неизвестный id - пустой кортеж'''
+        result = {}
+
+        for area_id in area_ids:
+            node, chain = self.table.node(area_id), []
+
+            while node >= 0:
+                chain.append(self.table.area_id(node))
+                node = self.table.parents[node]
+
+            result[area_id] = tuple(chain)
+
+        return result
+
+
+    def region_ranges(self, area_ids: Iterable[str]) -> list[tuple[int, int]]:
+        '''поддеревья area_ids как отсортированные непересекающиеся диапазоны номеров узлов [start, end)'''
+        ranges: list[tuple[int, int]] = []
+
+        for start, end in sorted((node, self.table.ends[node]) for node in map(self.table.node, area_ids) if node >= 0):
+            # вложенный регион уже покрыт объемлющим
+            if ranges and start < ranges[-1][1]:
+                continue
+
+            ranges.append((start, end))
+
+        return ranges
+
+
+    def within(self, area_ids: Iterable[str], candidate_ids: Iterable[str]) -> list[str]:
+        '''те из candidate_ids, которые совпадают с одним из area_ids или лежат внутри него в дереве'''
+        ranges = self.region_ranges(area_ids)
+        starts = [start for start, _ in ranges]
+        result = []
+
+        for area_id in candidate_ids:
+            node = self.table.node(area_id)
+            i = bisect_right(starts, node) - 1
+
+            if node >= 0 and i >= 0 and node < ranges[i][1]:
+                result.append(area_id)
+
+        return result
+
+
+    def descendant_ids(self, area_id: str) -> list[str]:
+        '''id региона и всех вложенных в него узлов в порядке обхода; неизвестный id - пустой список'''
+        node = self.table.node(area_id)
+        return [self.table.area_id(i) for i in self.table.descendants(node)] if node >= 0 else []
+
+
+    def known_ids(self) -> set[str]:
+        '''id всех узлов справочника (для сравнения версий при обновлении)'''
+        return {str(area_id) for area_id in self.table.ids}
 
 
     def resolve(self, user_input: str) -> list[str]:
         '''преобразует строку пользователя в список id area. fallback -> FALLBACK_IDS'''
+        return list(self.resolve_detailed(user_input).ids)
+
+
+    def resolve_detailed(self, user_input: str) -> Resolution:
+        '''то же, что resolve, но с видом совпадения (exact / part / fuzzy / fallback) и его оценкой'''
         if not user_input:
-            return FALLBACK_IDS[:]
+            return FALLBACK_RESOLUTION
+
+        return self.memo.resolve(user_input, normalize_name, self.match)
+
 
-        norm = normalize_name(user_input)
+    def resolve_many(self, inputs: Sequence[str]) -> list[Resolution]:
+        '''пакетный resolve_detailed: одинаковые после нормализации строки ищутся один раз'''
+        norms = [normalize_name(user_input) for user_input in inputs]
+        resolved = {norm: self.memo.resolve_normalized(norm, self.match) for norm in dict.fromkeys(norms)}
+
+        return [resolved[norm] for norm in norms]
+
+
+    def match(self, norm: str) -> Resolution:
+        '''поиск по уже нормализованной строке, без memo'''
         if not norm:
-            return FALLBACK_IDS[:]
+            return FALLBACK_RESOLUTION
+
+        # латиница ищется по латинским ключам ("moskva", "nizhniy novgorod" -> "nizhni novgorod")
+        if norm not in self.name_map and has_latin(norm):
+            norm = latin_key(norm)
 
         # точное совпадение
         if norm in self.name_map:
-            candidates = self.name_map[norm]
-            return choose_best_candidate(candidates)
+            return Resolution(tuple(choose_best_candidate(self.table, self.name_map[norm])), EXACT, 1.0, norm)
 
 
         # пробуем точное совпадение по частям (например "москва район" -> "москва")
         parts = [p for p in norm.split(' ') if p]
         for part in reversed(parts):  # начиная с наиболее специфичной части
             if part in self.name_map:
-                return choose_best_candidate(self.name_map[part])
+                # оценка - доля строки, которую покрыла найденная часть
+                ids = tuple(choose_best_candidate(self.table, self.name_map[part]))
+                return Resolution(ids, PART, len(part) / len(norm), part)
 
 
-        # fuzzy match по словарю имён (difflib)
+        # fuzzy match по триграммному индексу имён (оценка как в difflib, но только по кандидатам)
         # cutoff можно настроить: 0.75 — строгий, 0.6 — мягкий
-        matches = difflib.get_close_matches(norm, self.all_names, n=3, cutoff=0.75)
+        matches = self.fuzzy_index.search_scored(norm, limit=3, cutoff=0.75)
         if matches:
-            best_norm = matches[0]
-            return choose_best_candidate(self.name_map.get(best_norm, []))
+            score, best_norm = matches[0]
+            ids = tuple(choose_best_candidate(self.table, self.name_map.get(best_norm, ())))
+            return Resolution(ids, FUZZY, score, best_norm)
+
 
+        return FALLBACK_RESOLUTION
 
-        return FALLBACK_IDS[:]
 
+    def suggest_rank(self, name: str, node: int, prefix: str) -> tuple[Any, ...]:
+        '''больший вес -> полное совпадение -> страна/регион раньше населенных пунктов -> короче имя -> порядок в дереве'''
+        return (-self.weights.get(node, 0), name != prefix, self.table.depths[node] > 1, len(name), node)
 
 
-def load_area_resolver_from_file(path: str) -> AreaResolver:
-    p = pathlib.Path(path)
-    raw = json.loads(p.read_text(encoding='utf-8'))
-    name_map, all_names = build_area_index(raw)
+    def suggest(self, user_input: str, limit: int = 10) -> list[dict[str, Any]]:
+        '''подсказки по началу названия для автодополнения: [{id, name, path, depth}]'''
+        prefix = normalize_name(user_input)
+        if not prefix:
+            return []
 
-    return AreaResolver(name_map, all_names)
\ No newline at end of file
+        if has_latin(prefix):
+            prefix = latin_key(prefix)
+
+        nodes = top_by_prefix(
+            self.all_names, prefix,
+            expand=lambda name: self.name_map.get(name, ()),
+            rank=lambda name, node: self.suggest_rank(name, node, prefix),
+            identity=lambda node: node,
+            limit=limit
+        )
+
+        return [self.table.entry(node) for node in nodes]
+
+
+
+def build_area_resolver_data(
+    area_json: list[dict[str, Any]]
+) -> tuple[AreaTable, Mapping[str, Sequence[int]], list[str], TrigramIndex]:
+    '''всё, что AreaResolver строит при загрузке, - именно это попадает в снапшот'''
+    table, name_map, all_names = build_area_index(area_json)
+    return table, name_map, all_names, build_fuzzy_index(all_names)
+
+
+
+def write_area_resolver_data(
+    writer: MappedWriter, data: tuple[AreaTable, Mapping[str, Sequence[int]], list[str], TrigramIndex]
+) -> None:
+    '''
+    раскладывает структуры AreaResolver по секциям общего файла (ключи name_map и есть all_names).
+    имена триграммного индекса - отдельной секцией: латинских ключей в нем нет, и номера в postings - по ней
+    '''
+    table, name_map, _, fuzzy_index = data
+
+    writer.add_array('ids', 'I', table.ids)
+    writer.add_strings('names', table.names)
+    writer.add_array('depths', 'B', table.depths)
+    writer.add_array('parents', 'i', table.parents)
+    writer.add_array('ends', 'I', table.ends)
+    writer.add_array('sorted_ids', 'I', table.sorted_ids)
+    writer.add_array('by_id', 'I', table.by_id)
+    writer.add_multimap('name_map', name_map)
+    writer.add_strings('fuzzy_names', fuzzy_index.names)
+    writer.add_multimap('postings', fuzzy_index.postings)
+    writer.add_array('lengths', 'H', fuzzy_index.lengths)
+
+
+def read_area_resolver_data(
+    mapped: MappedFile
+) -> tuple[AreaTable, Mapping[str, Sequence[int]], Sequence[str], TrigramIndex]:
+    '''структуры AreaResolver поверх общего файла, без копирования в память процесса'''
+    table = AreaTable(
+        mapped.array('ids'), mapped.strings('names'), mapped.array('depths'), mapped.array('parents'),
+        mapped.array('ends'), mapped.array('sorted_ids'), mapped.array('by_id')
+    )
+    all_names = mapped.strings('name_map.keys')
+
+    fuzzy_index = TrigramIndex.from_parts(mapped.strings('fuzzy_names'), mapped.multimap('postings'), mapped.array('lengths'))
+
+    return table, mapped.multimap('name_map'), all_names, fuzzy_index
+
+
+
+def load_area_resolver_from_file(
+    path: str, weights: dict[str, int] | None = None, settings: SnapshotSettings = snapshot_settings
+) -> AreaResolver:
+    if settings.shared:
+        table, name_map, all_names, fuzzy_index = load_or_build_shared(
+            path, build_area_resolver_data, write_area_resolver_data, read_area_resolver_data, settings
+        )
+    else:
+        table, name_map, all_names, fuzzy_index = load_or_build(path, build_area_resolver_data, settings)
+
+    return AreaResolver(table, name_map, all_names, fuzzy_index, weights=weights)
\ No newline at end of file
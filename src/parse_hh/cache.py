@@ -0,0 +1,183 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from urllib.parse import urlencode
+from typing import Any, Awaitable, Callable, Generic, TypeVar
+
+from ..config import configure_logging, CacheSettings, cache_settings
+
+
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+T = TypeVar('T')
+
+Fetcher = Callable[[], Awaitable[tuple[T, int]]]
+
+
+
+def make_cache_key(path: str, params_for_httpx: list[tuple[str, Any]]) -> str:
+    '''
+    канонический ключ запроса: порядок параметров (и повторяющихся значений, например area)
+    не влияет на ответ HH, поэтому пары сортируются
+    '''
+    pairs = sorted((str(k), str(v)) for k, v in params_for_httpx)
+    return f'{path}?{urlencode(pairs)}'
+
+
+
+@dataclass
+class CacheEntry(Generic[T]):
+    value: T
+    size: int
+    expires_at: float   # до этого момента запись свежая
+    stale_until: float  # до этого момента запись отдается сразу, а в фоне обновляется
+
+
+
+class TTLCache(Generic[T]):
+    '''
+    ограниченный in-process кэш ответов:
+      - ttl на каждую запись
+      - LRU вытеснение по числу записей и по суммарному размеру в байтах
+      - stale-while-revalidate: просроченная запись отдается сразу, обновление идет в фоне
+    '''
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float, stale_ttl: float) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+        self._entries: OrderedDict[str, CacheEntry[T]] = OrderedDict()
+        self._bytes = 0
+        self._refreshing: dict[str, asyncio.Task[None]] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+
+    @classmethod
+    def from_settings(cls, settings: CacheSettings = cache_settings) -> 'TTLCache[T]':
+        return cls(settings.max_entries, settings.max_bytes, settings.ttl, settings.stale_ttl)
+
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+    def get(self, key: str) -> tuple[T, bool] | None:
+        '''возвращает (value, is_stale) или None, если записи нет или она старше окна stale'''
+        entry = self._entries.get(key)
+        now = time.monotonic()
+
+        if entry is None or now >= entry.stale_until:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+
+        if now < entry.expires_at:
+            self.hits += 1
+            return entry.value, False
+
+        self.stale_hits += 1
+        return entry.value, True
+
+
+    def peek(self, key: str) -> T | None:
+        '''запись любой давности (пока не вытеснена), без учета в счетчиках - запасной ответ, когда API HH недоступен'''
+        entry = self._entries.get(key)
+        return entry.value if entry is not None else None
+
+
+    def set(self, key: str, value: T, size: int, ttl: float | None = None) -> None:
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+
+        self._entries[key] = CacheEntry(value, size, now + ttl, now + ttl + self.stale_ttl)
+        self._bytes += size
+
+        # вытеснение самых давно использованных записей
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+
+
+    async def get_or_fetch(self, key: str, fetcher: Fetcher[T]) -> T:
+        cached = self.get(key)
+
+        if cached is not None:
+            value, is_stale = cached
+
+            if is_stale:
+                self._schedule_refresh(key, fetcher)
+
+            return value
+
+        value, size = await fetcher()
+        self.set(key, value, size)
+
+        return value
+
+
+    def _schedule_refresh(self, key: str, fetcher: Fetcher[T]) -> None:
+        if key in self._refreshing:
+            return
+
+        task = asyncio.create_task(self._refresh(key, fetcher))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+
+    async def _refresh(self, key: str, fetcher: Fetcher[T]) -> None:
+        try:
+            value, size = await fetcher()
+            self.set(key, value, size)
+            self.refreshes += 1
+
+        except Exception as e:
+            # старая запись остается до конца окна stale
+            self.refresh_errors += 1
+            logger.error(f'фоновое обновление кэша {key} не удалось: {e}')
+
+
+    async def aclose(self) -> None:
+        for task in list(self._refreshing.values()):
+            task.cancel()
+
+        await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
+
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors,
+            'refreshing': len(self._refreshing)
+        }
\ No newline at end of file
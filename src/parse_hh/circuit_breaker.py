@@ -0,0 +1,178 @@
+import time
+import logging
+from collections import deque
+from typing import Any, Callable
+
+import httpx
+
+from ..config import configure_logging, CircuitBreakerSettings, circuit_breaker_settings
+
+
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+FAILURE_STATUSES = {429, 500, 502, 503, 504}
+
+
+
+class CircuitOpenError(Exception):
+    '''breaker открыт: API HH сейчас не отвечает нормально, запрос не отправлялся'''
+
+
+
+class CircuitBreaker:
+    '''
+    circuit breaker для API HH. по скользящему окну последних вызовов считает долю ошибок
+    и долю медленных ответов; при превышении порога открывается и сразу отказывает (CircuitOpenError),
+    чтобы корутины не копились на медленном client.get. через open_seconds пропускает несколько
+    пробных вызовов (half_open): успех закрывает breaker, ошибка снова открывает. clock подменяется в тестах
+    '''
+    def __init__(
+        self, settings: CircuitBreakerSettings = circuit_breaker_settings, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.settings = settings
+        self.clock = clock
+
+        self.state = CLOSED
+        self._calls: deque[tuple[float, bool, bool]] = deque()  # (время, ошибка, медленный)
+        self._opened_at = 0.0
+        self._probes = 0
+
+        self.opened = 0
+        self.rejected = 0
+
+
+    def _trim(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.settings.window:
+            self._calls.popleft()
+
+
+    def _open(self, now: float, reason: str) -> None:
+        self.state = OPEN
+        self._opened_at = now
+        self._probes = 0
+        self.opened += 1
+        logger.error(f'circuit breaker API HH открыт: {reason}')
+
+
+    def check(self) -> None:
+        '''
+        отказ, если вызов сейчас точно не пройдет, без изменения состояния. вызывается до очереди
+        лимитера, чтобы при открытом breaker запросы не ждали токен ради CircuitOpenError
+        '''
+        if self.state == OPEN and self.clock() - self._opened_at < self.settings.open_seconds:
+            self.rejected += 1
+            raise CircuitOpenError()
+
+        if self.state == HALF_OPEN and self._probes >= self.settings.half_open_calls:
+            self.rejected += 1
+            raise CircuitOpenError()
+
+
+    def before_call(self) -> None:
+        now = self.clock()
+
+        if self.state == OPEN:
+            if now - self._opened_at < self.settings.open_seconds:
+                self.rejected += 1
+                raise CircuitOpenError()
+
+            self.state = HALF_OPEN
+            self._probes = 0
+
+        if self.state == HALF_OPEN:
+            if self._probes >= self.settings.half_open_calls:
+                self.rejected += 1
+                raise CircuitOpenError()
+
+            self._probes += 1
+
+
+    def release(self) -> None:
+        '''вызов не состоялся: возвращает слот пробного вызова'''
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+
+    def record(self, failed: bool, latency: float) -> None:
+        now = self.clock()
+        slow = latency >= self.settings.slow_call_seconds
+
+        if self.state == HALF_OPEN:
+            if failed or slow:
+                self._open(now, 'пробный вызов не прошел')
+            else:
+                self.state = CLOSED
+                self._calls.clear()
+                logger.info('circuit breaker API HH закрыт')
+            return
+
+        self._calls.append((now, failed, slow))
+        self._trim(now)
+
+        if self.state != CLOSED or len(self._calls) < self.settings.min_calls:
+            return
+
+        failure_rate = sum(c[1] for c in self._calls) / len(self._calls)
+        slow_rate = sum(c[2] for c in self._calls) / len(self._calls)
+
+        if failure_rate >= self.settings.failure_rate:
+            self._open(now, f'доля ошибок {failure_rate:.2f}')
+
+        elif slow_rate >= self.settings.slow_call_rate:
+            self._open(now, f'доля медленных ответов {slow_rate:.2f}')
+
+
+    def stats(self) -> dict[str, Any]:
+        self._trim(self.clock())
+
+        return {
+            'state': self.state,
+            'window_calls': len(self._calls),
+            'window_failures': sum(c[1] for c in self._calls),
+            'window_slow': sum(c[2] for c in self._calls),
+            'opened': self.opened,
+            'rejected': self.rejected
+        }
+
+
+
+class CircuitBreakerTransport(httpx.AsyncBaseTransport):
+    '''
+    обертка над транспортом httpx: каждый запрос проходит через breaker, исход и время до заголовков записываются.
+    стоит внутри RateLimitedTransport: время в очереди лимитера и паузы между повторами в задержку не входят,
+    а каждый повтор - отдельный вызов
+    '''
+    def __init__(self, transport: httpx.AsyncBaseTransport, breaker: CircuitBreaker) -> None:
+        self._transport = transport
+        self.breaker = breaker
+
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.breaker.before_call()
+        start = self.breaker.clock()
+
+        try:
+            response = await self._transport.handle_async_request(request)
+
+        except httpx.TransportError:
+            self.breaker.record(True, self.breaker.clock() - start)
+            raise
+
+        except BaseException:
+            # отмена ничего не говорит о здоровье API HH
+            self.breaker.release()
+            raise
+
+        self.breaker.record(response.status_code in FAILURE_STATUSES, self.breaker.clock() - start)
+        return response
+
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
\ No newline at end of file
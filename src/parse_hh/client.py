@@ -0,0 +1,318 @@
+import json
+import math
+import time
+import zlib
+import httpx
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any
+
+from starlette.responses import Response
+
+from .cache import TTLCache, make_cache_key
+from .singleflight import SingleFlight
+from .helpers import build_params_for_httpx
+from .rate_limit import TokenBucket, RateLimitedTransport
+from .circuit_breaker import CircuitBreaker, CircuitBreakerTransport, CircuitOpenError
+from .hedging import Hedger, HedgingTransport
+from ..config import configure_logging, HHClientSettings, hh_client_settings, APP_NAME, APP_EMAIL, ACCESS_TOKEN
+
+
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+
+HH_MAX_DEPTH = 2000  # API HH отдает не больше 2000 вакансий на один поиск
+
+
+
+
+def create_hh_client(
+    settings: HHClientSettings = hh_client_settings,
+    rate_limiter: TokenBucket | None = None,
+    breaker: CircuitBreaker | None = None,
+    hedger: Hedger | None = None,
+    transport: httpx.AsyncBaseTransport | None = None
+) -> httpx.AsyncClient:
+    '''
+    создает общий на всё приложение клиент для API HH:
+    пул соединений и keep-alive переиспользуют TCP+TLS соединения между запросами пользователей.
+    цепочка транспортов: rate limiter (очередь и повторы) -> circuit breaker -> hedging -> сеть.
+    breaker и hedging видят только сетевую попытку: ожидание токена и паузы перед повтором не считаются
+    медленным ответом и не запускают вторую попытку, а отказ лимитера - не ошибка API HH.
+    открытый breaker отказывает еще до очереди лимитера.
+    transport подменяет сетевой транспорт (например, ASGITransport(hh_stub.app) в тестах)
+    '''
+    limits = httpx.Limits(
+        max_connections=settings.max_connections,
+        max_keepalive_connections=settings.max_keepalive_connections,
+        keepalive_expiry=settings.keepalive_expiry
+    )
+
+    timeout = httpx.Timeout(
+        connect=settings.connect_timeout,
+        read=settings.read_timeout,
+        write=settings.write_timeout,
+        pool=settings.pool_timeout
+    )
+
+    headers = {
+        'Authorization': f'Bearer {ACCESS_TOKEN}',
+        'User-Agent': f'{APP_NAME}/1.0 ({APP_EMAIL})',
+        'Accept-Encoding': 'gzip, deflate'  # только то, что умеет распаковать UpstreamResponse.body()
+    }
+
+    if transport is None:
+        transport = httpx.AsyncHTTPTransport(limits=limits, http2=settings.http2)
+
+    rate_limiter = rate_limiter or TokenBucket.from_settings()
+    breaker = breaker or CircuitBreaker()
+
+    transport = HedgingTransport(transport, hedger or Hedger(), rate_limiter)
+    transport = CircuitBreakerTransport(transport, breaker)
+    transport = RateLimitedTransport(transport, rate_limiter, admit=breaker.check)
+
+    return httpx.AsyncClient(
+        base_url=settings.base_url,
+        headers=headers,
+        timeout=timeout,
+        transport=transport
+    )
+
+
+
+@dataclass
+class UpstreamResponse:
+    '''ответ API HH без разбора: тело хранится в том виде, в каком пришло (возможно, сжатое)'''
+    status_code: int
+    content: bytes
+    content_type: str
+    content_encoding: str | None
+    elapsed: float
+
+    _json: Any = field(default=None, init=False, repr=False, compare=False)
+
+
+    def body(self) -> bytes:
+        '''распакованное тело'''
+        if self.content_encoding == 'gzip':
+            return zlib.decompress(self.content, 16 + zlib.MAX_WBITS)
+
+        if self.content_encoding == 'deflate':
+            try:
+                return zlib.decompress(self.content)
+            except zlib.error:
+                return zlib.decompress(self.content, -zlib.MAX_WBITS)
+
+        return self.content
+
+
+    def json(self) -> Any:
+        '''
+        разобранное тело. распаковывается и разбирается один раз, дальше (в том числе из кэша)
+        отдается тот же объект - изменять его нельзя
+        '''
+        if self._json is None:
+            self._json = json.loads(self.body())
+
+        return self._json
+
+
+    def summary(self) -> str:
+        '''
+        короткая строка для лога без распаковки тела. found/pages сюда не попадают:
+        HH отвечает сжатым телом (Accept-Encoding), а разбирать его ради лога - то, от чего уходит passthrough
+        '''
+        return (
+            f'status={self.status_code} bytes={len(self.content)} '
+            f'encoding={self.content_encoding or "identity"} latency={self.elapsed * 1000:.0f}ms'
+        )
+
+
+    def to_response(self, accept_encoding: str = '') -> Response:
+        '''
+        отдает тело клиенту как есть, с content-type и content-encoding от HH;
+        распаковывает только если клиент не принимает такое сжатие
+        '''
+        accepted = {e.split(';')[0].strip().lower() for e in accept_encoding.split(',')}
+
+        if self.content_encoding and self.content_encoding in accepted:
+            return Response(
+                content=self.content,
+                status_code=self.status_code,
+                media_type=self.content_type,
+                headers={'Content-Encoding': self.content_encoding, 'Vary': 'Accept-Encoding'}
+            )
+
+        return Response(content=self.body(), status_code=self.status_code, media_type=self.content_type)
+
+
+
+async def fetch_upstream(
+    client: httpx.AsyncClient, path: str, params: list[tuple[str, str | int | float | bool | None]] | None = None
+) -> tuple[UpstreamResponse, int]:
+    '''
+    GET к API HH без разбора тела: байты читаются как пришли (aiter_raw), без распаковки и json.
+    возвращает (ответ, размер тела в байтах) — формат, который ожидает TTLCache
+    '''
+    start = time.perf_counter()
+
+    async with client.stream('GET', path, params=params) as response:
+        response.raise_for_status()
+
+        content = b''.join([chunk async for chunk in response.aiter_raw()])
+
+    upstream = UpstreamResponse(
+        status_code=response.status_code,
+        content=content,
+        content_type=response.headers.get('content-type', 'application/json'),
+        content_encoding=response.headers.get('content-encoding'),
+        elapsed=time.perf_counter() - start
+    )
+
+    logger.info(f'{path}: {upstream.summary()}')
+
+    return upstream, len(content)
+
+
+
+async def fetch_cached(
+    client: httpx.AsyncClient,
+    cache: TTLCache[UpstreamResponse],
+    flight: SingleFlight[tuple[UpstreamResponse, int]],
+    path: str,
+    params_for_httpx: list[tuple[str, str | int | float | bool | None]] | None = None
+) -> UpstreamResponse:
+    '''
+    GET к API HH через кэш: при промахе (и при фоновом обновлении) одинаковые одновременные
+    запросы схлопываются в один вызов. пока открыт circuit breaker, отдается
+    сохраненный ответ любой давности, если он есть
+    '''
+    key = make_cache_key(path, params_for_httpx or [])
+
+    try:
+        return await cache.get_or_fetch(
+            key, lambda: flight.do(key, lambda: fetch_upstream(client, path, params_for_httpx))
+        )
+
+    except CircuitOpenError:
+        cached = cache.peek(key)
+
+        if cached is None:
+            raise
+
+        logger.warning(f'circuit breaker открыт, отдан сохраненный ответ {key}')
+        return cached
+
+
+
+async def fetch_vacancies(
+    client: httpx.AsyncClient,
+    cache: TTLCache[UpstreamResponse],
+    flight: SingleFlight[tuple[UpstreamResponse, int]],
+    params_for_httpx: list[tuple[str, str | int | float | bool | None]]
+) -> UpstreamResponse:
+    return await fetch_cached(client, cache, flight, '/vacancies', params_for_httpx)
+
+
+
+async def fetch_vacancies_pages(
+    client: httpx.AsyncClient,
+    cache: TTLCache[UpstreamResponse],
+    flight: SingleFlight[tuple[UpstreamResponse, int]],
+    query_params: dict[str, Any],
+    page_to: int | None = None,
+    max_items: int | None = None,
+    concurrency: int = hh_client_settings.fanout_concurrency
+) -> dict[str, Any]:
+    '''
+    забирает страницы поиска с query_params['page'] по page_to (включительно) параллельно, не больше
+    concurrency запросов одновременно. первая страница запрашивается отдельно: по ее pages
+    обрезается диапазон. вакансии склеиваются без дублей по id
+    '''
+    page_from = int(query_params.get('page') or 0)
+    per_page = int(query_params.get('per_page') or 20)
+
+    first = (await fetch_vacancies(client, cache, flight, build_params_for_httpx(query_params))).json()
+
+    last_page = min(int(first.get('pages', 1)), math.ceil(HH_MAX_DEPTH / per_page)) - 1
+
+    if page_to is not None:
+        last_page = min(last_page, page_to)
+
+    if max_items is not None:
+        last_page = min(last_page, page_from + math.ceil(max_items / per_page) - 1)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+
+    async def fetch_page(page: int) -> Any:
+        async with semaphore:
+            page_params = build_params_for_httpx({**query_params, 'page': page})
+            return (await fetch_vacancies(client, cache, flight, page_params)).json()
+
+
+    rest = await asyncio.gather(*(fetch_page(page) for page in range(page_from + 1, last_page + 1)))
+
+    items: list[Any] = []
+    seen: set[str] = set()
+
+    for result in [first, *rest]:
+        for item in result.get('items', []):
+            if item.get('id') in seen:
+                continue
+
+            seen.add(item.get('id'))
+            items.append(item)
+
+    if max_items is not None:
+        items = items[:max_items]
+
+    return {
+        'found': first.get('found'),
+        'pages': first.get('pages'),
+        'per_page': per_page,
+        'page_from': page_from,
+        'page_to': max(last_page, page_from),
+        'items': items
+    }
+
+
+
+async def fetch_vacancy_details(
+    client: httpx.AsyncClient,
+    cache: TTLCache[UpstreamResponse],
+    flight: SingleFlight[tuple[UpstreamResponse, int]],
+    ids: list[str],
+    concurrency: int = hh_client_settings.details_concurrency
+) -> Response:
+    '''
+    полные описания вакансий по списку id: /vacancies/{id} запрашиваются параллельно (не больше
+    concurrency одновременно) через кэш описаний. тела склеиваются в json-массив без разбора
+    '''
+    unique_ids = list(dict.fromkeys(ids))
+    semaphore = asyncio.Semaphore(concurrency)
+
+
+    async def fetch_one(vacancy_id: str) -> UpstreamResponse | None:
+        async with semaphore:
+            try:
+                return await fetch_cached(client, cache, flight, f'/vacancies/{vacancy_id}')
+
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code in (403, 404):  # удалена, в архиве или скрыта
+                    return None
+                raise
+
+
+    results = await asyncio.gather(*(fetch_one(vacancy_id) for vacancy_id in unique_ids))
+
+    found = [r.body() for r in results if r is not None]
+    not_found = [vacancy_id for vacancy_id, r in zip(unique_ids, results) if r is None]
+
+    content = b'{"items":[' + b','.join(found) + b'],"not_found":' + json.dumps(not_found).encode() + b'}'
+
+    return Response(content=content, media_type='application/json')
\ No newline at end of file
@@ -0,0 +1,511 @@
+import math
+import asyncio
+import logging
+from uuid import uuid4
+from datetime import datetime, timedelta, timezone
+from typing import Any, Protocol, Sequence
+
+import httpx
+from sqlalchemy import select, update, func, or_, and_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .client import fetch_upstream, HH_MAX_DEPTH
+from .helpers import build_params_for_httpx
+from .rate_limit import RateLimitExceeded
+from .circuit_breaker import CircuitOpenError
+from ..database.database import async_session_maker
+from ..database.models import CrawlJob, CrawledVacancy, User
+from ..config import configure_logging, CrawlerSettings, crawler_settings
+
+
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+PENDING, RUNNING, DONE, FAILED, CANCELLED = 'pending', 'running', 'done', 'failed', 'cancelled'
+ACTIVE = (PENDING, RUNNING)
+
+# ошибки, после которых страница запрашивается повторно, а не валит все задание
+RETRYABLE = (RateLimitExceeded, CircuitOpenError, httpx.TransportError)
+
+
+
+class JobCancelled(Exception):
+    '''задание отменено, пока его страницы обходились'''
+
+
+
+class CrawlJobNotFound(Exception):
+    '''у пользователя нет задания с таким id'''
+
+
+
+class TooManyCrawlJobs(Exception):
+    '''у пользователя уже max_active_per_user ожидающих или выполняемых заданий'''
+
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def last_page(pages: int, per_page: int) -> int:
+    '''номер последней страницы, которую отдаст API HH: не дальше первых HH_MAX_DEPTH вакансий'''
+    return min(pages, math.ceil(HH_MAX_DEPTH / per_page)) - 1
+
+
+def job_summary(job: CrawlJob) -> dict[str, Any]:
+    '''задание для ответа API: статус и прогресс (страниц сохранено подряд с первой / всего)'''
+    return {
+        'id': job.id,
+        'status': job.status,
+        'query_params': job.query_params,
+        'found': job.found,
+        'pages': job.pages,
+        'pages_done': job.pages_done,
+        'progress': round(job.pages_done / job.pages, 4) if job.pages else 0.0,
+        'items_count': job.items_count,
+        'error': job.error,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at
+    }
+
+
+
+class JobStore(Protocol):
+    async def claim(self) -> CrawlJob | None: ...
+
+    async def heartbeat(self, job_id: int, token: str | None) -> bool: ...
+
+    async def save_page(
+        self, job_id: int, token: str | None, page: int, items: Sequence[dict[str, Any]],
+        pages_done: int, pages: int, found: int | None
+    ) -> bool: ...
+
+    async def finish(self, job_id: int, token: str | None, status: str, error: str | None = None) -> None: ...
+
+    async def release(self, job_id: int, token: str | None) -> None: ...
+
+
+
+class CrawlJobStore:
+    '''
+    задания обхода и их вакансии в Postgres. каждая операция - короткая отдельная транзакция,
+    поэтому воркеры разных процессов работают с одной таблицей заданий без общей памяти
+    '''
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession] = async_session_maker,
+        settings: CrawlerSettings = crawler_settings
+    ) -> None:
+        self.session_maker = session_maker
+        self.settings = settings
+
+
+    async def create(self, user_id: int, query_params: dict[str, Any]) -> CrawlJob:
+        '''
+        новое ожидающее задание. строка пользователя блокируется до commit, поэтому одновременные
+        запросы одного пользователя не обойдут лимит max_active_per_user
+        '''
+        job = CrawlJob(status=PENDING, query_params=query_params, pages_done=0, items_count=0, created_at=utcnow(), user_id=user_id)
+
+        async with self.session_maker() as session:
+            await session.execute(select(User.id).where(User.id == user_id).with_for_update())
+
+            active = await session.scalar(
+                select(func.count()).select_from(CrawlJob).where(CrawlJob.user_id == user_id, CrawlJob.status.in_(ACTIVE))
+            )
+
+            if (active or 0) >= self.settings.max_active_per_user:
+                raise TooManyCrawlJobs(user_id)
+
+            session.add(job)
+            await session.commit()
+            await session.refresh(job)
+
+        return job
+
+
+    async def list_jobs(self, user_id: int) -> list[CrawlJob]:
+        async with self.session_maker() as session:
+            result = await session.execute(select(CrawlJob).where(CrawlJob.user_id == user_id).order_by(CrawlJob.id.desc()))
+            return list(result.scalars().all())
+
+
+    async def get(self, user_id: int, job_id: int) -> CrawlJob:
+        async with self.session_maker() as session:
+            result = await session.execute(select(CrawlJob).where(CrawlJob.id == job_id, CrawlJob.user_id == user_id))
+            job = result.scalar_one_or_none()
+
+        if job is None:
+            raise CrawlJobNotFound(job_id)
+
+        return job
+
+
+    async def cancel(self, user_id: int, job_id: int) -> CrawlJob:
+        '''отменяет еще не завершенное задание; воркер остановится на следующей сохраняемой странице или отметке'''
+        async with self.session_maker() as session:
+            await session.execute(
+                update(CrawlJob)
+                .where(CrawlJob.id == job_id, CrawlJob.user_id == user_id, CrawlJob.status.in_(ACTIVE))
+                .values(status=CANCELLED, finished_at=utcnow())
+            )
+            await session.commit()
+
+        return await self.get(user_id, job_id)
+
+
+    async def vacancies(self, user_id: int, job_id: int, offset: int, limit: int) -> list[dict[str, Any]]:
+        '''сохраненные вакансии задания в порядке выдачи HH'''
+        await self.get(user_id, job_id)
+
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(CrawledVacancy.data).where(CrawledVacancy.job_id == job_id)
+                .order_by(CrawledVacancy.page, CrawledVacancy.id).offset(offset).limit(limit)
+            )
+            return list(result.scalars().all())
+
+
+    async def claim(self) -> CrawlJob | None:
+        '''
+        берет одно задание: ожидающее или running, отметка которого устарела (воркер упал или перезапущен).
+        FOR UPDATE SKIP LOCKED - два воркера не возьмут одно задание, даже в разных процессах.
+        новый токен аренды (claimed_by) отбирает задание у прежнего воркера: его записи больше не применяются
+        '''
+        stale = utcnow() - timedelta(seconds=self.settings.heartbeat_timeout)
+
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(CrawlJob)
+                .where(or_(CrawlJob.status == PENDING, and_(CrawlJob.status == RUNNING, CrawlJob.heartbeat_at < stale)))
+                .order_by(CrawlJob.id).limit(1).with_for_update(skip_locked=True)
+            )
+            job = result.scalar_one_or_none()
+
+            if job is None:
+                return None
+
+            job.status, job.heartbeat_at, job.error, job.claimed_by = RUNNING, utcnow(), None, uuid4().hex
+            await session.commit()
+
+        return job
+
+
+    async def heartbeat(self, job_id: int, token: str | None) -> bool:
+        '''обновляет отметку задания; False - аренда потеряна (задание отменено или отдано другому воркеру)'''
+        async with self.session_maker() as session:
+            result = await session.execute(
+                update(CrawlJob)
+                .where(CrawlJob.id == job_id, CrawlJob.status == RUNNING, CrawlJob.claimed_by == token)
+                .values(heartbeat_at=utcnow())
+            )
+            await session.commit()
+
+        return bool(result.rowcount)  # type: ignore[attr-defined]
+
+
+    async def save_page(
+        self, job_id: int, token: str | None, page: int, items: Sequence[dict[str, Any]],
+        pages_done: int, pages: int, found: int | None
+    ) -> bool:
+        '''
+        вакансии страницы одной вставкой и прогресс задания - в одной транзакции, поэтому pages_done
+        никогда не опережает данные в базе. повторно сохраненная (после перезапуска) вакансия пропускается.
+        False - задание больше не running (отменено) или его аренда у другого воркера, страница не сохранена
+        '''
+        async with self.session_maker() as session:
+            inserted = 0
+
+            if items:
+                result = await session.execute(
+                    insert(CrawledVacancy)
+                    .values([{'job_id': job_id, 'hh_id': str(item.get('id')), 'page': page, 'data': item} for item in items])
+                    .on_conflict_do_nothing(index_elements=['job_id', 'hh_id'])
+                    .returning(CrawledVacancy.id)
+                )
+                inserted = len(result.all())
+
+            result = await session.execute(
+                update(CrawlJob)
+                .where(CrawlJob.id == job_id, CrawlJob.status == RUNNING, CrawlJob.claimed_by == token)
+                .values(
+                    # страницы завершаются не по порядку, поэтому прогресс только растет
+                    pages_done=func.greatest(CrawlJob.pages_done, pages_done),
+                    pages=pages, found=found,
+                    items_count=CrawlJob.items_count + inserted,
+                    heartbeat_at=utcnow()
+                )
+            )
+
+            if result.rowcount == 0:  # type: ignore[attr-defined]
+                await session.rollback()
+                return False
+
+            await session.commit()
+
+        return True
+
+
+    async def finish(self, job_id: int, token: str | None, status: str, error: str | None = None) -> None:
+        async with self.session_maker() as session:
+            await session.execute(
+                update(CrawlJob)
+                .where(CrawlJob.id == job_id, CrawlJob.status == RUNNING, CrawlJob.claimed_by == token)
+                .values(status=status, error=error, finished_at=utcnow(), heartbeat_at=utcnow())
+            )
+            await session.commit()
+
+
+    async def release(self, job_id: int, token: str | None) -> None:
+        '''возвращает задание в очередь при остановке сервера: после перезапуска оно продолжится с pages_done'''
+        async with self.session_maker() as session:
+            await session.execute(
+                update(CrawlJob)
+                .where(CrawlJob.id == job_id, CrawlJob.status == RUNNING, CrawlJob.claimed_by == token)
+                .values(status=PENDING, claimed_by=None)
+            )
+            await session.commit()
+
+
+
+class CrawlerPool:
+    '''
+    пул воркеров, которые обходят все страницы поиска заданий и сохраняют вакансии в базу.
+    задания хранятся в базе: свободный воркер забирает следующее (store.claim), сразу после создания
+    задания в этом процессе или раз в poll_interval. страницы одного задания запрашиваются параллельно,
+    не больше page_concurrency одновременно, через общий клиент - под общим лимитером запросов к HH.
+    страницы [0, pages_done) уже в базе, поэтому после перезапуска задание продолжается с pages_done.
+    пока задание обходится, отдельная задача раз в heartbeat_interval обновляет его отметку: медленные
+    страницы не делают задание брошенным. потерянная аренда (store.heartbeat вернул False) останавливает обход
+    '''
+    def __init__(self, client: httpx.AsyncClient, store: JobStore, settings: CrawlerSettings = crawler_settings) -> None:
+        self.client = client
+        self.store = store
+        self.settings = settings
+
+        self.running: dict[int, str | None] = {}  # id заданий, которые сейчас обходят воркеры этого процесса -> токен аренды
+
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.pages_fetched = 0
+        self.page_retries = 0
+        self.leases_lost = 0
+
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task[None]] = []
+
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.settings.workers)]
+
+
+    def notify(self) -> None:
+        '''будит свободных воркеров: появилось новое задание'''
+        self._wakeup.set()
+
+
+    async def _worker(self) -> None:
+        while True:
+            # сброс до claim: задание, созданное во время claim, разбудит воркера снова
+            self._wakeup.clear()
+
+            try:
+                job = await self.store.claim()
+
+            except Exception as e:
+                logger.error(f'задание обхода не получено: {e!r}')
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.settings.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+                continue
+
+            await self.run(job)
+
+
+    async def keep_alive(self, job_id: int, token: str | None) -> None:
+        '''обновляет отметку задания раз в heartbeat_interval; завершается, когда аренда потеряна'''
+        while True:
+            await asyncio.sleep(self.settings.heartbeat_interval)
+
+            try:
+                if not await self.store.heartbeat(job_id, token):
+                    return
+
+            except Exception as e:
+                # сбой базы - не потеря аренды: следующая попытка через heartbeat_interval
+                logger.warning(f'отметка задания {job_id} не обновлена: {e!r}')
+
+
+    async def run(self, job: CrawlJob) -> str:
+        '''обходит задание до конца и записывает итоговый статус; возвращает его'''
+        token = job.claimed_by
+        self.running[job.id] = token
+        logger.info(f'задание обхода {job.id} начато со страницы {job.pages_done}')
+
+        crawl = asyncio.ensure_future(self.crawl(job))
+        heartbeat = asyncio.ensure_future(self.keep_alive(job.id, token))
+
+        try:
+            await asyncio.wait((crawl, heartbeat), return_when=asyncio.FIRST_COMPLETED)
+
+            if not crawl.done():
+                # задание отменено или отдано другому воркеру: его страницы больше не сохраняются
+                crawl.cancel()
+                await asyncio.gather(crawl, return_exceptions=True)
+
+                self.leases_lost += 1
+                logger.warning(f'задание обхода {job.id}: аренда потеряна, обход остановлен')
+                return CANCELLED
+
+            status = crawl.result()
+
+            if status == DONE:
+                await self.store.finish(job.id, token, DONE)
+                self.completed += 1
+            else:
+                self.cancelled += 1
+
+            logger.info(f'задание обхода {job.id}: {status}')
+            return status
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as e:
+            logger.error(f'задание обхода {job.id} не выполнено: {e!r}')
+            self.failed += 1
+
+            try:
+                await self.store.finish(job.id, token, FAILED, repr(e))
+            except Exception as store_error:
+                # статус не записан - задание подхватят снова после heartbeat_timeout
+                logger.error(f'статус задания {job.id} не сохранен: {store_error!r}')
+
+            return FAILED
+
+        finally:
+            for task in (crawl, heartbeat):
+                task.cancel()
+
+            await asyncio.gather(crawl, heartbeat, return_exceptions=True)
+            self.running.pop(job.id, None)
+
+
+    async def fetch_page(self, query_params: dict[str, Any], page: int) -> dict[str, Any]:
+        '''страница выдачи без кэша поиска (обход не должен вытеснять из него ответы пользователям), с повторами'''
+        params = build_params_for_httpx({**query_params, 'page': page, 'per_page': self.settings.per_page})
+
+        attempt = 1
+
+        while True:
+            try:
+                upstream, _ = await fetch_upstream(self.client, '/vacancies', params)
+                self.pages_fetched += 1
+
+                result: dict[str, Any] = upstream.json()
+                return result
+
+            except RETRYABLE as e:
+                if attempt >= self.settings.page_attempts:
+                    raise
+
+                self.page_retries += 1
+                logger.warning(f'страница {page} не получена ({e!r}), попытка {attempt + 1}')
+                await asyncio.sleep(self.settings.retry_delay * attempt)
+                attempt += 1
+
+
+    async def crawl(self, job: CrawlJob) -> str:
+        '''обход страниц задания, начиная с job.pages_done; DONE или CANCELLED'''
+        query_params, token = job.query_params, job.claimed_by
+        pages, found, pages_done = job.pages, job.found, job.pages_done
+
+        if pages is None:
+            # число страниц - из первой страницы; она же и сохраняется
+            first = await self.fetch_page(query_params, 0)
+            # пустая выдача - одна (первая) страница
+            pages = max(last_page(int(first.get('pages') or 0), self.settings.per_page) + 1, 1)
+            found = first.get('found')
+
+            if not await self.store.save_page(job.id, token, 0, first.get('items', []), 1, pages, found):
+                return CANCELLED
+
+            pages_done = 1
+
+        done: set[int] = set()
+        semaphore = asyncio.Semaphore(self.settings.page_concurrency)
+
+
+        async def crawl_page(page: int) -> None:
+            nonlocal pages_done
+
+            async with semaphore:
+                result = await self.fetch_page(query_params, page)
+
+            # подряд сохраненные страницы с начала - то, с чего продолжать после перезапуска
+            done.add(page)
+
+            while pages_done in done:
+                pages_done += 1
+
+            if not await self.store.save_page(job.id, token, page, result.get('items', []), pages_done, pages, found):
+                raise JobCancelled(job.id)
+
+
+        tasks = [asyncio.ensure_future(crawl_page(page)) for page in range(pages_done, pages)]
+
+        try:
+            await asyncio.gather(*tasks)
+
+        except JobCancelled:
+            return CANCELLED
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        return DONE
+
+
+    async def aclose(self) -> None:
+        '''останавливает воркеров; их задания возвращаются в очередь и продолжатся после перезапуска'''
+        running = list(self.running.items())  # отмена воркеров очищает running
+
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        for job_id, token in running:
+            try:
+                await self.store.release(job_id, token)
+            except Exception as e:
+                logger.error(f'задание {job_id} не возвращено в очередь: {e!r}')
+
+
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'workers': len(self._tasks),
+            'running': sorted(self.running),
+            'completed': self.completed,
+            'failed': self.failed,
+            'cancelled': self.cancelled,
+            'pages_fetched': self.pages_fetched,
+            'page_retries': self.page_retries,
+            'leases_lost': self.leases_lost
+        }
\ No newline at end of file
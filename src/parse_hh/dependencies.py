@@ -1,11 +1,108 @@
 from fastapi import Request
+
+import httpx
+import logging
 from typing import Any 
 
+from .cache import TTLCache
+from .singleflight import SingleFlight
+from .client import UpstreamResponse
+from .rate_limit import TokenBucket
+from .circuit_breaker import CircuitBreaker
+from .hedging import Hedger
+from .resolver_slot import ResolverSlot, ResolverNotReady
+from .refresher import DictionaryRefresher
+from .crawler import CrawlerPool, CrawlJobStore
+from ..config import configure_logging, resolver_load_settings
+from ..exceptions import server_exc, resolver_not_ready_exc
+
+
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+
+async def wait_resolver(slot: ResolverSlot[Any]) -> Any:
+    '''справочник из слота; пока он грузится, запрос ждет не дольше HH_RESOLVERS_WAIT_TIMEOUT'''
+    try:
+        return await slot.get(resolver_load_settings.wait_timeout)
+
+    except ResolverNotReady:
+        logger.warning(f'справочник {slot.name} не успел загрузиться')
+        raise resolver_not_ready_exc
+
+    except Exception as e:
+        logger.error(e)
+        raise server_exc
+
+
+async def get_area_resolver(request: Request) -> Any:
+    return await wait_resolver(request.app.state.area_resolver)
+
+
+async def get_metro_resolver(request: Request) -> Any:
+    return await wait_resolver(request.app.state.metro_resolver)
+
+
+async def get_metro_resolver_for_query(request: Request) -> Any:
+    '''метро только для запросов с параметром metro: остальные не ждут (и не запускают) его загрузку'''
+    if not request.query_params.get('metro'):
+        return None
+
+    return await wait_resolver(request.app.state.metro_resolver)
+
+
+def get_resolver_slots(request: Request) -> list[ResolverSlot[Any]]:
+    slots: list[ResolverSlot[Any]] = [request.app.state.area_resolver, request.app.state.metro_resolver]
+    return slots
+
+
+def get_dictionary_refresher(request: Request) -> DictionaryRefresher:
+    refresher: DictionaryRefresher = request.app.state.dictionary_refresher
+    return refresher
+
+
+def get_crawler_pool(request: Request) -> CrawlerPool:
+    pool: CrawlerPool = request.app.state.crawler_pool
+    return pool
+
+
+def get_crawl_job_store(request: Request) -> CrawlJobStore:
+    store: CrawlJobStore = request.app.state.crawl_job_store
+    return store
+
+
+def get_hh_client(request: Request) -> httpx.AsyncClient:
+    client: httpx.AsyncClient = request.app.state.hh_client
+    return client
+
+
+def get_vacancies_cache(request: Request) -> TTLCache[UpstreamResponse]:
+    cache: TTLCache[UpstreamResponse] = request.app.state.vacancies_cache
+    return cache
+
+
+def get_vacancies_flight(request: Request) -> SingleFlight[tuple[UpstreamResponse, int]]:
+    flight: SingleFlight[tuple[UpstreamResponse, int]] = request.app.state.vacancies_flight
+    return flight
+
+
+def get_hh_rate_limiter(request: Request) -> TokenBucket:
+    rate_limiter: TokenBucket = request.app.state.hh_rate_limiter
+    return rate_limiter
+
+
+def get_hh_breaker(request: Request) -> CircuitBreaker:
+    breaker: CircuitBreaker = request.app.state.hh_breaker
+    return breaker
 
 
-def get_area_resolver(request: Request) -> Any:
-    return request.app.state.area_resolver
+def get_hh_hedger(request: Request) -> Hedger:
+    hedger: Hedger = request.app.state.hh_hedger
+    return hedger
 
 
-def get_metro_resolver(request: Request) -> Any:
-    return request.app.state.metro_resolver
\ No newline at end of file
+def get_vacancy_details_cache(request: Request) -> TTLCache[UpstreamResponse]:
+    cache: TTLCache[UpstreamResponse] = request.app.state.vacancy_details_cache
+    return cache
\ No newline at end of file
@@ -0,0 +1,127 @@
+import math
+from array import array
+from collections import defaultdict
+from collections.abc import Iterator, Mapping, Sequence
+
+
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180  # длина градуса широты (и долготы на экваторе)
+
+# сторона ячейки сетки в градусах: ~2 км по широте, в городах с метро - несколько станций на ячейку
+CELL_DEGREES = 0.02
+
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    '''расстояние по поверхности Земли между двумя точками, км'''
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def cell_key(row: int, col: int) -> str:
+    # строковый ключ - чтобы сетка ложилась в multimap общего файла (shared_index) как есть
+    return f'{row},{col}'
+
+
+
+class GeoGrid:
+    '''
+    равномерная сетка по широте/долготе: ячейка -> номера точек в ней. точки в радиусе ищутся только
+    в ячейках, которые пересекает описанный вокруг круга прямоугольник, - без прохода по всем точкам.
+    прямоугольник обрезается по границам занятых ячеек (bounds: строки и столбцы от и до): у полюса он
+    охватывает всю широтную полосу, а перебирать тысячи пустых ячеек незачем. если и после этого ячеек
+    в нем больше, чем занятых, точки перебираются напрямую. точки без координат (nan) в сетку не попадают
+    '''
+    def __init__(self, lats: Sequence[float], lngs: Sequence[float], cell: float = CELL_DEGREES) -> None:
+        self.lats = lats
+        self.lngs = lngs
+        self.cell = cell
+
+        cells: dict[str, list[int]] = defaultdict(list)
+        rows, cols = [], []
+
+        for point, (lat, lng) in enumerate(zip(lats, lngs)):
+            if not (math.isnan(lat) or math.isnan(lng)):
+                row, col = math.floor(lat / cell), math.floor(lng / cell)
+                cells[cell_key(row, col)].append(point)
+                rows.append(row)
+                cols.append(col)
+
+        self.cells: Mapping[str, Sequence[int]] = {key: array('I', points) for key, points in cells.items()}
+        # пустая сетка - пустые диапазоны
+        self.bounds: Sequence[int] = array('i', [min(rows), max(rows), min(cols), max(cols)] if rows else [0, -1, 0, -1])
+
+
+    @classmethod
+    def from_parts(
+        cls,
+        lats: Sequence[float],
+        lngs: Sequence[float],
+        cells: Mapping[str, Sequence[int]],
+        bounds: Sequence[int],
+        cell: float = CELL_DEGREES
+    ) -> 'GeoGrid':
+        '''сетка из уже готовых частей (например поверх общего файла), без пересчета ячеек'''
+        grid = cls.__new__(cls)
+        grid.lats, grid.lngs, grid.cells, grid.bounds, grid.cell = lats, lngs, cells, bounds, cell
+        return grid
+
+
+    def within(self, lat: float, lng: float, radius_km: float) -> list[tuple[float, int]]:
+        '''точки не дальше radius_km от (lat, lng): [(расстояние, номер точки)], ближайшие первыми'''
+        dlat = radius_km / KM_PER_DEGREE
+        # у полюса долгота вырождается - тогда прямоугольник охватывает всю широтную полосу
+        dlng = min(radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6)), 180)
+
+        # только строки и столбцы, где вообще есть точки
+        min_row, max_row, min_col, max_col = self.bounds
+
+        rows = range(max(math.floor((lat - dlat) / self.cell), min_row), min(math.floor((lat + dlat) / self.cell), max_row) + 1)
+        cols = range(max(math.floor((lng - dlng) / self.cell), min_col), min(math.floor((lng + dlng) / self.cell), max_col) + 1)
+
+        found = []
+
+        for point in self._candidates(rows, cols):
+            distance = haversine_km(lat, lng, self.lats[point], self.lngs[point])
+
+            if distance <= radius_km:
+                found.append((distance, point))
+
+        found.sort()
+        return found
+
+
+    def _candidates(self, rows: range, cols: range) -> Iterator[int]:
+        '''точки ячеек прямоугольника; если ячеек в нем больше, чем занятых, - все точки сетки'''
+        if not rows or not cols:
+            return
+
+        if len(rows) * len(cols) > len(self.cells):
+            for points in self.cells.values():
+                yield from points
+            return
+
+        for row in rows:
+            for col in cols:
+                yield from self.cells.get(cell_key(row, col), ())
+
+
+    def nearest(self, lat: float, lng: float, k: int, max_radius_km: float) -> list[tuple[float, int]]:
+        '''
+        k ближайших точек не дальше max_radius_km: [(расстояние, номер точки)]. радиус поиска удваивается,
+        пока в круге не наберется k точек, - все точки в круге найдены, значит k ближайших среди них
+        '''
+        radius_km = self.cell * KM_PER_DEGREE
+
+        while True:
+            radius_km = min(radius_km, max_radius_km)
+            found = self.within(lat, lng, radius_km)
+
+            if len(found) >= k or radius_km >= max_radius_km:
+                return found[:k]
+
+            radius_km *= 2
\ No newline at end of file
@@ -0,0 +1,138 @@
+import time
+import asyncio
+from collections import deque
+from typing import Any
+
+import httpx
+
+from .rate_limit import TokenBucket
+from ..config import HedgingSettings, hedging_settings
+
+
+
+def _discard(task: 'asyncio.Task[httpx.Response]') -> None:
+    '''отменяет проигравшую попытку; если она уже успела получить ответ - закрывает его'''
+    def close(t: 'asyncio.Task[httpx.Response]') -> None:
+        if not t.cancelled() and t.exception() is None:
+            asyncio.ensure_future(t.result().aclose())
+
+    task.cancel()
+    task.add_done_callback(close)
+
+
+
+class Hedger:
+    '''
+    состояние hedged requests: задержки последних sample_size успешных ответов и p95 по ним.
+    до min_samples (или при выключенной настройке) хеджирования нет
+    '''
+    def __init__(self, settings: HedgingSettings = hedging_settings) -> None:
+        self.settings = settings
+
+        self._latencies: deque[float] = deque(maxlen=settings.sample_size)
+
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.skipped = 0  # вторая попытка была нужна, но свободного токена не нашлось
+
+
+    def observe(self, latency: float) -> None:
+        self._latencies.append(latency)
+
+
+    def hedge_delay(self) -> float | None:
+        if not self.settings.enabled or len(self._latencies) < self.settings.min_samples:
+            return None
+
+        ordered = sorted(self._latencies)
+        p95 = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+
+        return max(p95, float(self.settings.min_delay))
+
+
+    def stats(self) -> dict[str, Any]:
+        delay = self.hedge_delay()
+
+        return {
+            'enabled': self.settings.enabled,
+            'samples': len(self._latencies),
+            'hedge_delay': round(delay, 3) if delay is not None else None,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'skipped': self.skipped
+        }
+
+
+
+class HedgingTransport(httpx.AsyncBaseTransport):
+    '''
+    обертка над транспортом httpx: если GET не получил ответ за p95 последних задержек,
+    параллельно отправляется вторая попытка, берется тот ответ, что пришел первым.
+    стоит внутри RateLimitedTransport: отсчет задержки начинается, когда первая попытка уже получила токен,
+    а вторая отправляется, только если в bucket есть свободный токен (без ожидания в очереди)
+    '''
+    def __init__(self, transport: httpx.AsyncBaseTransport, hedger: Hedger, bucket: TokenBucket | None = None) -> None:
+        self._transport = transport
+        self.hedger = hedger
+        self.bucket = bucket
+
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        start = time.monotonic()
+        response = await self._transport.handle_async_request(request)
+
+        if response.status_code < 500:
+            self.hedger.observe(time.monotonic() - start)
+
+        return response
+
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        delay = self.hedger.hedge_delay()
+
+        if delay is None or request.method != 'GET':
+            return await self._send(request)
+
+        first = asyncio.ensure_future(self._send(request))
+        attempts = [first]
+        winner: asyncio.Task[httpx.Response] | None = None
+
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+
+            if not done:
+                if self.bucket is None or self.bucket.try_acquire():
+                    self.hedger.hedged += 1
+                    attempts.append(asyncio.ensure_future(self._send(request)))
+                else:
+                    self.hedger.skipped += 1
+
+            pending = set(attempts)
+            error: BaseException | None = None
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    exc = task.exception()
+
+                    if exc is None:
+                        if task is not first:
+                            self.hedger.hedge_wins += 1
+
+                        winner = task
+                        return task.result()
+
+                    error = error or exc
+
+            assert error is not None
+            raise error
+
+        finally:
+            for task in attempts:
+                if task is not winner:
+                    _discard(task)
+
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
\ No newline at end of file
@@ -3,7 +3,8 @@ from fastapi import Depends
 from typing import Optional, Any
 
 from .areas_index import AreaResolver
-from .metro_index import MetroResolver
+from .metro_index import MetroResolver, parse_coordinates
+from .resolution import FALLBACK
 from ..basemodels import AuthGetVacanciesModel, GetVacanciesModel
 
 
@@ -106,10 +107,16 @@ def auth_create_query_params(
         if schedule:
             query_params['schedule'] = schedule
 
+    area_ids: tuple[str, ...] = ()
+
     if params.area and area_resolver is not None:
-        ids = area_resolver.resolve(params.area)
+        area = area_resolver.resolve_detailed(params.area)
 
-        query_params['area'] = ids
+        query_params['area'] = list(area.ids)
+
+        # регион по умолчанию (ничего не найдено) не сужает поиск станций
+        if area.kind != FALLBACK:
+            area_ids = area.ids
 
     if params.salary:
         query_params['salary'] = params.salary
@@ -118,7 +125,16 @@ def auth_create_query_params(
         query_params['currency'] = params.currency
 
     if getattr(params, 'metro', None) and metro_resolver is not None:
-        station_ids = metro_resolver.resolve(params.metro)
+        coordinates = parse_coordinates(params.metro)
+
+        if coordinates:
+            # "широта,долгота[,радиус км]" - станции вокруг точки по сетке координат
+            station_ids = metro_resolver.resolve_coordinates(*coordinates)
+        else:
+            # станции ищутся только в городах с метро внутри выбранного региона
+            city_ids = area_resolver.within(area_ids, metro_resolver.table.city_ids) if area_ids and area_resolver else None
+            station_ids = metro_resolver.resolve(params.metro, city_ids)
+
         if station_ids:
             query_params['metro'] = station_ids
 
@@ -199,3 +215,42 @@ def create_query_params(
 
 
     return query_params
+
+
+
+def build_params_for_httpx(query_params: dict[str, Any]) -> list[tuple[str, str | int | float | bool | None]]:
+    '''разворачивает query_params в список пар для httpx (списки -> повторяющиеся ключи, None пропускаются)'''
+    params_for_httpx: list[tuple[str, str | int | float | bool | None]] = []
+
+    for k, v in query_params.items():
+        if v is None:
+            continue
+
+        if isinstance(v, (list, tuple)):
+            for item in v:
+                params_for_httpx.append((k, str(item)))
+
+        else:
+            params_for_httpx.append((k, str(v)))
+
+    return params_for_httpx
+
+
+
+def item_area_id(item: Any) -> str:
+    return str((item.get('area') or {}).get('id', ''))
+
+
+def filter_by_region(items: list[Any], area_resolver: AreaResolver, region: str) -> tuple[list[Any], list[str]]:
+    '''
+    локальный фильтр уже загруженных вакансий: остаются те, чей area.id совпадает с регионом или лежит
+    внутри него (интервалы обхода дерева areas, без запросов к HH). возвращает (вакансии, id региона);
+    ненайденный регион не фильтрует ничего
+    '''
+    resolution = area_resolver.resolve_detailed(region)
+
+    if resolution.kind == FALLBACK:
+        return items, []
+
+    inside = set(area_resolver.within(resolution.ids, {item_area_id(item) for item in items}))
+    return [item for item in items if item_area_id(item) in inside], list(resolution.ids)
\ No newline at end of file
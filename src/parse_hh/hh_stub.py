@@ -0,0 +1,198 @@
+# локальная замена API HH для нагрузочных тестов и бенчмарков:
+# /vacancies, /vacancies/{id}, /areas и /metro с ответами в формате HH,
+# настраиваемой задержкой, долей ошибок, 429 и размером ответов.
+#
+# запуск: uvicorn src.parse_hh.hh_stub:app --port 10001
+# приложение направляется на него через HH_BASE_URL=http://localhost:10001
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import FileResponse, JSONResponse
+from starlette import status
+
+import os
+import math
+import random
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from ..config import HHStubSettings, hh_stub_settings
+
+
+
+DATA_DIR = Path(__file__).resolve().parent
+
+NAMES = ['Python-разработчик', 'Backend-разработчик', 'Аналитик данных', 'DevOps-инженер', 'Frontend-разработчик',
+         'QA-инженер', 'Менеджер проектов', 'Системный администратор', 'Data Scientist', 'Go-разработчик']
+EMPLOYERS = ['Яндекс', 'Сбер', 'Тинькофф', 'VK', 'Ozon', 'Авито', 'Касперский', 'МТС', 'Wildberries', 'Ростелеком']
+AREAS = [('1', 'Москва'), ('2', 'Санкт-Петербург'), ('3', 'Екатеринбург'), ('4', 'Новосибирск'), ('88', 'Казань')]
+STATIONS = [('8.189', 'Новокосино'), ('5.107', 'Курская'), ('1.3', 'Охотный ряд'), ('14.198', 'Деловой центр')]
+EXPERIENCE = [('noExperience', 'Нет опыта'), ('between1And3', 'От 1 года до 3 лет'), ('between3And6', 'От 3 до 6 лет')]
+SCHEDULE = [('fullDay', 'Полный день'), ('remote', 'Удаленная работа'), ('flexible', 'Гибкий график')]
+WORDS = ['опыт', 'разработки', 'знание', 'SQL', 'Docker', 'асинхронного', 'кода', 'команда', 'задачи', 'продукт']
+
+
+
+def _rng(*parts: Any) -> random.Random:
+    '''детерминированный генератор: одинаковый запрос -> одинаковый ответ'''
+    digest = hashlib.sha256('|'.join(map(str, parts)).encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], 'big'))
+
+
+def _text(rng: random.Random, size: int) -> str:
+    words: list[str] = []
+    length = 0
+
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+
+    return ' '.join(words)
+
+
+def generate_item(vacancy_id: str, settings: HHStubSettings) -> dict[str, Any]:
+    rng = _rng('item', vacancy_id)
+    area_id, area_name = rng.choice(AREAS)
+    station_id, station_name = rng.choice(STATIONS)
+    experience_id, experience_name = rng.choice(EXPERIENCE)
+    schedule_id, schedule_name = rng.choice(SCHEDULE)
+    salary_from = rng.randrange(50, 400) * 1000
+
+    return {
+        'id': vacancy_id,
+        'premium': rng.random() < 0.1,
+        'name': rng.choice(NAMES),
+        'area': {'id': area_id, 'name': area_name, 'url': f'{settings.public_url}/areas/{area_id}'},
+        'salary': {'from': salary_from, 'to': salary_from + rng.randrange(0, 200) * 1000, 'currency': 'RUR', 'gross': False},
+        'address': {
+            'raw': f'{area_name}, улица {rng.choice(WORDS)}, {rng.randrange(1, 100)}',
+            'metro': {'station_id': station_id, 'station_name': station_name},
+            'metro_stations': [{'station_id': station_id, 'station_name': station_name}]
+        },
+        'employer': {'id': str(rng.randrange(1, 10**6)), 'name': rng.choice(EMPLOYERS), 'trusted': True},
+        'snippet': {
+            'requirement': _text(rng, settings.snippet_bytes // 2),
+            'responsibility': _text(rng, settings.snippet_bytes // 2)
+        },
+        'experience': {'id': experience_id, 'name': experience_name},
+        'schedule': {'id': schedule_id, 'name': schedule_name},
+        'employment': {'id': 'full', 'name': 'Полная занятость'},
+        'published_at': f'2025-0{rng.randrange(1, 10)}-1{rng.randrange(0, 10)}T10:00:00+0300',
+        'alternate_url': f'https://hh.ru/vacancy/{vacancy_id}',
+        'url': f'{settings.public_url}/vacancies/{vacancy_id}'
+    }
+
+
+def generate_search(query: list[tuple[str, str]], page: int, per_page: int, settings: HHStubSettings) -> dict[str, Any]:
+    query_key = '&'.join(f'{k}={v}' for k, v in sorted(query) if k not in ('page', 'per_page'))
+    found = _rng('found', query_key).randrange(0, settings.max_found + 1)
+    pages = math.ceil(min(found, 2000) / per_page) if per_page else 0
+
+    first = page * per_page
+    count = max(min(per_page, min(found, 2000) - first), 0)
+    base = _rng('base', query_key).randrange(10**7, 9 * 10**7)
+
+    return {
+        'items': [generate_item(str(base + first + i), settings) for i in range(count)],
+        'found': found,
+        'pages': pages,
+        'page': page,
+        'per_page': per_page,
+        'clusters': None,
+        'arguments': None,
+        'alternate_url': 'https://hh.ru/search/vacancy'
+    }
+
+
+
+app = FastAPI(title='hh_stub')
+app.state.settings = hh_stub_settings
+
+
+@app.middleware('http')
+async def inject_faults(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    '''задержка по логнормальному распределению, затем с заданной вероятностью 429 или 5xx'''
+    settings: HHStubSettings = request.app.state.settings
+
+    if request.url.path.startswith('/_stub'):
+        return await call_next(request)
+
+    if settings.latency_median_ms > 0:
+        latency = random.lognormvariate(math.log(settings.latency_median_ms / 1000), settings.latency_sigma)
+        await asyncio.sleep(latency)
+
+    roll = random.random()
+
+    if roll < settings.throttle_rate:
+        return JSONResponse(
+            {'errors': [{'type': 'too_many_requests'}]},
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={'Retry-After': str(settings.retry_after)}
+        )
+
+    if roll < settings.throttle_rate + settings.error_rate:
+        return JSONResponse(
+            {'errors': [{'type': 'server_error'}]},
+            status_code=random.choice([500, 502, 503])
+        )
+
+    return await call_next(request)
+
+
+@app.get('/vacancies')
+async def stub_vacancies(request: Request, page: int = 0, per_page: int = 20) -> dict[str, Any]:
+    settings: HHStubSettings = request.app.state.settings
+    return generate_search(list(request.query_params.multi_items()), page, min(per_page, 100), settings)
+
+
+@app.get('/vacancies/{vacancy_id}')
+async def stub_vacancy(request: Request, vacancy_id: str) -> Any:
+    settings: HHStubSettings = request.app.state.settings
+
+    if _rng('exists', vacancy_id).random() < settings.not_found_rate:
+        return JSONResponse({'errors': [{'type': 'not_found'}]}, status_code=status.HTTP_404_NOT_FOUND)
+
+    item = generate_item(vacancy_id, settings)
+    item['description'] = _text(_rng('description', vacancy_id), settings.description_bytes)
+    item['key_skills'] = [{'name': word} for word in WORDS[:5]]
+
+    return item
+
+
+def dictionary_response(request: Request, filename: str) -> Response:
+    '''справочник из файла с ETag и Last-Modified; на условный запрос с тем же ETag - 304 без тела'''
+    settings: HHStubSettings = request.app.state.settings
+    path = Path(settings.data_dir or DATA_DIR) / filename
+
+    # с stat_result FileResponse выставляет ETag сразу при создании, но сам If-None-Match не проверяет
+    response = FileResponse(path, media_type='application/json', stat_result=os.stat(path))
+
+    if request.headers.get('if-none-match') == response.headers['etag']:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'etag': response.headers['etag']})
+
+    return response
+
+
+@app.get('/areas')
+async def stub_areas(request: Request) -> Response:
+    return dictionary_response(request, 'areas.json')
+
+
+@app.get('/metro')
+async def stub_metro(request: Request) -> Response:
+    return dictionary_response(request, 'metro.json')
+
+
+@app.get('/_stub/config')
+async def get_stub_config(request: Request) -> HHStubSettings:
+    settings: HHStubSettings = request.app.state.settings
+    return settings
+
+
+@app.post('/_stub/config')
+async def update_stub_config(request: Request, settings: HHStubSettings) -> HHStubSettings:
+    '''смена задержек/ошибок на лету, без перезапуска (например, между прогонами бенчмарка)'''
+    request.app.state.settings = settings
+    return settings
\ No newline at end of file
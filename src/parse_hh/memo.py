@@ -0,0 +1,110 @@
+from collections import OrderedDict
+from typing import Any, Callable
+
+from .resolution import Resolution
+from ..config import ResolveMemoSettings, resolve_memo_settings
+
+
+
+class ResolveMemo:
+    '''
+    ограниченный LRU-memo для resolve() справочников. два уровня:
+      raw - строка пользователя как есть ("г. Москва") -> Resolution, без нормализации и регулярок;
+      normalized - нормализованная строка ("москва") -> Resolution, общий для всех вариантов написания.
+    кэшируется и результат fuzzy-поиска, поэтому повтор опечатки - тоже попадание в словарь.
+    Resolution неизменяем (ids - кортеж), поэтому вызывающий не испортит кэш
+    '''
+    def __init__(self, max_entries: int = 4096) -> None:
+        self.max_entries = max_entries
+
+        self._raw: OrderedDict[str, Resolution] = OrderedDict()
+        self._normalized: OrderedDict[str, Resolution] = OrderedDict()
+
+        self.raw_hits = 0
+        self.normalized_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    @classmethod
+    def from_settings(cls, settings: ResolveMemoSettings = resolve_memo_settings) -> 'ResolveMemo':
+        return cls(settings.max_entries)
+
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+
+    def _get(self, entries: OrderedDict[str, Resolution], key: str) -> Resolution | None:
+        resolution = entries.get(key)
+
+        if resolution is not None:
+            entries.move_to_end(key)
+
+        return resolution
+
+
+    def _set(self, entries: OrderedDict[str, Resolution], key: str, resolution: Resolution) -> None:
+        entries[key] = resolution
+        entries.move_to_end(key)
+
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+
+    def resolve(
+        self, user_input: str, normalize: Callable[[str], str], compute: Callable[[str], Resolution]
+    ) -> Resolution:
+        '''результат для user_input: из raw-кэша, иначе из normalized-кэша, иначе compute(normalize(user_input))'''
+        if self.max_entries <= 0:
+            return compute(normalize(user_input))
+
+        resolution = self._get(self._raw, user_input)
+
+        if resolution is not None:
+            self.raw_hits += 1
+            return resolution
+
+        resolution = self.resolve_normalized(normalize(user_input), compute)
+        self._set(self._raw, user_input, resolution)
+
+        return resolution
+
+
+    def resolve_normalized(self, norm: str, compute: Callable[[str], Resolution]) -> Resolution:
+        '''результат для уже нормализованной строки - только через normalized-кэш'''
+        if self.max_entries <= 0:
+            return compute(norm)
+
+        resolution = self._get(self._normalized, norm)
+
+        if resolution is not None:
+            self.normalized_hits += 1
+            return resolution
+
+        self.misses += 1
+        resolution = compute(norm)
+        self._set(self._normalized, norm, resolution)
+
+        return resolution
+
+
+    def clear(self) -> None:
+        self._raw.clear()
+        self._normalized.clear()
+
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.raw_hits + self.normalized_hits + self.misses
+
+        return {
+            'raw_entries': len(self._raw),
+            'normalized_entries': len(self._normalized),
+            'max_entries': self.max_entries,
+            'raw_hits': self.raw_hits,
+            'normalized_hits': self.normalized_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.raw_hits + self.normalized_hits) / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions
+        }
\ No newline at end of file
@@ -1,10 +1,23 @@
-import json
 import re
-import difflib
+import sys
+import json
+import math
 import pathlib
-from collections import defaultdict
+from array import array
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import Mapping, Sequence
 from typing import Any
 
+from .memo import ResolveMemo
+from .resolution import Resolution, EXACT, PART, FUZZY, FALLBACK
+from .symspell_index import SymSpellIndex
+from .geo_index import GeoGrid
+from .prefix_index import top_by_prefix
+from .translit import add_alternate_keys, frozen_name_map, has_latin, latin_key
+from .snapshot import load_or_build
+from .shared_index import MappedFile, MappedWriter, load_or_build_shared
+from ..config import SnapshotSettings, snapshot_settings, resolve_memo_settings
+
 
 
 PREFIXES_RE = re.compile(
@@ -12,6 +25,15 @@ PREFIXES_RE = re.compile(
 )
 NON_ALNUM_RE = re.compile(r'[^0-9\w\sа-яё\-]', flags=re.IGNORECASE)
 
+NOT_FOUND = Resolution((), FALLBACK, 0.0)  # у метро нет значения по умолчанию - пустой список
+
+NEARBY_RADIUS_KM = 1.5  # радиус фильтра metro по координатам без явного радиуса
+NEARBY_MAX_RADIUS_KM = 50.0  # дальше этого ближайшие станции не ищутся (в городе без метро - пустой ответ)
+NEARBY_MAX_STATIONS = 50  # больше станций в фильтр metro не попадает
+
+# координаты вместо названия станции в фильтре metro: "55.75,37.62" или "55.75,37.62,1.5" (радиус, км)
+COORDINATES_RE = re.compile(r'^\s*(-?\d{1,2}(?:\.\d+)?)\s*[,;]\s*(-?\d{1,3}(?:\.\d+)?)\s*(?:[,;]\s*(\d+(?:\.\d+)?)\s*)?$')
+
 
 
 def normalize_name(name: str) -> str:
@@ -26,119 +48,493 @@ def normalize_name(name: str) -> str:
 
 
 
+class MetroTable:
+    '''
+    города, линии и станции метро в параллельных массивах; станция - ее номер в table.
+    у станции хранится только номер линии, у линии - номер города, а "path" собирается по запросу.
+    имена интернированы: нормализованное имя станции - тот же объект, что и ключ name_map
+    '''
+    STRING_COLUMNS = ('city_ids', 'city_names', 'line_ids', 'line_names', 'station_ids', 'station_names', 'station_keys')
+    INDEX_COLUMNS = ('line_cities', 'station_lines')  # номер города линии и номер линии станции
+    COORD_COLUMNS = ('station_lats', 'station_lngs')  # nan - координат у станции нет
+
+
+    def __init__(
+        self, *,
+        city_ids: Sequence[str], city_names: Sequence[str],
+        line_ids: Sequence[str], line_names: Sequence[str], line_cities: Sequence[int],
+        station_ids: Sequence[str], station_names: Sequence[str], station_keys: Sequence[str], station_lines: Sequence[int],
+        station_lats: Sequence[float], station_lngs: Sequence[float]
+    ) -> None:
+        # колонки - списки/array при сборке из json или представления поверх общего файла (shared_index)
+        self.city_ids = city_ids
+        self.city_names = city_names
+
+        self.line_ids = line_ids
+        self.line_names = line_names
+        self.line_cities = line_cities
+
+        self.station_ids = station_ids
+        self.station_names = station_names
+        self.station_keys = station_keys  # normalize_name(station_name)
+        self.station_lines = station_lines
+        self.station_lats = station_lats
+        self.station_lngs = station_lngs
+
+
+    def __len__(self) -> int:
+        return len(self.station_ids)
+
+
+    def city_of(self, station: int) -> int:
+        return self.line_cities[self.station_lines[station]]
+
+
+    def path(self, station: int) -> str:
+        line = self.station_lines[station]
+        return f"{self.city_names[self.line_cities[line]]} > {self.line_names[line]} > {self.station_names[station]}"
+
+
+    def entry(self, station: int) -> dict[str, Any]:
+        '''станция в прежнем словарном виде {id, station_name, city_id, city_name, line_id, line_name, path, depth, lat, lng}'''
+        line = self.station_lines[station]
+        city = self.line_cities[line]
+
+        return {
+            "id": self.station_ids[station],
+            "station_name": self.station_names[station],
+            "city_id": self.city_ids[city],
+            "city_name": self.city_names[city],
+            "line_id": self.line_ids[line],
+            "line_name": self.line_names[line],
+            "path": self.path(station),
+            "depth": 2,
+            "lat": None if math.isnan(self.station_lats[station]) else self.station_lats[station],
+            "lng": None if math.isnan(self.station_lngs[station]) else self.station_lngs[station],
+        }
+
+
+
+def coordinate(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) else math.nan
+
+
+
 def build_metro_index(metro_json: list[dict[str, Any]]
-                     ) -> tuple[dict[str, list[dict[str, Any]]], list[str]]:
+                     ) -> tuple[MetroTable, Mapping[str, Sequence[int]], list[str]]:
     '''
     преобразует JSON метро в индекс:
-      name_map: normalized_station_name -> list of entries {
-          id, station_name, city_id, city_name, line_id, line_name, path, depth}
-    возвращает (name_map, all_names)
+      table: MetroTable (city -> line -> station)
+      name_map: normalized_station_name / "город станция" / "линия станция" -> номера станций в table
+    возвращает (table, name_map, all_names)
     '''
-    name_map: dict[str, list[dict[str, Any]]] = defaultdict(list)
-    all_names: list[str] = []
+    columns: dict[str, Any] = {name: [] for name in MetroTable.STRING_COLUMNS}
+    columns.update({name: array('H') for name in MetroTable.INDEX_COLUMNS})
+    columns.update({name: array('d') for name in MetroTable.COORD_COLUMNS})
+
+    name_map: dict[str, list[int]] = defaultdict(list)
 
 
     for city in metro_json:
-        city_id = str(city.get("id", ""))
         city_name = city.get("name", "")
+        city_index = len(columns["city_ids"])
+
+        columns["city_ids"].append(sys.intern(str(city.get("id", ""))))
+        columns["city_names"].append(sys.intern(city_name))
+
         for line in city.get("lines", []):
-            line_id = str(line.get("id", ""))
             line_name = line.get("name", "")
+            line_index = len(columns["line_ids"])
+
+            columns["line_ids"].append(sys.intern(str(line.get("id", ""))))
+            columns["line_names"].append(sys.intern(line_name))
+            columns["line_cities"].append(city_index)
+
             for station in line.get("stations", []):
-                station_id = str(station.get("id", ""))
                 station_name = station.get("name", "")
-                # depth = 2 (city -> line -> station)
-                entry = {
-                    "id": station_id,
-                    "station_name": station_name,
-                    "city_id": city_id,
-                    "city_name": city_name,
-                    "line_id": line_id,
-                    "line_name": line_name,
-                    "path": f"{city_name} > {line_name} > {station_name}",
-                    "depth": 2,
-                }
-                norm = normalize_name(station_name)
+                norm = sys.intern(normalize_name(station_name))
+                index = len(columns["station_ids"])
+
+                columns["station_ids"].append(str(station.get("id", "")))
+                columns["station_names"].append(sys.intern(station_name))
+                columns["station_keys"].append(norm)
+                columns["station_lines"].append(line_index)
+                columns["station_lats"].append(coordinate(station.get("lat")))
+                columns["station_lngs"].append(coordinate(station.get("lng")))
 
                 if norm:
-                    name_map[norm].append(entry)
-                    all_names.append(norm)
+                    name_map[norm].append(index)
 
                 combo1 = normalize_name(f"{city_name} {station_name}")
 
                 if combo1 and combo1 != norm:
-                    name_map[combo1].append(entry)
-                    all_names.append(combo1)
+                    name_map[sys.intern(combo1)].append(index)
 
                 combo2 = normalize_name(f"{line_name} {station_name}")
 
                 if combo2 and combo2 != norm and combo2 != combo1:
-                    name_map[combo2].append(entry)
-                    all_names.append(combo2)
+                    name_map[sys.intern(combo2)].append(index)
+
 
+    # транслит ("novokosino") и сокращения слов ("пл ленина", "просп мира") - тоже точные ключи
+    add_alternate_keys(name_map)
 
-    all_names = sorted(set(all_names))
-    return name_map, all_names
+    all_names = sorted(name_map)
+    return MetroTable(**columns), frozen_name_map(name_map), all_names
 
 
 
-def choose_best_candidate(candidates: list[dict[str, Any]]) -> list[str]:
+def choose_best_candidate(table: MetroTable, candidates: Sequence[int]) -> list[str]:
     '''
-    возвращает список id лучших кандидатов среди candidates.
-    берет максимальную глубину (в нашем случае все станции depth=2),
-    если несколько одинаковых — возвращает уникальные id.
+    возвращает уникальные id станций candidates
+    (раньше выбиралась максимальная глубина, но у всех станций depth=2)
     '''
-    if not candidates:
-        return []
+    return list(dict.fromkeys(table.station_ids[c] for c in candidates))
 
-    max_depth = max(c["depth"] for c in candidates)
-    best = [c for c in candidates if c["depth"] == max_depth]
 
-    return list({c["id"] for c in best})
+
+def build_station_index(table: MetroTable) -> SymSpellIndex:
+    '''edit-distance индекс только по названиям станций, без комбинаций "город + станция"/"линия + станция"'''
+    return SymSpellIndex(key for key in set(table.station_keys) if key)
+
+
+
+def build_station_grid(table: MetroTable) -> GeoGrid:
+    return GeoGrid(table.station_lats, table.station_lngs)
+
+
+
+def parse_coordinates(user_input: str) -> tuple[float, float, float | None] | None:
+    '''(широта, долгота, радиус или None) из строки "55.75,37.62[,1.5]"; None - это не координаты'''
+    m = COORDINATES_RE.match(user_input)
+
+    if not m:
+        return None
+
+    lat, lng = float(m.group(1)), float(m.group(2))
+
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+
+    return lat, lng, float(m.group(3)) if m.group(3) else None
+
+
+
+def metro_city_station_counts(path: str) -> dict[str, int]:
+    '''число станций в каждом городе прямо из metro.json - без построения MetroResolver (веса городов для areas)'''
+    metro_json = json.loads(pathlib.Path(path).read_text(encoding='utf-8'))
+
+    return {
+        str(city.get("id", "")): sum(len(line.get("stations", [])) for line in city.get("lines", []))
+        for city in metro_json
+    }
+
+
+
+def max_typo_distance(norm: str) -> int:
+    '''сколько опечаток допускается для строки: одна для коротких названий, две для длинных'''
+    return 1 if len(norm) < 8 else 2
+
+
+
+class CityScope:
+    '''memo и edit-distance индекс запросов, ограниченных одним набором городов'''
+    def __init__(self, max_entries: int) -> None:
+        self.memo = ResolveMemo(max_entries)
+        self.index: SymSpellIndex | None = None
 
 
 
 class MetroResolver:
-    def __init__(self, name_map: dict[str, list[dict[str, Any]]], all_names: list[str]) -> None:
+    def __init__(
+        self, table: MetroTable, name_map: Mapping[str, Sequence[int]], all_names: Sequence[str],
+        station_index: SymSpellIndex | None = None, station_grid: GeoGrid | None = None, memo: ResolveMemo | None = None
+    ) -> None:
+        self.table = table
         self.name_map = name_map
         self.all_names = all_names
 
+        self.station_index = station_index or build_station_index(table)
+        self.station_grid = station_grid or build_station_grid(table)
+        self.memo = memo or ResolveMemo.from_settings()
+
+        # число станций в городе - грубая оценка размера города для ранжирования подсказок
+        counts = Counter(table.city_of(station) for station in range(len(table)))
+        self.city_station_counts = {table.city_ids[city]: count for city, count in counts.items()}
+
+        # город (id HH - тот же, что в areas) -> его номер в table. у каждого набора городов свои memo
+        # (одна строка в разных городах - разные станции) и edit-distance индекс по его станциям, строятся
+        # при первом запросе с этим набором. наборов хранится не больше max_scopes, давно не нужные вытесняются
+        self.city_numbers = {city_id: city for city, city_id in enumerate(table.city_ids)}
+        self.scopes: OrderedDict[tuple[int, ...], CityScope] = OrderedDict()
+        self.max_scopes = resolve_memo_settings.max_scopes
+        self.scope_max_entries = resolve_memo_settings.scope_max_entries
+
+
+    def known_ids(self) -> set[str]:
+        '''id всех станций справочника (для сравнения версий при обновлении)'''
+        return set(self.table.station_ids)
+
+
+    def city_scope(self, city_ids: Sequence[str] | None) -> tuple[int, ...] | None:
+        '''
+        номера городов для поиска только по их станциям. None - искать по всем городам
+        (города не заданы или заданы все), пустой кортеж - ни в одном из городов нет метро
+        '''
+        if city_ids is None:
+            return None
+
+        scope = tuple(sorted({self.city_numbers[city_id] for city_id in city_ids if city_id in self.city_numbers}))
+        return None if len(scope) == len(self.table.city_ids) else scope
+
+
+    def city_scope_state(self, scope: tuple[int, ...]) -> CityScope:
+        '''memo и индекс набора городов scope (LRU по наборам)'''
+        state = self.scopes.get(scope)
+
+        if state is not None:
+            self.scopes.move_to_end(scope)
+            return state
+
+        state = self.scopes[scope] = CityScope(self.scope_max_entries)
 
-    def resolve(self, user_input: str | None) -> list[str]:
+        while len(self.scopes) > self.max_scopes:
+            self.scopes.popitem(last=False)
+
+        return state
+
+
+    def scoped_index(self, scope: tuple[int, ...]) -> SymSpellIndex:
+        '''edit-distance индекс только по станциям городов scope'''
+        state = self.city_scope_state(scope)
+
+        if state.index is None:
+            cities = set(scope)
+            keys = {self.table.station_keys[station] for station in range(len(self.table)) if self.table.city_of(station) in cities}
+
+            state.index = SymSpellIndex(key for key in keys if key)
+
+        return state.index
+
+
+    def in_scope(self, candidates: Sequence[int], scope: tuple[int, ...] | None) -> list[int]:
+        if scope is None:
+            return list(candidates)
+
+        return [station for station in candidates if self.table.city_of(station) in scope]
+
+
+    def closest(
+        self, user_input: str, max_distance: int | None = None, limit: int = 5, city_ids: Sequence[str] | None = None
+    ) -> list[tuple[str, int]]:
+        '''
+        ближайшие по расстоянию Левенштейна названия станций: [(normalized_name, distance)], лучшие первыми.
+        с city_ids - только среди станций этих городов
+        '''
+        return self.closest_normalized(normalize_name(user_input), max_distance, limit, self.city_scope(city_ids))
+
+
+    def closest_normalized(
+        self, norm: str, max_distance: int | None = None, limit: int = 5, scope: tuple[int, ...] | None = None
+    ) -> list[tuple[str, int]]:
+        if not norm or scope == ():
+            return []
+
+        if max_distance is None:
+            max_distance = max_typo_distance(norm)
+
+        index = self.station_index if scope is None else self.scoped_index(scope)
+        return [(name, distance) for distance, name in index.search(norm, max_distance)[:limit]]
+
+
+    def resolve(self, user_input: str | None, city_ids: Sequence[str] | None = None) -> list[str]:
         '''
         преобразует строку пользователя в список station ids (например "8.189").
+        с city_ids (id городов HH, например area из запроса) ищет только станции этих городов.
         если ничего не найдено — возвращает пустой список.
         '''
+        return list(self.resolve_detailed(user_input, city_ids).ids)
+
+
+    def resolve_detailed(self, user_input: str | None, city_ids: Sequence[str] | None = None) -> Resolution:
+        '''то же, что resolve, но с видом совпадения (exact / part / fuzzy / fallback) и его оценкой'''
         if not user_input:
-            return []
+            return NOT_FOUND
 
-        norm = normalize_name(user_input)
-        if not norm:
-            return []
+        scope = self.city_scope(city_ids)
+
+        if scope is None:
+            return self.memo.resolve(user_input, normalize_name, self.match)
+
+        return self.city_scope_state(scope).memo.resolve(user_input, normalize_name, lambda norm: self.match(norm, scope))
+
+
+    def resolve_many(self, inputs: Sequence[str]) -> list[Resolution]:
+        '''пакетный resolve_detailed: одинаковые после нормализации строки ищутся один раз'''
+        norms = [normalize_name(user_input) for user_input in inputs]
+        resolved = {norm: self.memo.resolve_normalized(norm, self.match) for norm in dict.fromkeys(norms)}
+
+        return [resolved[norm] for norm in norms]
+
+
+    def match(self, norm: str, scope: tuple[int, ...] | None = None) -> Resolution:
+        '''поиск по уже нормализованной строке, без memo; scope - номера городов из city_scope()'''
+        if not norm or scope == ():
+            return NOT_FOUND
+
+        # латиница ищется по латинским ключам ("novokosino", "okhotny ryad" -> "ohotni riad")
+        if norm not in self.name_map and has_latin(norm):
+            norm = latin_key(norm)
 
         # точное совпадение
-        if norm in self.name_map:
-            return choose_best_candidate(self.name_map[norm])
+        candidates = self.in_scope(self.name_map.get(norm, ()), scope)
+
+        if candidates:
+            return Resolution(tuple(choose_best_candidate(self.table, candidates)), EXACT, 1.0, norm)
 
         # частями (например "москва новокосино" -> "новокосино")
         parts = [p for p in norm.split(' ') if p]
         for part in reversed(parts):
-            if part in self.name_map:
-                return choose_best_candidate(self.name_map[part])
+            candidates = self.in_scope(self.name_map.get(part, ()), scope)
+
+            if candidates:
+                ids = tuple(choose_best_candidate(self.table, candidates))
+                return Resolution(ids, PART, len(part) / len(norm), part)
+
+        # fuzzy: SymSpell-индекс по станциям (всех или только нужных городов), сначала вся строка, потом части
+        for query in [norm, *reversed(parts)]:
+            matches = self.closest_normalized(query, limit=1, scope=scope)
+
+            if matches:
+                best_norm, distance = matches[0]
+                ids = tuple(choose_best_candidate(self.table, self.in_scope(self.name_map.get(best_norm, ()), scope)))
+                # оценка - 1 - доля правок от длины, как у нормированного расстояния Левенштейна
+                return Resolution(ids, FUZZY, 1 - distance / max(len(query), len(best_norm)), best_norm)
+
+        return NOT_FOUND
+
+
+    def nearby(
+        self, lat: float, lng: float, radius_km: float | None = None, limit: int = 10
+    ) -> list[tuple[int, float]]:
+        '''
+        станции рядом с точкой по сетке координат: с radius_km - все не дальше radius_km (не больше limit),
+        без него - limit ближайших не дальше NEARBY_MAX_RADIUS_KM. [(станция, расстояние км)], ближайшие первыми
+        '''
+        if radius_km is None:
+            found = self.station_grid.nearest(lat, lng, limit, NEARBY_MAX_RADIUS_KM)
+        else:
+            found = self.station_grid.within(lat, lng, radius_km)[:limit]
+
+        return [(station, distance) for distance, station in found]
+
+
+    def nearby_entries(
+        self, lat: float, lng: float, radius_km: float | None = None, limit: int = 10
+    ) -> list[dict[str, Any]]:
+        '''то же, что nearby, в виде ответа API: entry станции и distance_km'''
+        return [
+            {**self.table.entry(station), "distance_km": round(distance, 3)}
+            for station, distance in self.nearby(lat, lng, radius_km, limit)
+        ]
+
+
+    def resolve_coordinates(self, lat: float, lng: float, radius_km: float | None = None) -> list[str]:
+        '''id станций в радиусе от точки (по умолчанию NEARBY_RADIUS_KM) - фильтр metro по координатам'''
+        radius_km = min(radius_km or NEARBY_RADIUS_KM, NEARBY_MAX_RADIUS_KM)
+        stations = self.station_grid.within(lat, lng, radius_km)[:NEARBY_MAX_STATIONS]
+        return choose_best_candidate(self.table, [station for _, station in stations])
+
+
+    def suggest_rank(self, name: str, station: int, prefix: str) -> tuple[Any, ...]:
+        '''полное совпадение -> совпадение по самой станции, а не "город/линия + станция" -> больший город -> короче имя'''
+        is_combo = name != self.table.station_keys[station]
+        city_size = self.city_station_counts.get(self.table.city_ids[self.table.city_of(station)], 0)
+
+        return (name != prefix, is_combo, -city_size, len(name), station)
+
+
+    def suggest(self, user_input: str, limit: int = 10) -> list[dict[str, Any]]:
+        '''подсказки по началу названия станции (или "город станция", "линия станция"): [{id, name, path, city_id, line_name}]'''
+        prefix = normalize_name(user_input)
+        if not prefix:
+            return []
+
+        if has_latin(prefix):
+            prefix = latin_key(prefix)
+
+        stations = top_by_prefix(
+            self.all_names, prefix,
+            expand=lambda name: self.name_map.get(name, ()),
+            rank=lambda name, station: self.suggest_rank(name, station, prefix),
+            identity=lambda station: station,
+            limit=limit
+        )
+
+        result = []
+
+        for station in stations:
+            e = self.table.entry(station)
+            result.append({"id": e["id"], "name": e["station_name"], "path": e["path"], "city_id": e["city_id"], "line_name": e["line_name"]})
+
+        return result
+
+
+
+def build_metro_resolver_data(
+    metro_json: list[dict[str, Any]]
+) -> tuple[MetroTable, Mapping[str, Sequence[int]], list[str], SymSpellIndex, GeoGrid]:
+    '''всё, что MetroResolver строит при загрузке, - именно это попадает в снапшот'''
+    table, name_map, all_names = build_metro_index(metro_json)
+    return table, name_map, all_names, build_station_index(table), build_station_grid(table)
+
+
+
+def write_metro_resolver_data(
+    writer: MappedWriter, data: tuple[MetroTable, Mapping[str, Sequence[int]], list[str], SymSpellIndex, GeoGrid]
+) -> None:
+    '''раскладывает структуры MetroResolver по секциям общего файла (ключи name_map и есть all_names)'''
+    table, name_map, _, station_index, station_grid = data
+
+    for name in MetroTable.STRING_COLUMNS:
+        writer.add_strings(name, getattr(table, name))
+
+    for name in MetroTable.INDEX_COLUMNS:
+        writer.add_array(name, 'H', getattr(table, name))
+
+    for name in MetroTable.COORD_COLUMNS:
+        writer.add_array(name, 'd', getattr(table, name))
+
+    writer.add_multimap('name_map', name_map)
+    writer.add_strings('station_words', station_index.words)
+    writer.add_multimap('station_deletes', station_index.index)
+    writer.add_multimap('station_cells', station_grid.cells)
+    writer.add_array('station_cells.bounds', 'i', station_grid.bounds)
+
 
-        matches = difflib.get_close_matches(norm, self.all_names, n=3, cutoff=0.75)
+def read_metro_resolver_data(
+    mapped: MappedFile
+) -> tuple[MetroTable, Mapping[str, Sequence[int]], Sequence[str], SymSpellIndex, GeoGrid]:
+    '''структуры MetroResolver поверх общего файла, без копирования в память процесса'''
+    columns: dict[str, Any] = {name: mapped.strings(name) for name in MetroTable.STRING_COLUMNS}
+    columns.update({name: mapped.array(name) for name in (*MetroTable.INDEX_COLUMNS, *MetroTable.COORD_COLUMNS)})
 
-        if matches:
-            best_norm = matches[0]
-            return choose_best_candidate(self.name_map.get(best_norm, []))
+    table = MetroTable(**columns)
+    station_index = SymSpellIndex.from_parts(mapped.strings('station_words'), mapped.multimap('station_deletes'))
+    station_grid = GeoGrid.from_parts(
+        table.station_lats, table.station_lngs, mapped.multimap('station_cells'), mapped.array('station_cells.bounds')
+    )
 
-        return []
+    return table, mapped.multimap('name_map'), mapped.strings('name_map.keys'), station_index, station_grid
 
 
 
-def load_metro_resolver_from_file(path: str) -> MetroResolver:
-    p = pathlib.Path(path)
-    raw = json.loads(p.read_text(encoding='utf-8'))
-    name_map, all_names = build_metro_index(raw)
+def load_metro_resolver_from_file(path: str, settings: SnapshotSettings = snapshot_settings) -> MetroResolver:
+    if settings.shared:
+        table, name_map, all_names, station_index, station_grid = load_or_build_shared(
+            path, build_metro_resolver_data, write_metro_resolver_data, read_metro_resolver_data, settings
+        )
+    else:
+        table, name_map, all_names, station_index, station_grid = load_or_build(path, build_metro_resolver_data, settings)
 
-    return MetroResolver(name_map, all_names)
\ No newline at end of file
+    return MetroResolver(table, name_map, all_names, station_index, station_grid)
\ No newline at end of file
@@ -0,0 +1,88 @@
+import heapq
+from array import array
+from collections import Counter, defaultdict
+from collections.abc import Mapping, Sequence
+from difflib import SequenceMatcher
+
+
+
+def make_grams(s: str, n: int = 3) -> set[str]:
+    '''n-граммы строки с пробелами по краям (так короткие слова и начала/концы слов тоже дают граммы)'''
+    padded = f' {s} '
+
+    if len(padded) <= n:
+        return {padded}
+
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+
+class TrigramIndex:
+    '''
+    инвертированный индекс n-грамм (по умолчанию триграмм) по списку нормализованных имен.
+    fuzzy-поиск оценивает через SequenceMatcher (как difflib.get_close_matches) не весь список,
+    а только max_candidates имен с наибольшим числом общих с запросом грамм
+    '''
+    def __init__(self, names: Sequence[str], n: int = 3, max_candidates: int = 64) -> None:
+        self.names = names
+        self.n = n
+        self.max_candidates = max_candidates
+
+        postings: dict[str, list[int]] = defaultdict(list)
+
+        for i, name in enumerate(names):
+            for gram in make_grams(name, n):
+                postings[gram].append(i)
+
+        self.postings: Mapping[str, Sequence[int]] = dict(postings)
+        self.lengths: Sequence[int] = array('H', (len(name) for name in names))  # фильтр по длине без чтения имен
+
+
+    @classmethod
+    def from_parts(
+        cls, names: Sequence[str], postings: Mapping[str, Sequence[int]], lengths: Sequence[int],
+        n: int = 3, max_candidates: int = 64
+    ) -> 'TrigramIndex':
+        '''индекс из готовых частей (например отображенных из общего файла) без построения'''
+        index = cls.__new__(cls)
+        index.names, index.postings, index.lengths = names, postings, lengths
+        index.n, index.max_candidates = n, max_candidates
+        return index
+
+
+    def candidates(self, query: str, min_len: float = 0, max_len: float = float('inf')) -> list[int]:
+        '''индексы имен подходящей длины с наибольшим числом общих грамм с query'''
+        counts: Counter[int] = Counter()
+
+        for gram in make_grams(query, self.n):
+            counts.update(self.postings.get(gram, ()))
+
+        lengths = self.lengths
+        fitting = ((count, i) for i, count in counts.items() if min_len <= lengths[i] <= max_len)
+
+        return [i for _, i in heapq.nlargest(self.max_candidates, fitting)]
+
+
+    def search_scored(self, query: str, limit: int = 3, cutoff: float = 0.75) -> list[tuple[float, str]]:
+        '''аналог difflib.get_close_matches(query, names, limit, cutoff) по кандидатам из индекса, с оценками: [(ratio, name)]'''
+        # ratio = 2*M / (len(a) + len(b)) >= cutoff ограничивает длину подходящих имен
+        min_len = len(query) * cutoff / (2 - cutoff)
+        max_len = len(query) * (2 - cutoff) / cutoff
+
+        matcher = SequenceMatcher()
+        matcher.set_seq2(query)
+        result: list[tuple[float, str]] = []
+
+        for i in self.candidates(query, min_len, max_len):
+            name = self.names[i]
+            matcher.set_seq1(name)
+
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff and matcher.ratio() >= cutoff:
+                result.append((matcher.ratio(), name))
+
+        return heapq.nlargest(limit, result)
+
+
+    def search(self, query: str, limit: int = 3, cutoff: float = 0.75) -> list[str]:
+        '''аналог difflib.get_close_matches(query, names, limit, cutoff) по кандидатам из индекса'''
+        return [name for _, name in self.search_scored(query, limit, cutoff)]
\ No newline at end of file
@@ -1,16 +1,37 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
+from starlette import status
 
 import httpx
 import logging
 from typing import Any
 
-from .helpers import create_query_params, auth_create_query_params
-from .dependencies import get_area_resolver, get_metro_resolver
+from .helpers import create_query_params, auth_create_query_params, build_params_for_httpx, filter_by_region
+from .dependencies import (
+    get_area_resolver, get_metro_resolver, get_hh_client, get_vacancies_cache, get_vacancies_flight,
+    get_hh_rate_limiter, get_hh_breaker, get_hh_hedger, get_vacancy_details_cache, get_metro_resolver_for_query,
+    get_resolver_slots, wait_resolver, get_dictionary_refresher, get_crawler_pool, get_crawl_job_store
+)
+from .client import fetch_vacancies, fetch_vacancies_pages, fetch_vacancy_details, UpstreamResponse
+from .cache import TTLCache
+from .singleflight import SingleFlight
+from .rate_limit import TokenBucket, RateLimitExceeded
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .hedging import Hedger
+from .resolver_slot import ResolverSlot, readiness
+from .resolution import resolve_batch
+from .refresher import DictionaryRefresher, NoPreviousDictionary
+from .crawler import CrawlerPool, CrawlJobStore, CrawlJobNotFound, TooManyCrawlJobs, job_summary
 from ..auth.validation import get_current_auth_user
 from ..database.models import User
-from ..config import configure_logging, APP_NAME, APP_EMAIL, ACCESS_TOKEN
-from ..basemodels import GetVacanciesModel, AuthGetVacanciesModel
-from ..exceptions import server_exc, api_hh_exc
+from ..config import configure_logging, hh_client_settings
+from ..basemodels import (
+    GetVacanciesModel, AuthGetVacanciesModel, AuthGetAllVacanciesModel, VacancyDetailsRequest, SuggestModel,
+    ResolveBatchRequest, NearbyMetroModel, CrawledVacanciesModel
+)
+from ..exceptions import (
+    server_exc, api_hh_exc, hh_rate_limit_exc, hh_unavailable_exc, unknown_dictionary_exc, no_previous_dictionary_exc,
+    crawl_job_not_found_exc, too_many_crawl_jobs_exc
+)
 
 
 
@@ -22,41 +43,33 @@ router = APIRouter(tags=['Parse_HH'])
 
 
 @router.get('/get_vacancies')
-async def get_vacancies(params: GetVacanciesModel = Depends(), area_resolver: Any = Depends(get_area_resolver)) -> Any:
+async def get_vacancies(
+    request: Request,
+    params: GetVacanciesModel = Depends(),
+    area_resolver: Any = Depends(get_area_resolver),
+    client: httpx.AsyncClient = Depends(get_hh_client),
+    cache: TTLCache[UpstreamResponse] = Depends(get_vacancies_cache),
+    flight: SingleFlight[tuple[UpstreamResponse, int]] = Depends(get_vacancies_flight)
+) -> Any:
     try:
-        headers = {
-            'Authorization': f'Bearer {ACCESS_TOKEN}',
-            'User-Agent': f'{APP_NAME}/1.0 ({APP_EMAIL})'
-        }
-
         query_params = create_query_params(params, area_resolver)
 
-        params_for_httpx: list[tuple[str, str | int | float | bool | None]] = []
-
-        for k, v in query_params.items():
-            if v is None:
-                continue
-
-            if isinstance(v, (list, tuple)):
-                for item in v:
-                    params_for_httpx.append((k, str(item)))
+        params_for_httpx = build_params_for_httpx(query_params)
 
-            else:
-                params_for_httpx.append((k, str(v)))
+        upstream = await fetch_vacancies(client, cache, flight, params_for_httpx)
 
+        if hh_client_settings.passthrough:
+            return upstream.to_response(request.headers.get('accept-encoding', ''))
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                'https://api.hh.ru/vacancies',
-                headers=headers,
-                params=params_for_httpx
-            )
+        return upstream.json()
 
-            response.raise_for_status()
+    except RateLimitExceeded:
+        logger.error('запрос к API HH не дождался лимитера')
+        raise hh_rate_limit_exc
 
-            logger.warning(response.json())
-
-            return response.json()
+    except CircuitOpenError:
+        logger.error('circuit breaker API HH открыт')
+        raise hh_unavailable_exc
 
     except httpx.HTTPStatusError as e:
         logger.error(e)
@@ -70,43 +83,109 @@ async def get_vacancies(params: GetVacanciesModel = Depends(), area_resolver: An
 
 @router.get('/authenticated/get_vacancies')
 async def auth_get_vacancies(
+    request: Request,
     params: AuthGetVacanciesModel = Depends(),
     area_resolver: Any = Depends(get_area_resolver),
-    metro_resolver: Any = Depends(get_metro_resolver),
-    current_user: User = Depends(get_current_auth_user)
+    metro_resolver: Any = Depends(get_metro_resolver_for_query),
+    current_user: User = Depends(get_current_auth_user),
+    client: httpx.AsyncClient = Depends(get_hh_client),
+    cache: TTLCache[UpstreamResponse] = Depends(get_vacancies_cache),
+    flight: SingleFlight[tuple[UpstreamResponse, int]] = Depends(get_vacancies_flight)
 ) -> Any:
     try:
-        headers = {
-            'Authorization': f'Bearer {ACCESS_TOKEN}',
-            'User-Agent': f'{APP_NAME}/1.0 ({APP_EMAIL})'
-        }
+        query_params = auth_create_query_params(params, metro_resolver, area_resolver)
+
+        params_for_httpx = build_params_for_httpx(query_params)
+
+        upstream = await fetch_vacancies(client, cache, flight, params_for_httpx)
+
+        if hh_client_settings.passthrough:
+            return upstream.to_response(request.headers.get('accept-encoding', ''))
+
+        return upstream.json()
+
+    except RateLimitExceeded:
+        logger.error('запрос к API HH не дождался лимитера')
+        raise hh_rate_limit_exc
+
+    except CircuitOpenError:
+        logger.error('circuit breaker API HH открыт')
+        raise hh_unavailable_exc
+
+    except httpx.HTTPStatusError as e:
+        logger.error(e)
+        raise api_hh_exc
+
+    except Exception as e:
+        logger.error(e)
+        raise server_exc
+
 
+
+@router.get('/authenticated/get_vacancies/all')
+async def auth_get_all_vacancies(
+    params: AuthGetAllVacanciesModel = Depends(),
+    area_resolver: Any = Depends(get_area_resolver),
+    metro_resolver: Any = Depends(get_metro_resolver_for_query),
+    current_user: User = Depends(get_current_auth_user),
+    client: httpx.AsyncClient = Depends(get_hh_client),
+    cache: TTLCache[UpstreamResponse] = Depends(get_vacancies_cache),
+    flight: SingleFlight[tuple[UpstreamResponse, int]] = Depends(get_vacancies_flight)
+) -> Any:
+    '''
+    несколько страниц поиска одним запросом: страницы забираются из API HH параллельно,
+    результат склеивается без дублей по id вакансии. region дополнительно оставляет только
+    вакансии внутри региона - локально, по уже загруженным (и закэшированным) страницам
+    '''
+    try:
         query_params = auth_create_query_params(params, metro_resolver, area_resolver)
 
-        params_for_httpx: list[tuple[str, str | int | float | bool | None]] = []
+        result = await fetch_vacancies_pages(
+            client, cache, flight, query_params, page_to=params.page_to, max_items=params.max_items
+        )
 
-        for k, v in query_params.items():
-            if v is None:
-                continue
+        if params.region and area_resolver is not None:
+            result['items'], result['region'] = filter_by_region(result['items'], area_resolver, params.region)
 
-            if isinstance(v, (list, tuple)):
-                for item in v:
-                    params_for_httpx.append((k, str(item)))
+        return result
 
-            else:
-                params_for_httpx.append((k, str(v)))
+    except RateLimitExceeded:
+        logger.error('запрос к API HH не дождался лимитера')
+        raise hh_rate_limit_exc
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                'https://api.hh.ru/vacancies',
-                headers=headers,
-                params=params_for_httpx
-            )
+    except CircuitOpenError:
+        logger.error('circuit breaker API HH открыт')
+        raise hh_unavailable_exc
+
+    except httpx.HTTPStatusError as e:
+        logger.error(e)
+        raise api_hh_exc
+
+    except Exception as e:
+        logger.error(e)
+        raise server_exc
+
+
+
+@router.post('/authenticated/get_vacancies/details')
+async def auth_get_vacancy_details(
+    params: VacancyDetailsRequest,
+    current_user: User = Depends(get_current_auth_user),
+    client: httpx.AsyncClient = Depends(get_hh_client),
+    cache: TTLCache[UpstreamResponse] = Depends(get_vacancy_details_cache),
+    flight: SingleFlight[tuple[UpstreamResponse, int]] = Depends(get_vacancies_flight)
+) -> Any:
+    '''полные описания нескольких вакансий по их id в HH, повторные открытия отдаются из кэша'''
+    try:
+        return await fetch_vacancy_details(client, cache, flight, params.ids)
 
-            logger.warning(response.json())
+    except RateLimitExceeded:
+        logger.error('запрос к API HH не дождался лимитера')
+        raise hh_rate_limit_exc
 
-            response.raise_for_status()
-            return response.json()
+    except CircuitOpenError:
+        logger.error('circuit breaker API HH открыт')
+        raise hh_unavailable_exc
 
     except httpx.HTTPStatusError as e:
         logger.error(e)
@@ -119,7 +198,7 @@ async def auth_get_vacancies(
 
 
 @router.get("/get_areas")
-async def get_areas() -> Any:
+async def get_areas(client: httpx.AsyncClient = Depends(get_hh_client)) -> Any:
     '''
     использовать только для отладки, а именно - для получения кодов всех доступных стран и регионов
     не использовать на проде, так как сильно нагружает приложение и превышает допустимое время ожидания
@@ -127,19 +206,18 @@ async def get_areas() -> Any:
     '''
     
     try:
-        headers = {
-            'Authorization': f'Bearer {ACCESS_TOKEN}',
-            'User-Agent': f'{APP_NAME}/1.0 ({APP_EMAIL})'
-        }
+        response = await client.get('/areas')
+
+        response.raise_for_status()
+        return response.json()
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                'https://api.hh.ru/areas',
-                headers=headers,
-            )
+    except RateLimitExceeded:
+        logger.error('запрос к API HH не дождался лимитера')
+        raise hh_rate_limit_exc
 
-            response.raise_for_status()
-            return response.json()
+    except CircuitOpenError:
+        logger.error('circuit breaker API HH открыт')
+        raise hh_unavailable_exc
 
     except httpx.HTTPStatusError as e:
         logger.error(e)
@@ -152,31 +230,294 @@ async def get_areas() -> Any:
 
 
 @router.get("/get_metro")
-async def get_metro() -> Any:
+async def get_metro(client: httpx.AsyncClient = Depends(get_hh_client)) -> Any:
     '''
     использовать только для отладки, а именно - для получения кодов всех доступных веток метро
     в одном каталоге с данным файлом уже лежит json с кодами всех веток и станций метро
     '''
     
     try:
-        headers = {
-            'Authorization': f'Bearer {ACCESS_TOKEN}',
-            'User-Agent': f'{APP_NAME}/1.0 ({APP_EMAIL})'
-        }
+        response = await client.get('/metro')
+
+        response.raise_for_status()
+        return response.json()
+
+    except RateLimitExceeded:
+        logger.error('запрос к API HH не дождался лимитера')
+        raise hh_rate_limit_exc
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f'https://api.hh.ru/metro',
-                headers=headers,
-            )
-            
-            response.raise_for_status()
-            return response.json()
+    except CircuitOpenError:
+        logger.error('circuit breaker API HH открыт')
+        raise hh_unavailable_exc
 
     except httpx.HTTPStatusError as e:
         logger.error(e)
         raise api_hh_exc
     
+    except Exception as e:
+        logger.error(e)
+        raise server_exc
+
+
+
+@router.get('/suggest/areas')
+async def suggest_areas(
+    params: SuggestModel = Depends(), area_resolver: Any = Depends(get_area_resolver)
+) -> list[dict[str, Any]]:
+    '''автодополнение города/региона по началу названия: bisect по отсортированному списку имен, без запросов к HH'''
+    try:
+        result: list[dict[str, Any]] = area_resolver.suggest(params.q, params.limit)
+        return result
+
+    except Exception as e:
+        logger.error(e)
+        raise server_exc
+
+
+
+@router.get('/suggest/metro')
+async def suggest_metro(
+    params: SuggestModel = Depends(), metro_resolver: Any = Depends(get_metro_resolver)
+) -> list[dict[str, Any]]:
+    '''автодополнение станции метро по началу названия (или "город станция", "линия станция")'''
+    try:
+        result: list[dict[str, Any]] = metro_resolver.suggest(params.q, params.limit)
+        return result
+
+    except Exception as e:
+        logger.error(e)
+        raise server_exc
+
+
+
+@router.get('/metro/nearby')
+async def nearby_metro(
+    params: NearbyMetroModel = Depends(), metro_resolver: Any = Depends(get_metro_resolver)
+) -> list[dict[str, Any]]:
+    '''
+    станции рядом с точкой: с radius_km - все в радиусе, без него - limit ближайших.
+    ищутся по сетке координат станций, без запросов к HH и без прохода по всем станциям
+    '''
+    try:
+        result: list[dict[str, Any]] = metro_resolver.nearby_entries(params.lat, params.lng, params.radius_km, params.limit)
+        return result
+
+    except Exception as e:
+        logger.error(e)
+        raise server_exc
+
+
+
+@router.post('/resolve')
+async def resolve_names(
+    body: ResolveBatchRequest, slots: list[ResolverSlot[Any]] = Depends(get_resolver_slots)
+) -> dict[str, list[dict[str, Any]]]:
+    '''
+    пакетное преобразование названий в id HH (до 1000 регионов и 1000 станций за запрос).
+    одинаковые после нормализации строки ищутся один раз; по каждой строке - ids, вид совпадения
+    (exact / part / fuzzy / fallback) и оценка. справочник метро ждется, только если переданы станции
+    '''
+    area_slot, metro_slot = slots
+    area_resolver = await wait_resolver(area_slot) if body.areas else None
+    metro_resolver = await wait_resolver(metro_slot) if body.metro else None
+
+    try:
+        return {
+            'areas': await resolve_batch(area_resolver, body.areas) if area_resolver is not None else [],
+            'metro': await resolve_batch(metro_resolver, body.metro) if metro_resolver is not None else []
+        }
+
+    except Exception as e:
+        logger.error(e)
+        raise server_exc
+
+
+
+@router.get('/stats')
+async def get_stats(
+    cache: TTLCache[UpstreamResponse] = Depends(get_vacancies_cache),
+    details_cache: TTLCache[UpstreamResponse] = Depends(get_vacancy_details_cache),
+    flight: SingleFlight[tuple[UpstreamResponse, int]] = Depends(get_vacancies_flight),
+    rate_limiter: TokenBucket = Depends(get_hh_rate_limiter),
+    breaker: CircuitBreaker = Depends(get_hh_breaker),
+    hedger: Hedger = Depends(get_hh_hedger),
+    slots: list[ResolverSlot[Any]] = Depends(get_resolver_slots),
+    crawler_pool: CrawlerPool = Depends(get_crawler_pool)
+) -> dict[str, Any]:
+    '''счетчики кэша поиска вакансий, схлопывания запросов, защиты запросов к API HH, memo справочников и обхода'''
+    return {
+        'vacancies_cache': cache.stats(),
+        'vacancy_details_cache': details_cache.stats(),
+        'vacancies_flight': flight.stats(),
+        'rate_limiter': rate_limiter.stats(),
+        'circuit_breaker': breaker.stats(),
+        'hedging': hedger.stats(),
+        'crawler': crawler_pool.stats(),
+        # memo справочника, который еще не загружен, - None
+        **{f'{slot.name}_resolve_memo': slot.value.memo.stats() if slot.value is not None else None for slot in slots}
+    }
+
+
+
+@router.get('/ready')
+async def get_ready(response: Response, slots: list[ResolverSlot[Any]] = Depends(get_resolver_slots)) -> dict[str, Any]:
+    '''
+    готовность к запросам: 200, когда загружены все справочники, кроме ленивых (HH_RESOLVERS_LAZY_METRO), иначе 503.
+    по каждому справочнику - состояние и время загрузки
+    '''
+    ready = readiness(slots)
+
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+
+    return {'ready': ready, 'resolvers': {slot.name: slot.stats() for slot in slots}}
+
+
+
+@router.get('/dictionaries')
+async def get_dictionaries(refresher: DictionaryRefresher = Depends(get_dictionary_refresher)) -> dict[str, Any]:
+    '''состояние обновления справочников areas/metro из HH: валидаторы, время проверки и diff последнего обновления'''
+    return refresher.stats()
+
+
+
+@router.post('/authenticated/dictionaries/refresh')
+async def refresh_dictionaries(
+    current_user: User = Depends(get_current_auth_user),
+    refresher: DictionaryRefresher = Depends(get_dictionary_refresher)
+) -> dict[str, Any]:
+    '''
+    внеочередная проверка справочников, не дожидаясь HH_REFRESH_INTERVAL. новые индексы строятся в потоке
+    и подменяются без остановки запросов; ошибки обновления - в поле error справочника
+    '''
+    try:
+        await refresher.refresh_all()
+        return refresher.stats()
+
+    except Exception as e:
+        logger.error(e)
+        raise server_exc
+
+
+
+@router.post('/authenticated/dictionaries/{name}/rollback')
+async def rollback_dictionary(
+    name: str,
+    current_user: User = Depends(get_current_auth_user),
+    refresher: DictionaryRefresher = Depends(get_dictionary_refresher)
+) -> dict[str, Any]:
+    '''возврат справочника к версии, действовавшей до последнего обновления'''
+    if name not in refresher.slots:
+        raise unknown_dictionary_exc
+
+    try:
+        await refresher.rollback(name)
+        return refresher.describe(name)
+
+    except NoPreviousDictionary:
+        raise no_previous_dictionary_exc
+
+    except Exception as e:
+        logger.error(e)
+        raise server_exc
+
+
+
+@router.post('/authenticated/crawl_jobs', status_code=status.HTTP_202_ACCEPTED)
+async def create_crawl_job(
+    params: AuthGetVacanciesModel = Depends(),
+    area_resolver: Any = Depends(get_area_resolver),
+    metro_resolver: Any = Depends(get_metro_resolver_for_query),
+    current_user: User = Depends(get_current_auth_user),
+    store: CrawlJobStore = Depends(get_crawl_job_store),
+    pool: CrawlerPool = Depends(get_crawler_pool)
+) -> dict[str, Any]:
+    '''
+    задание "все вакансии по запросу": параметры те же, что у /authenticated/get_vacancies, страницы задает обход.
+    воркеры забирают все страницы (до 2000 вакансий) в фоне и сохраняют их в базу;
+    статус и прогресс - GET /authenticated/crawl_jobs/{job_id}. незавершенных заданий у пользователя
+    не больше HH_CRAWLER_MAX_ACTIVE_PER_USER, иначе 429
+    '''
+    try:
+        query_params = auth_create_query_params(params, metro_resolver, area_resolver)
+        query_params.pop('page', None)
+        query_params.pop('per_page', None)
+
+        job = await store.create(current_user.id, query_params)
+        pool.notify()
+
+        return job_summary(job)
+
+    except TooManyCrawlJobs:
+        raise too_many_crawl_jobs_exc
+
+    except Exception as e:
+        logger.error(e)
+        raise server_exc
+
+
+
+@router.get('/authenticated/crawl_jobs')
+async def get_crawl_jobs(
+    current_user: User = Depends(get_current_auth_user), store: CrawlJobStore = Depends(get_crawl_job_store)
+) -> list[dict[str, Any]]:
+    try:
+        return [job_summary(job) for job in await store.list_jobs(current_user.id)]
+
+    except Exception as e:
+        logger.error(e)
+        raise server_exc
+
+
+
+@router.get('/authenticated/crawl_jobs/{job_id}')
+async def get_crawl_job(
+    job_id: int, current_user: User = Depends(get_current_auth_user), store: CrawlJobStore = Depends(get_crawl_job_store)
+) -> dict[str, Any]:
+    '''статус задания и прогресс: pages_done из pages страниц сохранено, items_count вакансий в базе'''
+    try:
+        return job_summary(await store.get(current_user.id, job_id))
+
+    except CrawlJobNotFound:
+        raise crawl_job_not_found_exc
+
+    except Exception as e:
+        logger.error(e)
+        raise server_exc
+
+
+
+@router.get('/authenticated/crawl_jobs/{job_id}/vacancies')
+async def get_crawled_vacancies(
+    job_id: int,
+    params: CrawledVacanciesModel = Depends(),
+    current_user: User = Depends(get_current_auth_user),
+    store: CrawlJobStore = Depends(get_crawl_job_store)
+) -> list[dict[str, Any]]:
+    '''сохраненные заданием вакансии в порядке выдачи HH, частями по limit'''
+    try:
+        return await store.vacancies(current_user.id, job_id, params.offset, params.limit)
+
+    except CrawlJobNotFound:
+        raise crawl_job_not_found_exc
+
+    except Exception as e:
+        logger.error(e)
+        raise server_exc
+
+
+
+@router.delete('/authenticated/crawl_jobs/{job_id}')
+async def cancel_crawl_job(
+    job_id: int, current_user: User = Depends(get_current_auth_user), store: CrawlJobStore = Depends(get_crawl_job_store)
+) -> dict[str, Any]:
+    '''отмена задания: уже сохраненные вакансии остаются, обход останавливается на следующей странице'''
+    try:
+        return job_summary(await store.cancel(current_user.id, job_id))
+
+    except CrawlJobNotFound:
+        raise crawl_job_not_found_exc
+
     except Exception as e:
         logger.error(e)
         raise server_exc
\ No newline at end of file
@@ -0,0 +1,49 @@
+import heapq
+from bisect import bisect_left
+from collections.abc import Sequence
+from typing import Any, Callable, Hashable, Iterable, TypeVar
+
+
+
+T = TypeVar('T')
+
+# символ больше любой буквы/цифры: все строки, начинающиеся с prefix, лежат в [prefix, prefix + PREFIX_END)
+PREFIX_END = '\U0010ffff'
+
+
+
+def prefix_range(sorted_names: Sequence[str], prefix: str) -> range:
+    '''индексы имен, начинающихся с prefix, в отсортированном списке - два bisect, без обхода списка'''
+    start = bisect_left(sorted_names, prefix)
+    end = bisect_left(sorted_names, prefix + PREFIX_END, lo=start)
+
+    return range(start, end)
+
+
+
+def top_by_prefix(
+    sorted_names: Sequence[str],
+    prefix: str,
+    expand: Callable[[str], Iterable[T]],
+    rank: Callable[[str, T], Any],
+    identity: Callable[[T], Hashable],
+    limit: int
+) -> list[T]:
+    '''
+    limit лучших (наименьший rank) записей для имен с данным префиксом.
+    expand(name) - записи имени; одна запись может встретиться под несколькими именами
+    (например станция и "город + станция") - остается вариант с лучшим rank
+    '''
+    best: dict[Hashable, tuple[Any, T]] = {}
+
+    for i in prefix_range(sorted_names, prefix):
+        name = sorted_names[i]
+
+        for item in expand(name):
+            key = identity(item)
+            score = rank(name, item)
+
+            if key not in best or score < best[key][0]:
+                best[key] = (score, item)
+
+    return [item for _, item in heapq.nsmallest(limit, best.values(), key=lambda pair: pair[0])]
\ No newline at end of file
@@ -0,0 +1,225 @@
+import time
+import random
+import asyncio
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+from ..config import configure_logging, RateLimitSettings, rate_limit_settings
+
+
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadTimeout, httpx.RemoteProtocolError)
+IDEMPOTENT_METHODS = {'GET', 'HEAD'}
+
+
+
+class RateLimitExceeded(Exception):
+    '''запрос не дождался разрешения лимитера до своего дедлайна'''
+
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    '''Retry-After: число секунд или HTTP-дата'''
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+
+class TokenBucket:
+    '''
+    token bucket на все запросы к API HH под одним ACCESS_TOKEN:
+    rate токенов в секунду, не больше burst подряд. лишние запросы ждут своей очереди (FIFO)
+    до дедлайна, а не падают сразу. pause() останавливает выдачу токенов (Retry-After от HH).
+    clock и sleep подменяются в тестах (в том числе для повторов в RateLimitedTransport)
+    '''
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self._waiting = 0
+
+        self.acquired = 0
+        self.rejected = 0
+        self.pauses = 0
+
+
+    @classmethod
+    def from_settings(cls, settings: RateLimitSettings = rate_limit_settings) -> 'TokenBucket':
+        return cls(settings.rate, settings.burst)
+
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, self.clock() + seconds)
+        self.pauses += 1
+
+
+    async def acquire(self, deadline: float) -> None:
+        self._waiting += 1
+
+        try:
+            try:
+                await asyncio.wait_for(self._lock.acquire(), max(deadline - self.clock(), 0.0))
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise RateLimitExceeded()
+
+            try:
+                while True:
+                    now = self.clock()
+                    self._refill(now)
+
+                    wait = self._paused_until - now
+
+                    if wait <= 0:
+                        if self._tokens >= 1:
+                            self._tokens -= 1
+                            self.acquired += 1
+                            return
+
+                        wait = (1 - self._tokens) / self.rate
+
+                    if now + wait > deadline:
+                        self.rejected += 1
+                        raise RateLimitExceeded()
+
+                    await self.sleep(wait)
+
+            finally:
+                self._lock.release()
+
+        finally:
+            self._waiting -= 1
+
+
+    def try_acquire(self) -> bool:
+        '''токен без ожидания: только если он есть прямо сейчас и очереди нет (для необязательных запросов)'''
+        now = self.clock()
+        self._refill(now)
+
+        if self._lock.locked() or self._paused_until > now or self._tokens < 1:
+            return False
+
+        self._tokens -= 1
+        self.acquired += 1
+        return True
+
+
+    def stats(self) -> dict[str, Any]:
+        self._refill(self.clock())
+
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'tokens': round(self._tokens, 2),
+            'waiting': self._waiting,
+            'paused_for': round(max(self._paused_until - self.clock(), 0.0), 3),
+            'acquired': self.acquired,
+            'rejected': self.rejected,
+            'pauses': self.pauses
+        }
+
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    '''
+    обертка над транспортом httpx: каждый запрос (и каждый повтор) берет токен из bucket.
+    на 429/503 учитывается Retry-After (пауза для всех запросов), на остальные временные ошибки -
+    экспоненциальный backoff с джиттером. повторяются только идемпотентные запросы.
+    admit вызывается перед каждой попыткой до очереди за токеном и может отказать исключением (открытый breaker)
+    '''
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        bucket: TokenBucket,
+        settings: RateLimitSettings = rate_limit_settings,
+        admit: Callable[[], None] | None = None
+    ) -> None:
+        self._transport = transport
+        self.bucket = bucket
+        self.settings = settings
+        self.admit = admit
+
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.settings.backoff_max, self.settings.backoff_base * 2 ** attempt))
+
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        deadline = self.bucket.clock() + self.settings.queue_timeout
+        retryable = request.method in IDEMPOTENT_METHODS
+        attempt = 0
+
+        while True:
+            if self.admit is not None:
+                self.admit()
+
+            await self.bucket.acquire(deadline)
+
+            try:
+                response = await self._transport.handle_async_request(request)
+
+            except RETRYABLE_ERRORS as e:
+                delay = self._backoff(attempt)
+
+                if not retryable or attempt >= self.settings.max_retries or self.bucket.clock() + delay > deadline:
+                    raise
+
+                logger.warning(f'{request.url.path}: {e!r}, повтор через {delay:.2f}s')
+
+            else:
+                if not retryable or response.status_code not in RETRYABLE_STATUSES:
+                    return response
+
+                retry_after = parse_retry_after(response.headers.get('retry-after'))
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+
+                if retry_after is not None:
+                    self.bucket.pause(retry_after)
+
+                if attempt >= self.settings.max_retries or self.bucket.clock() + delay > deadline:
+                    return response
+
+                await response.aclose()
+                logger.warning(f'{request.url.path}: {response.status_code}, повтор через {delay:.2f}s')
+
+            await self.bucket.sleep(delay)
+            attempt += 1
+
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
\ No newline at end of file
@@ -0,0 +1,381 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import pathlib
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable
+
+import httpx
+
+from .resolver_slot import ResolverSlot
+from ..config import configure_logging, RefreshSettings, refresh_settings
+
+
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+# справочник -> ресурс API HH. метро обновляется первым: по числу станций взвешиваются города в areas
+SOURCES = {'metro': '/metro', 'areas': '/areas'}
+
+# сколько добавленных/удаленных id хранится в diff (счетчики - полные)
+DIFF_SAMPLE = 100
+
+
+
+class RefreshRejected(Exception):
+    '''новая версия справочника потеряла слишком много id и не применена'''
+
+
+
+class NoPreviousDictionary(Exception):
+    '''откатывать некуда: справочник еще не обновлялся или уже откачен'''
+
+
+
+@dataclass
+class DictionaryState:
+    '''
+    валидаторы для условного запроса к HH, время проверки/обновления и diff последнего обновления.
+    generation растет с каждым обновлением и откатом - по нему воркеры замечают чужие изменения на диске
+    '''
+    name: str
+    generation: int = 0
+    etag: str | None = None
+    last_modified: str | None = None
+    checked_at: float | None = None
+    updated_at: float | None = None
+    added_count: int = 0
+    removed_count: int = 0
+    added: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    rolled_back: bool = False
+    error: str | None = None
+
+
+
+def refresh_dir(bundled_dir: pathlib.Path, settings: RefreshSettings = refresh_settings) -> pathlib.Path:
+    return pathlib.Path(settings.dir) if settings.dir else bundled_dir / 'dictionaries'
+
+
+def dictionary_path(name: str, bundled_dir: pathlib.Path, settings: RefreshSettings = refresh_settings) -> pathlib.Path:
+    '''json справочника: скачанный при последнем обновлении, если он есть, иначе лежащий в репозитории'''
+    path = refresh_dir(bundled_dir, settings) / f'{name}.json'
+    return path if path.exists() else bundled_dir / f'{name}.json'
+
+
+
+def id_diff(old: set[str], new: set[str]) -> tuple[list[str], list[str]]:
+    '''(добавленные, удаленные) id в стабильном порядке'''
+    return sorted(new - old), sorted(old - new)
+
+
+
+class DictionaryRefresher:
+    '''
+    фоновое обновление справочников из API HH. раз в interval для каждого справочника делается
+    условный запрос (If-None-Match / If-Modified-Since): 304 - ничего не меняется. новая версия сохраняется
+    на диск, индексы строятся в отдельном потоке тем же загрузчиком, что и при старте, и подменяются в
+    ResolverSlot одним присваиванием. прежние справочник и json хранятся для отката (один шаг назад).
+
+    каталог со справочниками общий для всех воркеров uvicorn: json и состояние пишутся атомарно (временный
+    файл + os.replace), а каждый воркер раз в watch_interval сверяет generation на диске со своей и
+    подхватывает обновление или откат, сделанные другим воркером (sync). перед проверкой на HH воркер тоже
+    сверяется с диском, поэтому справочник, уже скачанный соседом, приходит как 304
+    '''
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        slots: dict[str, ResolverSlot[Any]],
+        loaders: dict[str, Callable[[str], Any]],
+        bundled_dir: pathlib.Path,
+        settings: RefreshSettings = refresh_settings
+    ) -> None:
+        self.client = client
+        self.slots = slots
+        self.loaders = loaders  # путь к json -> справочник
+        self.bundled_dir = bundled_dir
+        self.settings = settings
+        self.dir = refresh_dir(bundled_dir, settings)
+
+        self.states = {name: self._read_state(name) for name in slots}
+        self.loaded = {name: state.generation for name, state in self.states.items()}  # версия в слоте этого воркера
+        self.previous: dict[str, Any] = {}
+
+        self.updates = 0
+        self.not_modified = 0
+        self.rejected = 0
+        self.failures = 0
+        self.synced = 0
+
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+
+
+    def _meta_path(self, name: str) -> pathlib.Path:
+        return self.dir / f'{name}.meta.json'
+
+
+    def _read_state(self, name: str) -> DictionaryState:
+        # валидаторы переживают перезапуск, иначе первая проверка после деплоя всегда скачивала бы справочник
+        try:
+            return DictionaryState(**json.loads(self._meta_path(name).read_text(encoding='utf-8')))
+
+        except FileNotFoundError:
+            return DictionaryState(name)
+
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f'состояние справочника {name} не прочитано: {e}')
+            return DictionaryState(name)
+
+
+    def _write_state(self, state: DictionaryState) -> None:
+        self._write_file(self._meta_path(state.name), json.dumps(asdict(state), ensure_ascii=False).encode('utf-8'))
+
+
+    def _write_file(self, path: pathlib.Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+
+    async def _run(self) -> None:
+        next_check = time.monotonic() + self.settings.interval
+
+        while True:
+            await asyncio.sleep(min(self.settings.watch_interval, max(next_check - time.monotonic(), 0.0)))
+            await self.sync_all()
+
+            if time.monotonic() >= next_check:
+                await self.refresh_all()
+                next_check = time.monotonic() + self.settings.interval
+
+
+    async def sync_all(self) -> None:
+        for name in self.slots:
+            try:
+                await self.sync(name)
+
+            except Exception as e:
+                self.failures += 1
+                logger.error(f'справочник {name} не синхронизирован с диском: {e!r}')
+
+
+    async def sync(self, name: str) -> bool:
+        '''подхватывает версию справочника, которую записал на диск другой воркер; True - слот подменен'''
+        async with self._lock:
+            disk = self._read_state(name)
+
+            if disk.generation == self.loaded[name]:
+                return False
+
+            slot = self.slots[name]
+
+            if slot.value is None:
+                # справочник еще грузится и прочитает json с диска сам
+                self.states[name], self.loaded[name] = disk, disk.generation
+                return False
+
+            if disk.rolled_back and name in self.previous:
+                slot.swap(self.previous.pop(name))
+
+            else:
+                path = dictionary_path(name, self.bundled_dir, self.settings)
+                resolver = await asyncio.to_thread(self.loaders[name], str(path))
+                old = slot.swap(resolver)
+
+                if disk.rolled_back:
+                    self.previous.pop(name, None)
+                else:
+                    self.previous[name] = old
+
+            self.states[name], self.loaded[name] = disk, disk.generation
+            self.synced += 1
+
+            logger.info(f'справочник {name} подхвачен с диска (версия {disk.generation})')
+            return True
+
+
+    async def refresh_all(self) -> dict[str, bool]:
+        '''проверяет все справочники; {имя: была ли применена новая версия}. ошибки пишутся в состояние справочника'''
+        result: dict[str, bool] = {}
+
+        for name in SOURCES:
+            if name not in self.slots:
+                continue
+
+            try:
+                result[name] = await self.refresh(name)
+
+            except Exception as e:
+                self.states[name].error = repr(e)
+                self.failures += 1
+                logger.error(f'справочник {name} не обновлен: {e!r}')
+                result[name] = False
+
+        return result
+
+
+    async def refresh(self, name: str) -> bool:
+        '''
+        условный запрос к HH и применение новой версии. запрос идет без блокировки, чтобы откат не ждал
+        медленной загрузки; если пока он шел, справочник сменился (откат, чужое обновление), ответ отбрасывается
+        '''
+        await self.sync(name)
+
+        if self.slots[name].value is None:
+            # ленивый или еще грузящийся справочник подхватит свежий json сам при загрузке
+            logger.info(f'справочник {name} еще не загружен, обновление пропущено')
+            return False
+
+        state = self.states[name]
+        generation = state.generation
+        headers: dict[str, str] = {}
+
+        if state.etag:
+            headers['If-None-Match'] = state.etag
+
+        if state.last_modified:
+            headers['If-Modified-Since'] = state.last_modified
+
+        response = await self.client.get(SOURCES[name], headers=headers)
+        state.checked_at = time.time()
+
+        if response.status_code == httpx.codes.NOT_MODIFIED:
+            self.not_modified += 1
+            state.error = None
+            return False
+
+        response.raise_for_status()
+
+        async with self._lock:
+            state = self.states[name]
+
+            if state.generation != generation or self._read_state(name).generation != generation:
+                logger.info(f'справочник {name} сменился во время загрузки, скачанная версия отброшена')
+                return False
+
+            await self._apply(name, self.slots[name].value, response.content)
+
+            state.etag = response.headers.get('etag')
+            state.last_modified = response.headers.get('last-modified')
+            state.updated_at, state.rolled_back, state.error = time.time(), False, None
+            self._commit_state(state)
+
+            self.updates += 1
+            return True
+
+
+    def _commit_state(self, state: DictionaryState) -> None:
+        '''новая версия справочника применена в этом воркере: generation + 1 и запись на диск для остальных'''
+        state.generation += 1
+        self._write_state(state)
+        self.loaded[state.name] = state.generation
+
+
+    async def _apply(self, name: str, current: Any, content: bytes) -> None:
+        '''сохраняет новую версию, строит по ней справочник в потоке и подменяет им current в слоте'''
+        state = self.states[name]
+
+        path = self.dir / f'{name}.json'
+        had_own = path.exists()
+        old_content = dictionary_path(name, self.bundled_dir, self.settings).read_bytes()
+
+        # json нужен на диске: загрузчик строит по нему снапшот, а при следующем старте справочник грузится уже из него
+        self._write_file(path, content)
+
+        try:
+            resolver = await asyncio.to_thread(self.loaders[name], str(path))
+
+            old_ids = current.known_ids()
+            added, removed = id_diff(old_ids, resolver.known_ids())
+
+            if old_ids and len(removed) > self.settings.max_removed_share * len(old_ids):
+                self.rejected += 1
+                raise RefreshRejected(f'{name}: удалено {len(removed)} из {len(old_ids)} id')
+
+        except BaseException:
+            # на диске остается версия, с которой работает слот
+            if had_own:
+                self._write_file(path, old_content)
+            else:
+                path.unlink(missing_ok=True)
+            raise
+
+        self._write_file(self.dir / f'{name}.prev.json', old_content)
+        self.previous[name] = self.slots[name].swap(resolver)
+
+        state.added_count, state.removed_count = len(added), len(removed)
+        state.added, state.removed = added[:DIFF_SAMPLE], removed[:DIFF_SAMPLE]
+
+        logger.info(f'справочник {name} обновлен: +{len(added)} -{len(removed)} id')
+
+
+    async def rollback(self, name: str) -> DictionaryState:
+        '''
+        возвращает справочник, действовавший до последнего обновления. валидаторы откаченной версии
+        сохраняются, поэтому та же версия с HH (304) повторно не применится - только следующая.
+        откатывается версия, действующая сейчас во всех воркерах, даже если ее применил другой воркер
+        '''
+        await self.sync(name)
+
+        async with self._lock:
+            previous = self.previous.pop(name, None)
+
+            if previous is None:
+                raise NoPreviousDictionary(name)
+
+            self.slots[name].swap(previous)
+
+            path = self.dir / f'{name}.json'
+            previous_path = self.dir / f'{name}.prev.json'
+
+            if previous_path.exists():
+                os.replace(previous_path, path)
+
+            state = self.states[name]
+            state.added, state.removed = state.removed, state.added
+            state.added_count, state.removed_count = state.removed_count, state.added_count
+            state.rolled_back = True
+            self._commit_state(state)
+
+            logger.info(f'справочник {name} откачен к предыдущей версии')
+            return state
+
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+            self._task = None
+
+
+    def describe(self, name: str) -> dict[str, Any]:
+        return {**asdict(self.states[name]), 'has_previous': name in self.previous}
+
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'enabled': self._task is not None,
+            'interval': self.settings.interval,
+            'updates': self.updates,
+            'not_modified': self.not_modified,
+            'rejected': self.rejected,
+            'failures': self.failures,
+            'synced': self.synced,
+            'dictionaries': {name: self.describe(name) for name in self.states}
+        }
\ No newline at end of file
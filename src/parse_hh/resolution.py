@@ -0,0 +1,49 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Protocol, Sequence
+
+
+
+# как найдено совпадение: целиком, по одной из частей строки, нечетко или не найдено (значение по умолчанию)
+EXACT, PART, FUZZY, FALLBACK = 'exact', 'part', 'fuzzy', 'fallback'
+
+# сколько строк пакета разбирается подряд, прежде чем отдать управление event loop
+BATCH_CHUNK = 64
+
+
+
+@dataclass(frozen=True)
+class Resolution:
+    '''результат resolve с подробностями: ids, вид совпадения, его оценка (0..1) и найденное нормализованное имя'''
+    ids: tuple[str, ...]
+    kind: str
+    score: float
+    match: str | None = None
+
+
+    def as_dict(self) -> dict[str, Any]:
+        return {'ids': list(self.ids), 'kind': self.kind, 'score': round(self.score, 4), 'match': self.match}
+
+
+
+class DetailedResolver(Protocol):
+    def resolve_many(self, inputs: Sequence[str]) -> list[Resolution]: ...
+
+
+
+async def resolve_batch(resolver: DetailedResolver, inputs: Sequence[str], chunk: int = BATCH_CHUNK) -> list[dict[str, Any]]:
+    '''
+    пакетный resolve: resolver.resolve_many по кускам из chunk строк, между кусками управление
+    возвращается event loop, чтобы сотни нечетких поисков не задерживали остальные запросы
+    '''
+    result: list[dict[str, Any]] = []
+
+    for start in range(0, len(inputs), chunk):
+        part = inputs[start:start + chunk]
+
+        for user_input, resolution in zip(part, resolver.resolve_many(part)):
+            result.append({'input': user_input, **resolution.as_dict()})
+
+        await asyncio.sleep(0)
+
+    return result
\ No newline at end of file
@@ -0,0 +1,121 @@
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Generic, TypeVar
+
+from ..config import configure_logging
+
+
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+T = TypeVar('T')
+
+
+
+class ResolverNotReady(Exception):
+    '''справочник не загрузился за отведенное запросу время'''
+
+
+
+class ResolverSlot(Generic[T]):
+    '''
+    место под справочник (AreaResolver/MetroResolver), который грузится в отдельном потоке,
+    пока сервер уже принимает запросы. start() запускает загрузку, get() ждет ее с таймаутом;
+    lazy-справочник начинает грузиться при первом get(). после ошибки загрузки следующий get() пробует снова
+    '''
+    def __init__(self, name: str, loader: Callable[[], T], lazy: bool = False) -> None:
+        self.name = name
+        self.loader = loader
+        self.lazy = lazy
+
+        self.value: T | None = None
+        self.state = 'pending'  # pending -> loading -> ready | failed
+        self.seconds: float | None = None
+        self.error: str | None = None
+
+        self._task: asyncio.Task[T] | None = None
+
+
+    @classmethod
+    def loaded(cls, name: str, value: T) -> 'ResolverSlot[T]':
+        '''уже готовый справочник (например в тестах)'''
+        slot = cls(name, lambda: value)
+        slot.value, slot.state, slot.seconds = value, 'ready', 0.0
+        return slot
+
+
+    @property
+    def ready(self) -> bool:
+        return self.value is not None
+
+
+    def start(self) -> asyncio.Task[T]:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._load())
+
+        return self._task
+
+
+    async def _load(self) -> T:
+        self.state = 'loading'
+        start = time.perf_counter()
+
+        try:
+            value = await asyncio.to_thread(self.loader)
+
+        except Exception as e:
+            self.state, self.error = 'failed', repr(e)
+            self._task = None
+            logger.error(f'справочник {self.name} не загружен: {e!r}')
+            raise
+
+        self.value, self.state, self.error = value, 'ready', None
+        self.seconds = round(time.perf_counter() - start, 4)
+        logger.info(f'справочник {self.name} загружен за {self.seconds} с')
+
+        return value
+
+
+    async def get(self, timeout: float | None = None) -> T:
+        '''справочник; если он еще грузится - ожидание не дольше timeout, затем ResolverNotReady'''
+        if self.value is not None:
+            return self.value
+
+        task = self.start()
+
+        try:
+            # shield: таймаут одного запроса не отменяет общую загрузку
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+        except asyncio.TimeoutError:
+            raise ResolverNotReady(self.name)
+
+
+    def swap(self, value: T) -> T | None:
+        '''
+        заменяет справочник одним присваиванием и возвращает прежний. запросы, которые уже получили
+        старый справочник, дорабатывают с ним, новые сразу получают новый - никто не ждет пересборки
+        '''
+        previous, self.value = self.value, value
+        self.state, self.error = 'ready', None
+
+        return previous
+
+
+    async def aclose(self) -> None:
+        # сам поток не прерывается, но его результат больше никто не ждет
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+
+    def stats(self) -> dict[str, Any]:
+        return {'state': self.state, 'lazy': self.lazy, 'seconds': self.seconds, 'error': self.error}
+
+
+
+def readiness(slots: list[ResolverSlot[Any]]) -> bool:
+    '''готовы ли все справочники, которые грузятся заранее (lazy могут быть еще не загружены)'''
+    return all(slot.ready for slot in slots if not slot.lazy)
\ No newline at end of file
@@ -0,0 +1,340 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import hashlib
+import logging
+import pathlib
+from array import array
+from collections.abc import Iterator, Mapping, Sequence
+from typing import Any, Callable, TypeVar, overload
+
+from ..config import configure_logging, SnapshotSettings, snapshot_settings
+
+
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+T = TypeVar('T')
+
+# формат файла: MAGIC + VERSION (1 байт) + sha256 исходного json (32 байта) + длина каталога (4 байта) +
+# каталог секций в json {name: [offset, length, typecode]} + сами секции, выровненные по 8 байт
+MAGIC = b'PHHM'
+VERSION = 5  # увеличивать при изменении структур индексов
+HEADER = struct.Struct('<4sB32sI')
+ALIGN = 8
+
+
+
+class MappedStrings(Sequence[str]):
+    '''
+    список строк поверх общего буфера: utf-8 всех строк подряд + массив смещений.
+    строка декодируется при обращении; если исходный список был отсортирован, по нему работает bisect
+    '''
+    def __init__(self, blob: memoryview, offsets: Sequence[int]) -> None:
+        self.blob = blob
+        self.offsets = offsets
+
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+    @overload
+    def __getitem__(self, i: int) -> str: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list[str]: ...
+
+    def __getitem__(self, i: int | slice) -> str | list[str]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        offsets = self.offsets
+
+        if i < 0:
+            i += len(offsets) - 1
+
+        # за последней строкой offsets[i + 1] сам поднимет IndexError
+        return str(self.blob[offsets[i]:offsets[i + 1]], 'utf-8')
+
+
+    def raw(self, i: int) -> memoryview:
+        '''байты i-й строки без декодирования'''
+        return self.blob[self.offsets[i]:self.offsets[i + 1]]
+
+
+
+def stable_hash(data: bytes) -> int:
+    '''хэш, одинаковый во всех процессах (встроенный hash() для str рандомизирован при каждом запуске)'''
+    return zlib.crc32(data)
+
+
+
+class MappedMultiMap(Mapping[str, Sequence[int]]):
+    '''
+    словарь str -> последовательность int поверх общего буфера:
+    отсортированные ключи (MappedStrings) + CSR (смещения и значения подряд) +
+    хэш-таблица с открытой адресацией (номер слота -> номер ключа) для поиска ключа за O(1)
+    '''
+    def __init__(self, keys: MappedStrings, offsets: Sequence[int], values: Sequence[int], slots: Sequence[int]) -> None:
+        self._keys = keys
+        self.offsets = offsets
+        self._values = values
+        self.slots = slots
+        self.mask = len(slots) - 1
+
+
+    def _find(self, key: str) -> int:
+        encoded = key.encode('utf-8')
+        slot = stable_hash(encoded) & self.mask
+
+        while True:
+            i = self.slots[slot]
+
+            if i < 0:
+                return -1
+
+            if self._keys.raw(i) == encoded:
+                return i
+
+            slot = (slot + 1) & self.mask
+
+
+    def __getitem__(self, key: str) -> Sequence[int]:
+        i = self._find(key)
+
+        if i < 0:
+            raise KeyError(key)
+
+        return self._values[self.offsets[i]:self.offsets[i + 1]]
+
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._find(key) >= 0
+
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+
+class MappedWriter:
+    '''собирает секции файла в памяти и записывает их одним файлом через os.replace'''
+    def __init__(self) -> None:
+        self.sections: dict[str, tuple[bytes, str]] = {}
+
+
+    def add_array(self, name: str, typecode: str, values: Sequence[float]) -> None:
+        self.sections[name] = (array(typecode, values).tobytes(), typecode)
+
+
+    def add_strings(self, name: str, strings: Sequence[str]) -> None:
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = array('I', [0])
+
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+
+        self.sections[f'{name}.blob'] = (b''.join(encoded), 'B')
+        self.sections[f'{name}.offsets'] = (offsets.tobytes(), 'I')
+
+
+    def add_multimap(self, name: str, mapping: Mapping[str, Sequence[int]], typecode: str = 'I') -> None:
+        keys = sorted(mapping)
+        offsets = array('I', [0])
+        values = array(typecode)
+
+        for key in keys:
+            values.extend(mapping[key])
+            offsets.append(len(values))
+
+        # размер таблицы - степень двойки, заполнение не больше половины
+        size = 1 << max(1, (2 * len(keys) - 1).bit_length())
+        slots = array('i', [-1]) * size
+
+        for i, key in enumerate(keys):
+            slot = stable_hash(key.encode('utf-8')) & (size - 1)
+
+            while slots[slot] >= 0:
+                slot = (slot + 1) & (size - 1)
+
+            slots[slot] = i
+
+        self.add_strings(f'{name}.keys', keys)
+        self.sections[f'{name}.offsets'] = (offsets.tobytes(), 'I')
+        self.sections[f'{name}.values'] = (values.tobytes(), typecode)
+        self.sections[f'{name}.slots'] = (slots.tobytes(), 'i')
+
+
+    def image(self, checksum: bytes) -> bytes:
+        '''весь файл целиком: заголовок, каталог и секции'''
+        directory: dict[str, list[Any]] = {}
+        offset = 0
+
+        for name, (data, typecode) in self.sections.items():
+            directory[name] = [offset, len(data), typecode]
+            offset += len(data) + (-len(data) % ALIGN)
+
+        encoded = json.dumps(directory).encode('utf-8')
+        start = HEADER.size + len(encoded)
+        start += -start % ALIGN
+
+        parts = [HEADER.pack(MAGIC, VERSION, checksum, len(encoded)), encoded, b'\0' * (start - HEADER.size - len(encoded))]
+
+        for data, _ in self.sections.values():
+            parts.append(data)
+            parts.append(b'\0' * (-len(data) % ALIGN))
+
+        return b''.join(parts)
+
+
+    def write(self, path: pathlib.Path, checksum: bytes) -> None:
+        '''
+        запись через временный файл и os.replace: по итоговому пути лежит либо старый файл, либо новый целиком.
+        при OSError (нет места, файловая система только для чтения) временный файл удаляется, ошибка пробрасывается
+        '''
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+
+        try:
+            with tmp.open('wb') as f:
+                f.write(self.image(checksum))
+
+            os.replace(tmp, path)
+
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            raise
+
+
+
+class MappedFile:
+    '''
+    файл, отображенный в память только для чтения. страницы общие для всех процессов,
+    открывших этот файл, поэтому N воркеров держат одну копию индекса в page cache
+    '''
+    def __init__(self, path: pathlib.Path) -> None:
+        with path.open('rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._load(mm, path)
+        except BaseException:
+            mm.close()
+            raise
+
+
+    @classmethod
+    def from_bytes(cls, data: bytes, path: pathlib.Path) -> 'MappedFile':
+        '''те же секции в памяти процесса, без файла - если общий файл записать не удалось'''
+        mapped = cls.__new__(cls)
+        mapped._load(data, path)
+        return mapped
+
+
+    def _load(self, mm: mmap.mmap | bytes, path: pathlib.Path) -> None:
+        self.mm = mm
+
+        magic, version, self.checksum, size = HEADER.unpack_from(mm, 0)
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path}: неизвестный формат')
+
+        self.directory: dict[str, list[Any]] = json.loads(mm[HEADER.size:HEADER.size + size])
+
+        start = HEADER.size + size
+        self.start = start + (-start % ALIGN)
+        self.buffer = memoryview(mm)
+
+
+    def close(self) -> None:
+        '''освобождает отображение; только пока из него не собраны объекты (read)'''
+        self.buffer.release()
+
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+
+
+    def array(self, name: str) -> memoryview:
+        offset, length, typecode = self.directory[name]
+        return self.buffer[self.start + offset:self.start + offset + length].cast(typecode)
+
+
+    def strings(self, name: str) -> MappedStrings:
+        return MappedStrings(self.array(f'{name}.blob'), self.array(f'{name}.offsets'))
+
+
+    def multimap(self, name: str) -> MappedMultiMap:
+        return MappedMultiMap(
+            self.strings(f'{name}.keys'), self.array(f'{name}.offsets'), self.array(f'{name}.values'), self.array(f'{name}.slots')
+        )
+
+
+
+def shared_path(json_path: pathlib.Path, settings: SnapshotSettings = snapshot_settings) -> pathlib.Path:
+    directory = pathlib.Path(settings.dir) if settings.dir else json_path.parent / 'snapshots'
+    return directory / f'{json_path.stem}.mmap'
+
+
+def open_shared(path: pathlib.Path, checksum: bytes) -> MappedFile | None:
+    '''отображенный файл или None, если его нет, он другого формата или собран из другого json'''
+    try:
+        mapped = MappedFile(path)
+
+    except FileNotFoundError:
+        return None
+
+    except (OSError, ValueError, struct.error) as e:
+        logger.warning(f'общий индекс {path} не открыт: {e}')
+        return None
+
+    if mapped.checksum != checksum:
+        mapped.close()
+        return None
+
+    return mapped
+
+
+
+def load_or_build_shared(
+    json_path: str,
+    build: Callable[[Any], Any],
+    write: Callable[[MappedWriter, Any], None],
+    read: Callable[[MappedFile], T],
+    settings: SnapshotSettings = snapshot_settings
+) -> T:
+    '''
+    структуры индекса, отображенные из общего файла, если он собран из этого же json (по sha256);
+    иначе build(raw) строит структуры, write(writer, data) раскладывает их по секциям, файл перезаписывается.
+    read(mapped) собирает из секций объекты, которые читают буфер без копирования
+    '''
+    p = pathlib.Path(json_path)
+    source = p.read_bytes()
+    checksum = hashlib.sha256(source).digest()
+    path = shared_path(p, settings)
+
+    mapped = open_shared(path, checksum)
+
+    if mapped is None:
+        logger.info(f'общий индекс {path} отсутствует или устарел, индекс строится из {p.name}')
+
+        writer = MappedWriter()
+        write(writer, build(json.loads(source)))
+
+        try:
+            writer.write(path, checksum)
+            mapped = MappedFile(path)
+
+        except OSError as e:
+            logger.warning(f'общий индекс {path} не записан, индекс хранится в памяти процесса: {e}')
+            mapped = MappedFile.from_bytes(writer.image(checksum), path)
+
+    return read(mapped)
\ No newline at end of file
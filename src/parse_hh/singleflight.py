@@ -0,0 +1,69 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Generic, TypeVar
+
+
+
+T = TypeVar('T')
+
+
+
+class SingleFlight(Generic[T]):
+    '''
+    дедупликация одинаковых одновременных запросов:
+    первый вызов с ключом запускает fn() отдельной задачей, остальные ждут ту же задачу
+    и получают ее результат (или ее исключение).
+    отмена одного ожидающего (клиент отключился) не отменяет общий вызов для остальных,
+    задача отменяется только когда ее перестали ждать все
+    '''
+    def __init__(self) -> None:
+        self._flights: dict[str, asyncio.Task[T]] = {}
+        self._waiters: dict[str, int] = {}
+
+        self.leaders = 0
+        self.followers = 0
+
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._flights.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.leaders += 1
+
+        else:
+            self.followers += 1
+
+        self._waiters[key] += 1
+
+        try:
+            return await asyncio.shield(task)
+
+        except asyncio.CancelledError:
+            if self._flights.get(key) is task and self._waiters[key] == 1 and not task.done():
+                task.cancel()
+            raise
+
+        finally:
+            if self._flights.get(key) is task:
+                self._waiters[key] -= 1
+
+
+    def _forget(self, key: str, task: asyncio.Task[T]) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+            del self._waiters[key]
+
+        # исключение уже получили ожидающие, здесь только гасим предупреждение asyncio
+        if not task.cancelled():
+            task.exception()
+
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'in_flight': len(self._flights),
+            'leaders': self.leaders,
+            'followers': self.followers
+        }
\ No newline at end of file
@@ -0,0 +1,109 @@
+import os
+import json
+import pickle
+import hashlib
+import logging
+import pathlib
+from typing import Any, Callable, TypeVar
+
+from ..config import configure_logging, SnapshotSettings, snapshot_settings
+
+
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+T = TypeVar('T')
+
+# формат файла: MAGIC + VERSION (1 байт) + sha256 исходного json (32 байта) + pickle готовых структур
+MAGIC = b'PHHS'
+VERSION = 7  # увеличивать при изменении структур индексов
+HEADER_SIZE = len(MAGIC) + 1 + 32
+
+
+
+def snapshot_path(json_path: pathlib.Path, settings: SnapshotSettings = snapshot_settings) -> pathlib.Path:
+    directory = pathlib.Path(settings.dir) if settings.dir else json_path.parent / 'snapshots'
+    return directory / f'{json_path.stem}.snapshot'
+
+
+def read_snapshot(path: pathlib.Path, checksum: bytes) -> Any | None:
+    '''содержимое снапшота или None, если его нет, он другой версии или собран из другого json'''
+    try:
+        with path.open('rb') as f:
+            header = f.read(HEADER_SIZE)
+
+            if header != MAGIC + bytes([VERSION]) + checksum:
+                return None
+
+            return pickle.load(f)
+
+    except FileNotFoundError:
+        return None
+
+    except (OSError, pickle.UnpicklingError, EOFError) as e:
+        logger.warning(f'снапшот {path} не прочитан: {e}')
+        return None
+
+
+def write_snapshot(path: pathlib.Path, checksum: bytes, data: Any) -> None:
+    '''запись через временный файл и os.replace, чтобы параллельно стартующие воркеры не увидели половину файла'''
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+
+        with tmp.open('wb') as f:
+            f.write(MAGIC + bytes([VERSION]) + checksum)
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(tmp, path)
+
+    except OSError as e:
+        logger.warning(f'снапшот {path} не записан: {e}')
+
+
+
+def load_or_build(json_path: str, build: Callable[[Any], T], settings: SnapshotSettings = snapshot_settings) -> T:
+    '''
+    готовые структуры индекса из бинарного снапшота, если он собран из этого же json (по sha256);
+    иначе json разбирается, build(raw) строит структуры заново, и снапшот перезаписывается
+    '''
+    p = pathlib.Path(json_path)
+    source = p.read_bytes()
+
+    if not settings.enabled:
+        return build(json.loads(source))
+
+    checksum = hashlib.sha256(source).digest()
+    path = snapshot_path(p, settings)
+
+    data = read_snapshot(path, checksum)
+
+    if data is not None:
+        return data  # type: ignore[no-any-return]
+
+    logger.info(f'снапшот {path} отсутствует или устарел, индекс строится из {p.name}')
+
+    data = build(json.loads(source))
+    write_snapshot(path, checksum, data)
+
+    return data
+
+
+
+if __name__ == '__main__':
+    # шаг сборки (например, в Dockerfile): python -m src.parse_hh.snapshot
+    from .areas_index import load_area_resolver_from_file
+    from .metro_index import load_metro_resolver_from_file
+
+    data_dir = pathlib.Path(__file__).resolve().parent
+
+    # оба формата: pickle-снапшот и общий отображаемый файл (HH_SNAPSHOT_SHARED выбирает, какой читать)
+    for shared in (False, True):
+        settings = snapshot_settings.model_copy(update={'shared': shared})
+
+        load_area_resolver_from_file(str(data_dir / 'areas.json'), settings=settings)
+        load_metro_resolver_from_file(str(data_dir / 'metro.json'), settings=settings)
+
+    logger.info(f'снапшоты собраны: {snapshot_path(data_dir / "areas.json").parent}')
\ No newline at end of file
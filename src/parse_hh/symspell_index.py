@@ -0,0 +1,98 @@
+from collections import defaultdict
+from itertools import combinations
+from collections.abc import Mapping, Sequence
+from typing import Iterable
+
+
+
+def levenshtein(a: str, b: str, limit: int | None = None) -> int:
+    '''
+    расстояние Левенштейна. если задан limit и расстояние точно больше него,
+    счет прерывается и возвращается limit + 1
+    '''
+    if len(a) < len(b):
+        a, b = b, a
+
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+
+    previous = list(range(len(b) + 1))
+
+    for i, ca in enumerate(a, 1):
+        current = [i]
+
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+
+        if limit is not None and min(current) > limit:
+            return limit + 1
+
+        previous = current
+
+    return previous[-1]
+
+
+
+def deletes(word: str, max_distance: int) -> set[str]:
+    '''все варианты word без 0..max_distance символов'''
+    result = {word}
+
+    for k in range(1, min(max_distance, len(word)) + 1):
+        for positions in combinations(range(len(word)), k):
+            result.add(''.join(c for i, c in enumerate(word) if i not in positions))
+
+    return result
+
+
+
+class SymSpellIndex:
+    '''
+    словарь удалений в стиле SymSpell: при загрузке для каждого слова сохраняются все его варианты
+    без 1..max_distance символов. два слова на расстоянии <= k обязательно имеют общий такой вариант,
+    поэтому запрос генерирует свои удаления, достает кандидатов по словарю и только их проверяет
+    точным расстоянием Левенштейна - без обхода всех слов
+    '''
+    def __init__(self, words: Iterable[str], max_distance: int = 2) -> None:
+        self.max_distance = max_distance
+        self.words: Sequence[str] = sorted(set(words))
+
+        index: dict[str, list[int]] = defaultdict(list)
+
+        for i, word in enumerate(self.words):
+            for variant in deletes(word, max_distance):
+                index[variant].append(i)
+
+        self.index: Mapping[str, Sequence[int]] = dict(index)
+
+
+    @classmethod
+    def from_parts(cls, words: Sequence[str], index: Mapping[str, Sequence[int]], max_distance: int = 2) -> 'SymSpellIndex':
+        '''индекс из готовых слов и словаря удалений (например отображенных из общего файла) без построения'''
+        result = cls.__new__(cls)
+        result.words, result.index, result.max_distance = words, index, max_distance
+        return result
+
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+
+    def search(self, query: str, max_distance: int | None = None) -> list[tuple[int, str]]:
+        '''слова на расстоянии <= max_distance (не больше заданного при построении): [(distance, word)], ближайшие первыми'''
+        k = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+
+        candidates: set[int] = set()
+
+        for variant in deletes(query, k):
+            candidates.update(self.index.get(variant, ()))
+
+        result: list[tuple[int, str]] = []
+
+        for i in candidates:
+            word = self.words[i]
+            distance = levenshtein(query, word, k)
+
+            if distance <= k:
+                result.append((distance, word))
+
+        return sorted(result)
\ No newline at end of file
@@ -0,0 +1,120 @@
+import re
+from collections.abc import Callable, Iterable, Mapping, MutableMapping
+
+
+
+# кириллица -> латиница в самом распространенном упрощенном виде (как в загранпаспортах и на hh.ru)
+TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't',
+    'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y', 'ь': '',
+    'э': 'e', 'ю': 'yu', 'я': 'ya'
+}
+
+# варианты одной буквы в разных системах транслитерации сводятся к одному написанию:
+# nizhny / nizhniy / nizhnij, yekaterinburg / ekaterinburg, khabarovsk / habarovsk, rossiya / rossia.
+# одиночные буквы (и кириллица сразу в сведенном виде) - одним str.translate, буквосочетания - str.replace
+LATIN_LETTERS: dict[str, str | int | None] = {'x': 'ks', 'w': 'v', 'q': 'k', 'j': 'i', 'y': 'i', '-': ' '}
+KEY_TABLE = str.maketrans({
+    **{cyrillic: latin.translate(str.maketrans(LATIN_LETTERS)) for cyrillic, latin in TRANSLIT.items()},
+    **LATIN_LETTERS
+})
+LATIN_DIGRAPHS = [('shch', 'sh'), ('sch', 'sh'), ('kh', 'h'), ('tz', 'ts'), ('cz', 'ts'), ('ie', 'e')]
+DOUBLE_RE = re.compile(r'([a-z])\1+')
+
+LATIN_RE = re.compile(r'[a-z]')
+
+# сокращения слов в названиях: "пл. ленина", "просп. мира", "московская обл."
+# (точки убирает normalize_name, поэтому ключи - без них)
+WORD_ABBREVIATIONS = {
+    'область': ('обл',),
+    'республика': ('респ',),
+    'район': ('р-н',),
+    'площадь': ('пл',),
+    'проспект': ('пр', 'просп', 'пр-т'),
+    'бульвар': ('б-р',),
+    'улица': ('ул',),
+    'шоссе': ('ш',),
+}
+
+# общепринятые сокращения и названия на английском -> нормализованное название в справочнике areas
+AREA_ALIASES = {
+    'мск': 'москва', 'msk': 'москва', 'moscow': 'москва',
+    'спб': 'санкт-петербург', 'питер': 'санкт-петербург', 'санкт петербург': 'санкт-петербург',
+    'spb': 'санкт-петербург', 'piter': 'санкт-петербург', 'saint petersburg': 'санкт-петербург',
+    'st petersburg': 'санкт-петербург', 'petersburg': 'санкт-петербург',
+    'екб': 'екатеринбург', 'ekb': 'екатеринбург',
+    'нск': 'новосибирск', 'nsk': 'новосибирск',
+    'нн': 'нижний новгород', 'nn': 'нижний новгород',
+    'рф': 'россия', 'russia': 'россия',
+    'мо': 'московская область', 'подмосковье': 'московская область',
+    'ло': 'ленинградская область',
+    'kyiv': 'киев',
+}
+
+
+
+def has_latin(s: str) -> bool:
+    return LATIN_RE.search(s) is not None
+
+
+def latin_key(s: str) -> str:
+    '''латинский ключ строки: транслитерация и сведение вариантов написания к одному'''
+    s = s.translate(KEY_TABLE)
+
+    for digraph, replacement in LATIN_DIGRAPHS:
+        if digraph in s:
+            s = s.replace(digraph, replacement)
+
+    return DOUBLE_RE.sub(r'\1', s)
+
+
+
+def abbreviated(name: str) -> set[str]:
+    '''варианты имени с сокращенными словами ("площадь ленина" -> "пл ленина"), без самого имени'''
+    words = name.split(' ')
+    variants = set()
+
+    for i, word in enumerate(words):
+        for short in WORD_ABBREVIATIONS.get(word, ()):
+            variants.add(' '.join([*words[:i], short, *words[i + 1:]]))
+
+    return variants
+
+
+
+def add_alternate_keys(
+    name_map: MutableMapping[str, list[int]],
+    aliases: dict[str, str] | None = None,
+    normalize: Callable[[str], str] | None = None
+) -> None:
+    '''
+    дополняет name_map ключами, по которым то же имя находится точным совпадением:
+    сокращения слов, латинский ключ (latin_key) каждого имени и aliases (сокращение -> имя).
+    существующие ключи не перезаписываются; aliases на отсутствующие имена пропускаются
+    '''
+    original = set(name_map)
+
+    def add(key: str, nodes: Iterable[int]) -> None:
+        if key and key not in original:
+            entries = name_map.setdefault(key, [])
+            entries.extend(node for node in nodes if node not in entries)
+
+    for name, nodes in list(name_map.items()):
+        for variant in abbreviated(name):
+            add(variant, nodes)
+
+        add(latin_key(name), nodes)
+
+    for alias, target in (aliases or {}).items():
+        alias = normalize(alias) if normalize else alias
+        key = latin_key(alias) if has_latin(alias) else alias
+
+        if target in original:
+            add(key, name_map[target])
+
+
+def frozen_name_map(name_map: Mapping[str, list[int]]) -> dict[str, tuple[int, ...]]:
+    '''name_map с кортежами вместо списков; у имени и его транслита/сокращений - один и тот же объект кортежа'''
+    shared: dict[tuple[int, ...], tuple[int, ...]] = {}
+    return {name: shared.setdefault(tuple(nodes), tuple(nodes)) for name, nodes in name_map.items()}
\ No newline at end of file
@@ -0,0 +1,1337 @@
+from httpx import AsyncClient, ASGITransport
+from starlette import status
+
+import gzip
+import json
+import difflib
+import hashlib
+import httpx
+import asyncio
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+import pytest_asyncio
+from pathlib import Path
+
+from src.main import app
+from src.config import (
+    HHStubSettings, SnapshotSettings, RefreshSettings, CrawlerSettings, RateLimitSettings, CircuitBreakerSettings, HedgingSettings
+)
+from src.basemodels import AuthGetVacanciesModel
+from src.parse_hh import (
+    create_hh_client, fetch_upstream, load_area_resolver_from_file, load_metro_resolver_from_file,
+    TTLCache, SingleFlight, TokenBucket, RateLimitedTransport, RateLimitExceeded, parse_retry_after,
+    CircuitBreaker, CircuitOpenError, Hedger, HedgingTransport,
+    load_or_build, snapshot_path, ResolverSlot,
+    MetroResolver, GeoGrid, haversine_km, DictionaryRefresher, NoPreviousDictionary, auth_create_query_params, filter_by_region, CrawlerPool,
+    TooManyCrawlJobs, get_crawl_job_store, get_crawler_pool, TrigramIndex, SymSpellIndex
+)
+from src.parse_hh import shared_index
+from src.parse_hh.hh_stub import app as hh_stub_app
+from src.auth.validation import get_current_auth_user
+from src.database.models import CrawlJob, User
+
+
+PARSE_HH_DIR = Path(__file__).resolve().parent.parent / 'src' / 'parse_hh'
+
+
+
+@pytest.fixture(scope='module')
+def resolvers():
+    return (
+        load_area_resolver_from_file(str(PARSE_HH_DIR / 'areas.json')),
+        load_metro_resolver_from_file(str(PARSE_HH_DIR / 'metro.json'))
+    )
+
+
+@pytest_asyncio.fixture
+async def stub_backed_app(resolvers):
+    '''то же состояние, что создает lifespan, но API HH заменен на hh_stub'''
+    hh_stub_app.state.settings = HHStubSettings(latency_median_ms=0)
+
+    area_resolver, metro_resolver = resolvers
+
+    app.state.area_resolver = ResolverSlot.loaded('areas', area_resolver)
+    app.state.metro_resolver = ResolverSlot.loaded('metro', metro_resolver)
+    app.state.vacancies_cache = TTLCache.from_settings()
+    app.state.vacancy_details_cache = TTLCache.from_settings()
+    app.state.vacancies_flight = SingleFlight()
+    app.state.hh_rate_limiter = TokenBucket.from_settings()
+    app.state.hh_breaker = CircuitBreaker()
+    app.state.hh_hedger = Hedger()
+    app.state.hh_client = create_hh_client(
+        rate_limiter=app.state.hh_rate_limiter, breaker=app.state.hh_breaker, hedger=app.state.hh_hedger,
+        transport=ASGITransport(hh_stub_app)
+    )
+
+    yield app
+
+    await app.state.hh_client.aclose()
+
+
+
+@pytest.mark.asyncio
+async def test_get_vacancies_from_stub(stub_backed_app):
+    async with AsyncClient(transport=ASGITransport(stub_backed_app), base_url="http://test") as client:
+        response = await client.get('/get_vacancies', params={'text': 'python', 'area': 'Москва'})
+        assert response.status_code == status.HTTP_200_OK
+
+        data = response.json()
+        assert {'items', 'found', 'pages'} <= data.keys()
+        assert len(data['items']) == min(20, data['found'])
+
+
+@pytest.mark.asyncio
+async def test_get_vacancies_repeated_query_is_cached(stub_backed_app):
+    async with AsyncClient(transport=ASGITransport(stub_backed_app), base_url="http://test") as client:
+        first = await client.get('/get_vacancies', params={'text': 'go', 'area': 'Казань'})
+        second = await client.get('/get_vacancies', params={'area': 'Казань', 'text': 'go'})
+
+        assert first.content == second.content
+        assert stub_backed_app.state.vacancies_cache.stats()['hits'] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_vacancies_throttled_upstream(stub_backed_app):
+    hh_stub_app.state.settings = HHStubSettings(latency_median_ms=0, throttle_rate=1.0, retry_after=0)
+
+    async with AsyncClient(transport=ASGITransport(stub_backed_app), base_url="http://test") as client:
+        response = await client.get('/get_vacancies', params={'text': 'java'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    assert stub_backed_app.state.hh_rate_limiter.stats()['pauses'] > 0
+
+
+@pytest.mark.asyncio
+async def test_stub_vacancy_detail():
+    hh_stub_app.state.settings = HHStubSettings(latency_median_ms=0)
+
+    async with AsyncClient(transport=ASGITransport(hh_stub_app), base_url="http://test") as client:
+        response = await client.get('/vacancies/12345')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['id'] == '12345'
+        assert 'description' in response.json()
+
+
+def test_snapshot_rebuilt_when_json_changes(tmp_path):
+    settings = SnapshotSettings(dir=str(tmp_path / 'snapshots'))
+    source = tmp_path / 'areas.json'
+    builds = []
+
+    def build(raw):
+        builds.append(raw)
+        return {'names': raw}
+
+    source.write_text('["a", "b"]', encoding='utf-8')
+    assert load_or_build(str(source), build, settings) == {'names': ['a', 'b']}
+    assert load_or_build(str(source), build, settings) == {'names': ['a', 'b']}
+    assert len(builds) == 1
+    assert snapshot_path(source, settings).exists()
+
+    source.write_text('["c"]', encoding='utf-8')
+    assert load_or_build(str(source), build, settings) == {'names': ['c']}
+    assert len(builds) == 2
+
+
+def test_resolve_memo_hits_raw_and_normalized(resolvers):
+    area_resolver, metro_resolver = resolvers
+    area_resolver.memo.clear()
+    before = area_resolver.memo.stats()
+
+    first = area_resolver.resolve('г. Масква')
+    first.append('999')  # изменение результата не должно попасть в memo
+
+    assert area_resolver.resolve('г. Масква') == area_resolver.resolve('масква') == ['1']
+
+    stats = area_resolver.memo.stats()
+    assert stats['misses'] - before['misses'] == 1
+    assert stats['raw_hits'] - before['raw_hits'] == 1
+    assert stats['normalized_hits'] - before['normalized_hits'] == 1
+
+    assert metro_resolver.resolve('новокосно') == metro_resolver.resolve('Новокосно') == ['8.189']
+    assert metro_resolver.memo.stats()['normalized_hits'] >= 1
+
+
+@pytest.mark.asyncio
+async def test_suggest_areas_and_metro(stub_backed_app):
+    async with AsyncClient(transport=ASGITransport(stub_backed_app), base_url="http://test") as client:
+        areas = await client.get('/suggest/areas', params={'q': 'моск', 'limit': 3})
+        assert areas.status_code == status.HTTP_200_OK
+        assert areas.json()[0]['id'] == '1'
+        assert len(areas.json()) == 3
+
+        metro = await client.get('/suggest/metro', params={'q': 'новокос'})
+        assert metro.status_code == status.HTTP_200_OK
+        assert metro.json()[0]['id'] == '8.189'
+
+        empty = await client.get('/suggest/areas', params={'q': ''})
+        assert empty.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_compact_tables_build_paths_lazily(resolvers):
+    area_resolver, metro_resolver = resolvers
+
+    (moscow,) = area_resolver.name_map['москва']
+    assert area_resolver.table.entry(moscow) == {'id': '1', 'name': 'Москва', 'depth': 1, 'path': 'Россия > Москва'}
+
+    (station,) = metro_resolver.name_map['новокосино']
+    assert metro_resolver.table.path(station) == 'Москва > Калининская > Новокосино'
+    assert metro_resolver.table.entry(station)['city_id'] == '1'
+
+
+def test_shared_index_matches_in_memory_resolvers(resolvers, tmp_path):
+    area_resolver, metro_resolver = resolvers
+    settings = SnapshotSettings(dir=str(tmp_path), shared=True)
+
+    shared_metro = load_metro_resolver_from_file(str(PARSE_HH_DIR / 'metro.json'), settings=settings)
+    shared_area = load_area_resolver_from_file(str(PARSE_HH_DIR / 'areas.json'), settings=settings)
+
+    assert (tmp_path / 'areas.mmap').exists()
+    assert list(shared_area.all_names[:50]) == area_resolver.all_names[:50]
+
+    for query in ['Москва', 'г. Казань', 'масква', 'санкт петербрг', 'неизвестное место', 'spb', 'Nizhniy Novgorod', 'qwerty']:
+        assert sorted(shared_area.resolve(query)) == sorted(area_resolver.resolve(query))
+
+    for query in ['Новокосино', 'новокосно', 'москва арбатская']:
+        assert sorted(shared_metro.resolve(query)) == sorted(metro_resolver.resolve(query))
+
+    assert shared_area.suggest('моск', 3) == area_resolver.suggest('моск', 3)
+
+
+def test_shared_index_write_failure_and_stale_file(resolvers, tmp_path, monkeypatch):
+    _, metro_resolver = resolvers
+    metro_json = str(PARSE_HH_DIR / 'metro.json')
+    settings = SnapshotSettings(dir=str(tmp_path), shared=True)
+
+    # файл не записался (нет места, файловая система только для чтения) - ни половины файла, ни временного;
+    # индекс все равно работает, из памяти процесса
+    def disk_full(src, dst):
+        raise OSError(28, 'No space left on device')
+
+    monkeypatch.setattr(shared_index.os, 'replace', disk_full)
+    shared_metro = load_metro_resolver_from_file(metro_json, settings=settings)
+    monkeypatch.undo()
+
+    assert list(tmp_path.iterdir()) == []
+    assert shared_metro.resolve('Новокосино') == metro_resolver.resolve('Новокосино')
+
+    # файл от другого json или другой версии формата не используется, и его отображение закрывается
+    load_metro_resolver_from_file(metro_json, settings=settings)
+    path = tmp_path / 'metro.mmap'
+    close, closed = shared_index.MappedFile.close, []
+
+    def spy_close(mapped):
+        close(mapped)
+        closed.append(mapped.mm.closed)
+
+    monkeypatch.setattr(shared_index.MappedFile, 'close', spy_close)
+    assert shared_index.open_shared(path, b'\0' * 32) is None and closed == [True]
+
+    data = bytearray(path.read_bytes())
+    data[4] = shared_index.VERSION + 1
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(ValueError):
+        shared_index.MappedFile(path)
+
+    assert shared_index.open_shared(path, hashlib.sha256((PARSE_HH_DIR / 'metro.json').read_bytes()).digest()) is None
+
+
+@pytest.mark.asyncio
+async def test_ready_reports_slow_resolver(stub_backed_app, resolvers):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_loader():
+        started.set()
+        release.wait(5)
+        return resolvers[1]
+
+    stub_backed_app.state.metro_resolver = ResolverSlot('metro', slow_loader)
+    stub_backed_app.state.metro_resolver.start()
+    await asyncio.to_thread(started.wait, 5)
+
+    async with AsyncClient(transport=ASGITransport(stub_backed_app), base_url="http://test") as client:
+        response = await client.get('/ready')
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.json()['resolvers']['metro']['state'] == 'loading'
+
+        # запросы без metro не ждут загрузки метро
+        response = await client.get('/suggest/areas', params={'q': 'моск'})
+        assert response.status_code == status.HTTP_200_OK
+
+        release.set()
+        await stub_backed_app.state.metro_resolver.get(5)
+
+        response = await client.get('/ready')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['resolvers']['metro']['seconds'] is not None
+
+
+@pytest.mark.asyncio
+async def test_batch_resolve(stub_backed_app):
+    body = {'areas': ['Москва', 'г. москва', 'москва район', 'масква', 'ыыыыыы'], 'metro': ['новокосно']}
+
+    async with AsyncClient(transport=ASGITransport(stub_backed_app), base_url="http://test") as client:
+        response = await client.post('/resolve', json=body)
+        assert response.status_code == status.HTTP_200_OK
+
+    areas = response.json()['areas']
+    assert [a['input'] for a in areas] == body['areas']
+    assert [a['kind'] for a in areas] == ['exact', 'exact', 'part', 'fuzzy', 'fallback']
+    assert areas[0]['ids'] == areas[3]['ids'] == ['1']
+    assert areas[0]['score'] == 1.0 and 0 < areas[3]['score'] < 1
+
+    (metro,) = response.json()['metro']
+    assert metro['ids'] == ['8.189'] and metro['kind'] == 'fuzzy'
+
+
+
+@pytest.mark.asyncio
+async def test_dictionary_refresh_swaps_and_rolls_back(stub_backed_app, tmp_path):
+    # HH отдает метро, где одна станция закрыта, а другая открыта
+    metro_json = json.loads((PARSE_HH_DIR / 'metro.json').read_text(encoding='utf-8'))
+    stations = metro_json[0]['lines'][0]['stations']
+    closed = stations.pop(0)
+    stations.append({**closed, 'id': '999.1', 'name': 'Тестовая Новая'})
+
+    hh_dir = tmp_path / 'hh'
+    hh_dir.mkdir()
+    (hh_dir / 'metro.json').write_text(json.dumps(metro_json, ensure_ascii=False), encoding='utf-8')
+    hh_stub_app.state.settings = HHStubSettings(latency_median_ms=0, data_dir=str(hh_dir))
+
+    slot = stub_backed_app.state.metro_resolver
+    old_resolver = slot.value
+
+    refresher = DictionaryRefresher(
+        stub_backed_app.state.hh_client, {'metro': slot}, {'metro': load_metro_resolver_from_file}, PARSE_HH_DIR,
+        RefreshSettings(dir=str(tmp_path / 'dictionaries'), interval=3600)
+    )
+    stub_backed_app.state.dictionary_refresher = refresher
+
+    assert await refresher.refresh_all() == {'metro': True}
+    assert slot.value is not old_resolver
+    assert slot.value.resolve('Тестовая Новая') == ['999.1']
+    assert old_resolver.resolve('Тестовая Новая') != ['999.1']  # запросы со старым справочником не затронуты
+
+    state = refresher.states['metro']
+    assert (state.added, state.removed) == (['999.1'], [closed['id']])
+    assert state.etag is not None
+
+    # та же версия на HH - 304, справочник не пересобирается
+    new_resolver = slot.value
+    assert await refresher.refresh_all() == {'metro': False}
+    assert refresher.not_modified == 1 and slot.value is new_resolver
+
+    async with AsyncClient(transport=ASGITransport(stub_backed_app), base_url="http://test") as client:
+        response = await client.get('/dictionaries')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['dictionaries']['metro']['has_previous'] is True
+
+    await refresher.rollback('metro')
+    assert slot.value is old_resolver
+    assert (state.added, state.removed) == ([closed['id']], ['999.1'])
+
+    with pytest.raises(NoPreviousDictionary):
+        await refresher.rollback('metro')
+
+    # валидаторы сохранены на диске: новый процесс начнет с условного запроса
+    assert DictionaryRefresher(
+        stub_backed_app.state.hh_client, {'metro': slot}, {}, PARSE_HH_DIR, refresher.settings
+    ).states['metro'].etag == state.etag
+
+
+
+class GatedStubTransport(httpx.AsyncBaseTransport):
+    '''hh_stub, где запрос справочника метро ждет, пока не откроют gate'''
+    def __init__(self):
+        self._transport = ASGITransport(hh_stub_app)
+        self.entered = asyncio.Event()
+        self.gate = asyncio.Event()
+
+
+    async def handle_async_request(self, request):
+        if request.url.path == '/metro':
+            self.entered.set()
+            await self.gate.wait()
+
+        return await self._transport.handle_async_request(request)
+
+
+@pytest.mark.asyncio
+async def test_dictionary_refresh_shared_between_workers(stub_backed_app, resolvers, tmp_path):
+    _, metro_resolver = resolvers
+    metro_json = json.loads((PARSE_HH_DIR / 'metro.json').read_text(encoding='utf-8'))
+    hh_dir = tmp_path / 'hh'
+    hh_dir.mkdir()
+
+    def publish(station_id, name):
+        # новая версия справочника на HH: еще одна станция
+        stations = metro_json[0]['lines'][0]['stations']
+        stations.append({**stations[0], 'id': station_id, 'name': name})
+        (hh_dir / 'metro.json').write_text(json.dumps(metro_json, ensure_ascii=False), encoding='utf-8')
+
+    hh_stub_app.state.settings = HHStubSettings(latency_median_ms=0, data_dir=str(hh_dir))
+    settings = RefreshSettings(dir=str(tmp_path / 'dictionaries'))
+
+    # два воркера uvicorn с общим каталогом справочников
+    def worker(client):
+        slot = ResolverSlot.loaded('metro', metro_resolver)
+        loaders = {'metro': load_metro_resolver_from_file}
+        return slot, DictionaryRefresher(client, {'metro': slot}, loaders, PARSE_HH_DIR, settings)
+
+    slot_a, worker_a = worker(stub_backed_app.state.hh_client)
+    slot_b, worker_b = worker(stub_backed_app.state.hh_client)
+
+    # обновление, скачанное одним воркером, подхватывает второй - без своей загрузки
+    publish('999.1', 'Тестовая Первая')
+    assert await worker_a.refresh_all() == {'metro': True}
+    assert await worker_b.sync('metro') is True and slot_b.value.resolve('Тестовая Первая') == ['999.1']
+    assert await worker_b.refresh_all() == {'metro': False} and worker_b.not_modified == 1
+
+    # откат через любой воркер откатывает все
+    await worker_b.rollback('metro')
+    assert await worker_a.sync('metro') is True and slot_a.value is metro_resolver
+
+    # пока воркер качает справочник, другой применил новую версию - скачанное отбрасывается
+    gated = GatedStubTransport()
+    worker_a.client = create_hh_client(transport=gated)
+
+    try:
+        publish('999.2', 'Тестовая Вторая')
+        download = asyncio.ensure_future(worker_a.refresh('metro'))
+        await gated.entered.wait()
+
+        assert await worker_b.refresh_all() == {'metro': True}
+        gated.gate.set()
+        assert await download is False and worker_a.updates == 1
+
+        await worker_a.sync_all()
+        assert slot_a.value.resolve('Тестовая Вторая') == ['999.2']
+
+        # загрузка идет без блокировки: откат не ждет медленного HH
+        gated.gate.clear()
+        gated.entered.clear()
+        download = asyncio.ensure_future(worker_a.refresh('metro'))
+        await gated.entered.wait()
+
+        await asyncio.wait_for(worker_a.rollback('metro'), 1)
+        assert slot_a.value.resolve('Тестовая Вторая') != ['999.2']
+
+        gated.gate.set()
+        assert await download is False
+
+    finally:
+        await worker_a.client.aclose()
+
+    assert await worker_b.sync('metro') is True and slot_b.value.resolve('Тестовая Вторая') != ['999.2']
+    assert worker_b.states['metro'].rolled_back and worker_b.states['metro'].generation == worker_a.states['metro'].generation
+
+
+
+def test_metro_resolution_scoped_to_area(resolvers):
+    area_resolver, metro_resolver = resolvers
+
+    # "Спортивная" есть в нескольких городах; с регионом - только станция этого города
+    assert len(metro_resolver.resolve('Спортивная')) > 1
+    assert metro_resolver.resolve('Спортивная', ['2']) == ['18.249']
+    assert metro_resolver.resolve('Спортивня', ['1']) == ['1.135']  # опечатка ищется только среди станций Москвы
+
+    # город без метро или без такой станции - ничего, а не станция другого города
+    assert metro_resolver.resolve('Спортивная', []) == []
+    assert metro_resolver.resolve('Спортивная', ['88']) == []
+
+    # регион раскрывается в города с метро внутри него
+    assert area_resolver.within(['113'], metro_resolver.table.city_ids) == [
+        city_id for city_id in metro_resolver.table.city_ids if area_resolver.ancestor_ids([city_id])[city_id][-1:] == ('113',)
+    ]
+
+    query = auth_create_query_params(AuthGetVacanciesModel(area='Санкт-Петербург', metro='Спортивная'), metro_resolver, area_resolver)
+    assert (query['area'], query['metro']) == (['2'], ['18.249'])
+
+    # регион не найден (значение по умолчанию) - станции ищутся по всем городам
+    query = auth_create_query_params(AuthGetVacanciesModel(area='qwxz', metro='Спортивная'), metro_resolver, area_resolver)
+    assert len(query['metro']) > 1
+
+
+def test_metro_city_scopes_are_bounded(resolvers):
+    _, shared = resolvers
+    metro_resolver = MetroResolver(shared.table, shared.name_map, shared.all_names, shared.station_index, shared.station_grid)
+    metro_resolver.max_scopes = 2
+
+    # у каждого набора городов свой memo: одна строка - разные станции
+    assert metro_resolver.resolve('Спортивная', ['1']) == ['1.135']
+    assert metro_resolver.resolve('Спортивная', ['2']) == ['18.249']
+    assert metro_resolver.resolve('Спортивная', ['1']) == ['1.135']
+    assert metro_resolver.city_scope_state(metro_resolver.city_scope(['1'])).memo.stats()['raw_hits'] == 1
+
+    # наборов городов не больше max_scopes: давно не нужный вытесняется вместе с индексом опечаток
+    assert sorted(metro_resolver.resolve('Спортивня', ['1', '2'])) == ['1.135', '18.249']
+    assert list(metro_resolver.scopes) == [metro_resolver.city_scope(['1']), metro_resolver.city_scope(['1', '2'])]
+    assert metro_resolver.resolve('Спортивня', ['2']) == ['18.249'] and len(metro_resolver.scopes) == 2
+    assert len(metro_resolver.memo) == 0  # запросы с городами не попадают в общий memo
+
+
+
+def test_resolver_corpus_exact_and_prefixed(resolvers):
+    # корпус бенчмарка benchmarks/bench_resolvers.py: точные названия и формы с префиксом должны находиться всегда
+    corpus = json.loads((PARSE_HH_DIR.parent.parent / 'benchmarks' / 'resolver_corpus.json').read_text(encoding='utf-8'))
+
+    for resolver, entries in zip(resolvers, (corpus['areas'], corpus['metro'])):
+        for entry in entries:
+            if entry['category'] in ('exact', 'prefixed', 'fallback'):
+                assert set(resolver.resolve(entry['input'])) == set(entry['expected']), entry
+
+
+
+def test_transliterated_and_abbreviated_input(resolvers):
+    area_resolver, metro_resolver = resolvers
+
+    for user_input, expected in [('moskva', '1'), ('Nizhniy Novgorod', '66'), ('nizhny novgorod', '66'), ('Yekaterinburg', '3'),
+                                 ('spb', '2'), ('СПб', '2'), ('мск', '1'), ('московская обл.', '2019')]:
+        resolution = area_resolver.resolve_detailed(user_input)
+        assert (resolution.ids, resolution.kind) == ((expected,), 'exact'), user_input
+
+    assert metro_resolver.resolve('Okhotny Ryad') == ['1.98']
+    assert set(metro_resolver.resolve('просп. Мира')) == set(metro_resolver.resolve('Проспект Мира'))
+
+    # латинский мусор не находит "похожий" латинский ключ нечетким поиском
+    assert area_resolver.resolve_detailed('qwerty').kind == 'fallback'
+    assert area_resolver.suggest('mosk', 1)[0]['id'] == '1'
+
+
+def test_trigram_index_matches_difflib(tmp_path):
+    names = [
+        'москва', 'московский', 'мосальск', 'минск', 'самара', 'саратов', 'сарапул',
+        'санкт-петербург', 'петрозаводск', 'петропавловск-камчатский', 'тверь', 'тула'
+    ]
+    index = TrigramIndex(names)
+
+    # ранжирование по ratio, cutoff отсекает далекие имена, limit - число лучших
+    assert index.search_scored('саратв', limit=3, cutoff=0.6) == [
+        (difflib.SequenceMatcher(None, name, 'саратв').ratio(), name) for name in ('саратов', 'самара', 'сарапул')
+    ]
+    assert index.search('саратв', limit=3, cutoff=0.75) == ['саратов']
+    assert index.search('саратв', limit=1, cutoff=0.6) == ['саратов']
+    assert index.search('саратв', limit=2, cutoff=0.6) == ['саратов', 'самара']
+    assert index.search('владивосток') == []
+
+    # опечатки: тот же результат, что у полного перебора difflib
+    typos = ['моссква', 'саратв', 'самра', 'петрозаводк', 'петропавловск', 'тулаа', 'санкт-петрбург', 'мосальк']
+
+    for query in typos:
+        for limit, cutoff in [(3, 0.75), (3, 0.6), (1, 0.6)]:
+            assert index.search(query, limit, cutoff) == difflib.get_close_matches(query, names, limit, cutoff), (query, limit, cutoff)
+
+    # индекс, отображенный из общего файла, отвечает так же
+    writer = shared_index.MappedWriter()
+    writer.add_strings('names', index.names)
+    writer.add_multimap('postings', index.postings)
+    writer.add_array('lengths', 'H', index.lengths)
+
+    path = tmp_path / 'trigrams.idx'
+    writer.write(path, b'\0' * 32)
+    mapped = shared_index.MappedFile(path)
+    restored = TrigramIndex.from_parts(mapped.strings('names'), mapped.multimap('postings'), mapped.array('lengths'))
+
+    for query in typos:
+        assert restored.search_scored(query, 3, 0.6) == index.search_scored(query, 3, 0.6)
+
+
+def brute_levenshtein(a, b):
+    # эталон без отсечений: полная таблица расстояний
+    table = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            table[i][j] = min(table[i - 1][j] + 1, table[i][j - 1] + 1, table[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+
+    return table[-1][-1]
+
+
+def test_symspell_index_matches_brute_force(resolvers):
+    stations = [
+        'арбатская', 'смоленская', 'киевская', 'курская', 'парк культуры', 'кропоткинская',
+        'охотный ряд', 'новокосино', 'новогиреево', 'сокол', 'сокольники'
+    ]
+    index = SymSpellIndex(stations, max_distance=2)
+
+    # опечатки на расстоянии 1 и 2
+    assert index.search('арбаская') == [(1, 'арбатская')] and index.search('арбацкая') == [(2, 'арбатская')]
+    assert index.search('кеевскя', 1) == [] and index.search('кеевскя', 2) == [(2, 'киевская')]
+    assert index.search('окотный рят') == [(2, 'охотный ряд')]
+    assert index.search('сакол') == [(1, 'сокол')]
+
+    queries = [
+        'арбаская', 'арбацкая', 'смаленская', 'курска', 'кеевскя', 'парк культру',
+        'окотный рят', 'новокосно', 'сакол', 'сокольник', 'тверская'
+    ]
+
+    for query in queries:
+        distances = sorted((brute_levenshtein(query, word), word) for word in stations)
+
+        for k in (0, 1, 2):
+            assert index.search(query, k) == [(d, word) for d, word in distances if d <= k], (query, k)
+
+        # расстояние больше заданного при построении не ищется
+        assert index.search(query, 5) == index.search(query, 2)
+
+    # MetroResolver.closest - ближайшие станции полного справочника в порядке расстояния
+    _, metro_resolver = resolvers
+    words = metro_resolver.station_index.words
+
+    for query in ['новокосно', 'охотный рят', 'смаленская', 'кеевскя']:
+        expected = sorted((brute_levenshtein(query, word), word) for word in words)
+        expected = [(word, d) for d, word in expected if d <= 2]
+        assert metro_resolver.closest(query, max_distance=2, limit=len(words)) == expected, query
+        assert metro_resolver.closest(query, max_distance=2, limit=2) == expected[:2]
+
+
+
+def test_area_intervals_answer_subtree_queries(resolvers, tmp_path):
+    area_resolver, _ = resolvers
+    table = area_resolver.table
+
+    russia, moscow_region, avsyunino = table.node('113'), table.node('2019'), table.node('5976')
+    assert table.is_ancestor(russia, avsyunino) and table.is_ancestor(moscow_region, avsyunino)
+    assert not table.is_ancestor(avsyunino, moscow_region) and table.node('нет') == table.node('999999999') == -1
+
+    # все потомки региона - непрерывный диапазон, совпадающий с обходом по родителям
+    region = set(area_resolver.descendant_ids('2019'))
+    assert region == {area_id for area_id, chain in area_resolver.ancestor_ids(map(str, table.ids)).items() if '2019' in chain}
+    assert area_resolver.within(['2019', '5976'], ['5976', '1', '2019', '3', 'x']) == ['5976', '2019']
+
+    items = [{'id': str(i), 'area': {'id': area_id}} for i, area_id in enumerate(['5976', '1', '2019', '3'])] + [{'id': '9'}]
+    assert filter_by_region(items, area_resolver, 'Московская обл.') == (items[::2][:2], ['2019'])
+    assert filter_by_region(items, area_resolver, 'qwerty') == (items, [])
+
+    shared_area = load_area_resolver_from_file(str(PARSE_HH_DIR / 'areas.json'), settings=SnapshotSettings(dir=str(tmp_path), shared=True))
+    assert shared_area.descendant_ids('2019') == area_resolver.descendant_ids('2019')
+
+
+
+@pytest.mark.asyncio
+async def test_nearby_metro_stations(stub_backed_app, resolvers):
+    _, metro_resolver = resolvers
+
+    async with AsyncClient(transport=ASGITransport(stub_backed_app), base_url='http://test') as client:
+        response = await client.get('/metro/nearby', params={'lat': 55.7558, 'lng': 37.6173, 'limit': 3})
+        assert response.status_code == status.HTTP_200_OK
+        assert [station['id'] for station in response.json()] == ['1.98', '3.100', '2.99']
+
+        response = await client.get('/metro/nearby', params={'lat': 55.7558, 'lng': 37.6173, 'radius_km': 0.3})
+        assert [(station['station_name'], station['distance_km']) for station in response.json()] == [('Охотный ряд', 0.211)]
+
+        response = await client.get('/metro/nearby', params={'lat': 55.7558, 'lng': 37.6173, 'radius_km': 100})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    # в городе без метро ближайших станций нет
+    assert metro_resolver.nearby(0.0, 0.0) == []
+
+    query_params = auth_create_query_params(AuthGetVacanciesModel(metro='55.7558, 37.6173, 0.34'), metro_resolver, None)
+    assert query_params['metro'] == ['1.98', '3.100', '2.99']
+
+
+def test_geo_grid_polar_and_antimeridian_queries(resolvers, tmp_path):
+    _, metro_resolver = resolvers
+    shared_settings = SnapshotSettings(dir=str(tmp_path), shared=True)
+    shared_metro = load_metro_resolver_from_file(str(PARSE_HH_DIR / 'metro.json'), settings=shared_settings)
+
+    # у полюса и у линии перемены дат прямоугольник поиска охватывает всю широтную полосу - перебираются
+    # только занятые ячейки, поэтому ответ мгновенный, а не секунды блокировки event loop
+    for resolver in (metro_resolver, shared_metro):
+        start = time.perf_counter()
+
+        for lat, lng in [(89.99, 0.0), (89.0, 37.6), (-89.99, 10.0), (55.75, 179.99), (55.75, -179.99)]:
+            assert resolver.nearby(lat, lng) == [] and resolver.nearby(lat, lng, radius_km=50) == []
+
+        assert time.perf_counter() - start < 0.1
+        assert [station['id'] for station in resolver.nearby_entries(55.7558, 37.6173, limit=3)] == ['1.98', '3.100', '2.99']
+
+    # точки у самого полюса: прямоугольник шире, чем занятых ячеек, - точки перебираются напрямую
+    lats, lngs = [89.9, 89.9, 89.9, 55.0, float('nan')], [0.0, 179.9, -179.9, 37.0, 0.0]
+    grid = GeoGrid(lats, lngs)
+    assert (len(grid.cells), list(grid.bounds)) == (4, [2750, 4495, -8995, 8995])
+
+    found = grid.within(89.95, 90.0, 20)
+    expected = sorted((haversine_km(89.95, 90.0, lats[p], lngs[p]), p) for p in range(3))
+    assert found == [item for item in expected if item[0] <= 20] and sorted(p for _, p in found) == [0, 1, 2]
+    assert grid.nearest(89.95, 90.0, 1, 50) == found[:1]
+    assert GeoGrid([], []).within(0.0, 0.0, 50) == []
+
+
+
+class MemoryJobStore:
+    '''хранилище заданий обхода в памяти с теми же гарантиями, что у CrawlJobStore (для тестов без Postgres)'''
+    def __init__(self, jobs):
+        self.jobs = {job.id: job for job in jobs}
+        self.items = {}  # (job_id, hh_id) -> страница
+        self.cancel_after = None  # отменить задание после стольких сохраненных страниц
+        self.heartbeats = 0
+        self.claims = 0
+
+
+    def owns(self, job_id, token):
+        job = self.jobs[job_id]
+        return job.status == 'running' and job.claimed_by == token
+
+
+    async def claim(self):
+        job = next((job for job in self.jobs.values() if job.status == 'pending'), None)
+
+        if job is not None:
+            self.claims += 1
+            job.status, job.claimed_by = 'running', f'token-{self.claims}'
+
+        return job
+
+
+    async def heartbeat(self, job_id, token):
+        if not self.owns(job_id, token):
+            return False
+
+        self.heartbeats += 1
+        return True
+
+
+    async def save_page(self, job_id, token, page, items, pages_done, pages, found):
+        job = self.jobs[job_id]
+
+        if not self.owns(job_id, token):
+            return False
+
+        new = {(job_id, item['id']) for item in items} - set(self.items)
+        self.items.update(dict.fromkeys(new, page))
+
+        job.pages_done, job.pages, job.found = max(job.pages_done, pages_done), pages, found
+        job.items_count += len(new)
+
+        if self.cancel_after is not None and len({p for p in self.items.values()}) >= self.cancel_after:
+            job.status = 'cancelled'
+
+        return True
+
+
+    async def finish(self, job_id, token, status, error=None):
+        if self.owns(job_id, token):
+            self.jobs[job_id].status, self.jobs[job_id].error = status, error
+
+
+    async def release(self, job_id, token):
+        if self.owns(job_id, token):
+            self.jobs[job_id].status, self.jobs[job_id].claimed_by = 'pending', None
+
+
+def crawl_job(job_id, query_params, pages=None, found=None, pages_done=0):
+    return CrawlJob(
+        id=job_id, status='pending', query_params=query_params, pages=pages, found=found, pages_done=pages_done, items_count=0
+    )
+
+
+@pytest.mark.asyncio
+async def test_crawler_saves_every_page_and_resumes(stub_backed_app):
+    settings = CrawlerSettings(per_page=50, page_concurrency=3)
+
+    # rust: 237 вакансий у заглушки - 5 страниц по 50
+    full = crawl_job(1, {'text': 'rust'})
+    store = MemoryJobStore([full])
+    pool = CrawlerPool(stub_backed_app.state.hh_client, store, settings)
+
+    assert await pool.run(await store.claim()) == 'done'
+    assert (full.status, full.pages, full.pages_done, full.items_count, full.found) == ('done', 5, 5, 237, 237)
+    assert pool.pages_fetched == 5
+
+    # после перезапуска: первые 3 страницы уже в базе, обход продолжается с четвертой
+    resumed = crawl_job(2, {'text': 'rust'}, pages=5, found=237, pages_done=3)
+    store = MemoryJobStore([resumed])
+    pool = CrawlerPool(stub_backed_app.state.hh_client, store, settings)
+
+    assert await pool.run(await store.claim()) == 'done'
+    assert (resumed.pages_done, sorted(set(store.items.values())), pool.pages_fetched) == (5, [3, 4], 2)
+
+    # выдача глубже 2000 вакансий не запрашивается; отмена останавливает обход
+    capped = crawl_job(3, {'text': 'python'})
+    store = MemoryJobStore([capped])
+    store.cancel_after = 2
+    pool = CrawlerPool(stub_backed_app.state.hh_client, store, CrawlerSettings(per_page=100, page_concurrency=1))
+
+    assert await pool.run(await store.claim()) == 'cancelled'
+    assert (capped.status, capped.pages, capped.pages_done) == ('cancelled', 20, 2)
+
+
+@pytest.mark.asyncio
+async def test_crawler_heartbeat_and_lost_lease():
+    settings = CrawlerSettings(per_page=50, page_concurrency=1, heartbeat_interval=0.01)
+    release = asyncio.Event()
+
+    async def slow_page(query_params, page):
+        await release.wait()
+        return {'pages': 2, 'found': 2, 'items': [{'id': str(page)}]}
+
+    # медленная страница: отметка обновляется отдельной задачей, пока страница не получена
+    job = crawl_job(1, {'text': 'rust'})
+    store = MemoryJobStore([job])
+    pool = CrawlerPool(httpx.AsyncClient(), store, settings)
+    pool.fetch_page = slow_page
+
+    run = asyncio.ensure_future(pool.run(await store.claim()))
+    await asyncio.sleep(0.05)
+    assert store.heartbeats >= 2 and not run.done()
+
+    release.set()
+    assert await run == 'done'
+    assert (job.status, job.pages_done, job.items_count, pool.leases_lost) == ('done', 2, 2, 0)
+
+    # задание забрал другой воркер: прежний останавливается, его страницы и статус не записываются
+    release.clear()
+    job = crawl_job(2, {'text': 'rust'})
+    store = MemoryJobStore([job])
+    pool = CrawlerPool(httpx.AsyncClient(), store, settings)
+    pool.fetch_page = slow_page
+
+    run = asyncio.ensure_future(pool.run(await store.claim()))
+    await asyncio.sleep(0.02)
+    job.claimed_by = 'other-worker'
+
+    assert await asyncio.wait_for(run, 1) == 'cancelled'
+    assert (job.status, job.claimed_by, job.pages_done, store.items, pool.leases_lost) == ('running', 'other-worker', 0, {}, 1)
+    assert not pool.running
+
+    release.set()
+    assert not await store.save_page(2, 'token-1', 0, [{'id': '0'}], 1, 2, 2)
+    await store.finish(2, 'token-1', 'failed')
+    assert job.status == 'running'
+
+
+@pytest.mark.asyncio
+async def test_create_crawl_job_over_limit(scripted_app):
+    app, _ = scripted_app
+
+    class FullStore:
+        async def create(self, user_id, query_params):
+            raise TooManyCrawlJobs(user_id)
+
+    app.dependency_overrides[get_crawl_job_store] = FullStore
+    app.dependency_overrides[get_crawler_pool] = lambda: None
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app), base_url='http://test') as client:
+            response = await client.post('/authenticated/crawl_jobs', params={'text': 'python'})
+            assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+    finally:
+        app.dependency_overrides.pop(get_crawl_job_store)
+        app.dependency_overrides.pop(get_crawler_pool)
+
+
+@pytest.mark.asyncio
+async def test_singleflight_shares_one_call():
+    flight = SingleFlight()
+    release = asyncio.Event()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await release.wait()
+        return 'ok'
+
+    # одновременные вызовы с одним ключом - один вызов fn, результат у всех
+    waiters = [asyncio.ensure_future(flight.do('key', fetch)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == ['ok'] * 5
+    assert len(calls) == 1 and flight.stats() == {'in_flight': 0, 'leaders': 1, 'followers': 4}
+
+    # после завершения ключ забыт: следующий вызов идет заново
+    assert await flight.do('key', fetch) == 'ok' and len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_singleflight_leader_cancelled_followers_get_result():
+    flight = SingleFlight()
+    release = asyncio.Event()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await release.wait()
+        return 'ok'
+
+    leader = asyncio.ensure_future(flight.do('key', fetch))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(flight.do('key', fetch))
+    await asyncio.sleep(0)
+
+    # клиент лидера отключился - общий вызов продолжается для второго
+    leader.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await follower == 'ok' and len(calls) == 1
+
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+    # отменились все ожидающие - отменяется и сам вызов
+    release.clear()
+    cancelled = asyncio.Event()
+
+    async def slow():
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    only = asyncio.ensure_future(flight.do('other', slow))
+    await asyncio.sleep(0)
+    only.cancel()
+
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert flight.stats()['in_flight'] == 0
+
+
+@pytest.mark.asyncio
+async def test_singleflight_exception_reaches_all_waiters():
+    flight = SingleFlight()
+    release = asyncio.Event()
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await release.wait()
+        raise ValueError('hh недоступен')
+
+    waiters = [asyncio.ensure_future(flight.do('key', fail)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert len(calls) == 1 and all(isinstance(r, ValueError) for r in results)
+    assert flight.stats()['in_flight'] == 0
+
+
+def stub_response(status_code, data):
+    # тело потоком, как из сети: ответ с content= считается уже прочитанным, и aiter_raw на нем падает
+    return httpx.Response(status_code, headers={'content-type': 'application/json'}, stream=httpx.ByteStream(json.dumps(data).encode()))
+
+
+class ScriptedStubTransport(httpx.AsyncBaseTransport):
+    '''
+    hh_stub с записью запросов и сценарием: страницы из fail_pages отвечают 500, вакансии из missing_ids - 404, а первая вакансия
+    страницы 1 заменяется первой вакансией страницы 0 (вакансия "съехала" на страницу ниже)
+    '''
+    def __init__(self):
+        self._transport = ASGITransport(hh_stub_app)
+        self.requests = []
+        self.fail_pages = set()
+        self.missing_ids = set()  # /vacancies/{id} с этими id отвечают 404
+        self.shift_page = False
+        self._first_id = None
+
+
+    async def handle_async_request(self, request):
+        page = int(request.url.params.get('page', 0))
+        self.requests.append((request.url.path, page))
+
+        if request.url.path == '/vacancies' and page in self.fail_pages:
+            return stub_response(500, {'errors': [{'type': 'server_error'}]})
+
+        if request.url.path.rpartition('/')[2] in self.missing_ids:
+            return stub_response(404, {'errors': [{'type': 'not_found'}]})
+
+        response = await self._transport.handle_async_request(request)
+
+        if request.url.path != '/vacancies' or not self.shift_page:
+            return response
+
+        await response.aread()
+        data = json.loads(response.content)
+
+        if page == 0:
+            self._first_id = data['items'][0]['id']
+        elif page == 1:
+            data['items'][0]['id'] = self._first_id
+
+        return stub_response(response.status_code, data)
+
+
+    def pages(self, path='/vacancies'):
+        return sorted(page for request_path, page in self.requests if request_path == path)
+
+
+@pytest_asyncio.fixture
+async def scripted_app(stub_backed_app):
+    '''stub_backed_app, где API HH - ScriptedStubTransport, а пользователь уже вошел'''
+    await stub_backed_app.state.hh_client.aclose()
+
+    transport = ScriptedStubTransport()
+    stub_backed_app.state.hh_client = create_hh_client(
+        rate_limiter=stub_backed_app.state.hh_rate_limiter, breaker=stub_backed_app.state.hh_breaker,
+        hedger=stub_backed_app.state.hh_hedger, transport=transport
+    )
+    stub_backed_app.dependency_overrides[get_current_auth_user] = lambda: User(id=1, username='test', email='test@test.ru')
+
+    yield stub_backed_app, transport
+
+    stub_backed_app.dependency_overrides.pop(get_current_auth_user)
+
+
+@pytest.mark.asyncio
+async def test_get_all_vacancies_fans_out_pages(scripted_app):
+    app, transport = scripted_app
+    transport.shift_page = True
+
+    async with AsyncClient(transport=ASGITransport(app), base_url='http://test') as client:
+        # page_to: страницы 0..3, повтор вакансии на стыке страниц отбрасывается
+        response = await client.get('/authenticated/get_vacancies/all', params={'text': 'python', 'per_page': 20, 'page_to': 3})
+        assert response.status_code == status.HTTP_200_OK
+
+        data = response.json()
+        ids = [item['id'] for item in data['items']]
+        assert transport.pages() == [0, 1, 2, 3] and (data['page_from'], data['page_to']) == (0, 3)
+        assert len(ids) == len(set(ids)) == 79
+
+        # max_items: запрашивается столько страниц, сколько нужно, лишнее обрезается
+        transport.requests.clear()
+        response = await client.get('/authenticated/get_vacancies/all', params={'text': 'java', 'per_page': 20, 'max_items': 50})
+        assert transport.pages() == [0, 1, 2] and len(response.json()['items']) == 50
+
+        # без ограничений - не глубже 2000 вакансий, которые отдает HH
+        transport.requests.clear()
+        response = await client.get('/authenticated/get_vacancies/all', params={'text': 'scala', 'per_page': 100})
+        assert response.json()['found'] > 2000
+        assert transport.pages() == list(range(20)) and len(response.json()['items']) == 1999
+
+        # ошибка HH на одной странице - ошибка всего запроса; повтор берет удачные страницы из кэша
+        transport.requests.clear()
+        transport.shift_page, transport.fail_pages = False, {2}
+        params = {'text': 'go', 'per_page': 20, 'page_to': 3}
+
+        response = await client.get('/authenticated/get_vacancies/all', params=params)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 2 in transport.pages()
+
+        transport.requests.clear()
+        transport.fail_pages = set()
+
+        response = await client.get('/authenticated/get_vacancies/all', params=params)
+        assert response.status_code == status.HTTP_200_OK and len(response.json()['items']) == 80
+        assert 0 not in transport.pages() and 2 in transport.pages()
+
+
+@pytest.mark.asyncio
+async def test_get_all_vacancies_rejects_bad_limits(scripted_app):
+    app, transport = scripted_app
+
+    async with AsyncClient(transport=ASGITransport(app), base_url='http://test') as client:
+        # отрицательный max_items, отрицательная или меньше page последняя страница - 422, до запросов к HH
+        for params in ({'max_items': -5}, {'max_items': 0}, {'page_to': -1}, {'page': 3, 'page_to': 1}):
+            response = await client.get('/authenticated/get_vacancies/all', params={'text': 'python', **params})
+            assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY, params
+
+        assert transport.requests == []
+
+        response = await client.get('/authenticated/get_vacancies/all', params={'text': 'python', 'page': 1, 'page_to': 1})
+        assert response.status_code == status.HTTP_200_OK
+        assert (response.json()['page_from'], response.json()['page_to']) == (1, 1) and transport.pages() == [1]
+
+
+
+@pytest.mark.asyncio
+async def test_vacancy_details_cached_per_id(scripted_app):
+    app, transport = scripted_app
+    transport.missing_ids = {'404'}
+
+    async with AsyncClient(transport=ASGITransport(app), base_url='http://test') as client:
+        # повтор id в запросе - один запрос к HH; удаленная вакансия - в not_found, а не ошибка всего запроса
+        response = await client.post('/authenticated/get_vacancies/details', json={'ids': ['101', '102', '101', '404']})
+        assert response.status_code == status.HTTP_200_OK
+
+        data = response.json()
+        assert [item['id'] for item in data['items']] == ['101', '102'] and data['not_found'] == ['404']
+        assert sorted(path for path, _ in transport.requests) == ['/vacancies/101', '/vacancies/102', '/vacancies/404']
+
+        # описания кэшируются по одному id: к HH идет только новый
+        transport.requests.clear()
+        response = await client.post('/authenticated/get_vacancies/details', json={'ids': ['102', '103']})
+
+        assert [item['id'] for item in response.json()['items']] == ['102', '103']
+        assert [path for path, _ in transport.requests] == ['/vacancies/103']
+        assert app.state.vacancy_details_cache.stats()['hits'] >= 1
+
+
+
+class GzipStubTransport(httpx.AsyncBaseTransport):
+    '''hh_stub, который, как настоящий HH, отвечает gzip-сжатым телом'''
+    def __init__(self):
+        self._transport = ASGITransport(hh_stub_app)
+
+
+    async def handle_async_request(self, request):
+        response = await self._transport.handle_async_request(request)
+        await response.aread()
+
+        headers = {'content-type': response.headers['content-type'], 'content-encoding': 'gzip'}
+        return httpx.Response(response.status_code, headers=headers, stream=httpx.ByteStream(gzip.compress(response.content)))
+
+
+@pytest.mark.asyncio
+async def test_gzip_upstream_parsed_once(stub_backed_app):
+    hh_client = create_hh_client(transport=GzipStubTransport())
+
+    try:
+        upstream, size = await fetch_upstream(hh_client, '/vacancies', [('text', 'python'), ('per_page', 5)])
+    finally:
+        await hh_client.aclose()
+
+    assert upstream.content_encoding == 'gzip' and size == len(upstream.content)
+    assert upstream.summary().startswith('status=200 ') and 'encoding=gzip' in upstream.summary()
+
+    data = upstream.json()
+    assert len(data['items']) == 5 and upstream.json() is data  # распаковано и разобрано один раз
+    assert json.loads(upstream.body()) == data
+
+    # passthrough: клиенту, принимающему gzip, уходят те же сжатые байты, остальным - распакованные
+    assert upstream.to_response('gzip, br').body == upstream.content
+    assert upstream.to_response('').body == upstream.body()
+
+
+class FakeClock:
+    '''часы для TokenBucket: sleep не ждет, а сдвигает время и запоминает паузу'''
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+
+    def __call__(self):
+        return self.now
+
+
+    async def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 3))
+        self.now += seconds
+        await asyncio.sleep(0)
+
+
+class ScriptedResponses(httpx.AsyncBaseTransport):
+    '''отвечает по очереди заданными (статус, заголовки)'''
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+
+    async def handle_async_request(self, request):
+        status_code, headers = self.responses[min(self.calls, len(self.responses) - 1)]
+        self.calls += 1
+        return httpx.Response(status_code, headers=headers)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_until_deadline():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=1, clock=clock, sleep=clock.sleep)
+
+    await bucket.acquire(clock.now + 1)
+    assert clock.sleeps == []
+
+    # следующий токен через 0.5s: в дедлайн 1s укладывается, в 0.25s - нет
+    await bucket.acquire(clock.now + 1)
+    assert clock.sleeps == [0.5]
+
+    with pytest.raises(RateLimitExceeded):
+        await bucket.acquire(clock.now + 0.25)
+
+    # Retry-After от HH останавливает выдачу токенов для всех запросов
+    bucket.pause(5)
+    with pytest.raises(RateLimitExceeded):
+        await bucket.acquire(clock.now + 4)
+
+    await bucket.acquire(clock.now + 6)
+    assert clock.sleeps[-1] == 5.0
+    assert (bucket.stats()['acquired'], bucket.stats()['rejected']) == (3, 2)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('3') == 3.0 and parse_retry_after('0.5') == 0.5 and parse_retry_after('-1') == 0.0
+    assert parse_retry_after(format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)) == pytest.approx(30, abs=2)
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0  # дата в прошлом - можно сразу
+    assert parse_retry_after('скоро') is None and parse_retry_after(None) is None
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_transport_retries():
+    settings = RateLimitSettings(queue_timeout=30, max_retries=3, backoff_base=1, backoff_max=2)
+    request = httpx.Request('GET', 'http://hh.test/vacancies')
+
+    # без Retry-After - экспоненциальный backoff, ограниченный backoff_max; после max_retries отдается последний ответ
+    clock = FakeClock()
+    inner = ScriptedResponses((503, {}))
+    transport = RateLimitedTransport(inner, TokenBucket(rate=100, burst=10, clock=clock, sleep=clock.sleep), settings)
+
+    response = await transport.handle_async_request(request)
+    assert (response.status_code, inner.calls, len(clock.sleeps)) == (503, 4, 3)
+    assert all(0 <= delay <= settings.backoff_max for delay in clock.sleeps)
+    assert all(transport._backoff(attempt) <= settings.backoff_max for attempt in range(20) for _ in range(50))
+
+    # Retry-After в секундах и HTTP-датой - пауза ровно на столько, и лимитер на паузе для всех
+    clock = FakeClock()
+    retry_at = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60), usegmt=True)
+    inner = ScriptedResponses((429, {'Retry-After': '4'}), (503, {'Retry-After': retry_at}), (200, {}))
+    bucket = TokenBucket(rate=100, burst=10, clock=clock, sleep=clock.sleep)
+    transport = RateLimitedTransport(inner, bucket, RateLimitSettings(queue_timeout=90, max_retries=3))
+
+    response = await transport.handle_async_request(request)
+    assert response.status_code == 200 and inner.calls == 3
+    assert clock.sleeps[0] == 4.0 and clock.sleeps[1] == pytest.approx(60, abs=2) and bucket.pauses == 2
+
+    # пауза длиннее queue_timeout - повтора нет, отдается ответ HH
+    clock = FakeClock()
+    inner = ScriptedResponses((429, {'Retry-After': '120'}), (200, {}))
+    transport = RateLimitedTransport(inner, TokenBucket(rate=100, burst=10, clock=clock, sleep=clock.sleep), settings)
+
+    assert (await transport.handle_async_request(request)).status_code == 429 and inner.calls == 1
+
+    # а следующий запрос не дожидается паузы лимитера: RateLimitExceeded
+    with pytest.raises(RateLimitExceeded):
+        await transport.handle_async_request(request)
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_rejection_is_503(stub_backed_app):
+    stub_backed_app.state.hh_rate_limiter.pause(3600)
+
+    async with AsyncClient(transport=ASGITransport(stub_backed_app), base_url='http://test') as client:
+        response = await client.get('/get_vacancies', params={'text': 'haskell'})
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE and response.headers['retry-after'] == '1'
+    assert stub_backed_app.state.hh_rate_limiter.stats()['rejected'] == 1
+
+
+def test_circuit_breaker_transitions():
+    clock = FakeClock()
+    settings = CircuitBreakerSettings(
+        min_calls=4, failure_rate=0.5, slow_call_seconds=5, slow_call_rate=0.5, open_seconds=10, half_open_calls=1
+    )
+    breaker = CircuitBreaker(settings, clock=clock)
+
+    # доля ошибок в окне достигла порога - открыт, вызовы отклоняются сразу
+    for failed in (False, True, False, True):
+        breaker.before_call()
+        breaker.record(failed, 0.1)
+
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+    # через open_seconds - один пробный вызов; неудачный снова открывает
+    clock.now += 10
+    breaker.before_call()
+    assert breaker.state == 'half_open'
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record(True, 0.1)
+    assert breaker.state == 'open' and breaker.opened == 2
+
+    # удачный пробный вызов закрывает, окно начинается заново
+    clock.now += 10
+    breaker.before_call()
+    breaker.record(False, 0.1)
+    assert breaker.state == 'closed' and breaker.stats()['window_calls'] == 0
+
+    # медленные ответы без ошибок тоже открывают; старые вызовы выходят из окна
+    for latency in (6, 0.1, 7, 0.1):
+        breaker.record(False, latency)
+
+    assert breaker.state == 'open' and breaker.stats()['window_slow'] == 2
+
+    clock.now += settings.window + 1
+    assert breaker.stats()['window_calls'] == 0
+
+
+@pytest.mark.asyncio
+async def test_breaker_measures_only_network_attempt():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=0.2, burst=1, clock=clock, sleep=clock.sleep)
+    breaker = CircuitBreaker(CircuitBreakerSettings(min_calls=1, slow_call_seconds=5, slow_call_rate=0.5), clock=clock)
+    inner = ScriptedResponses((200, {}))
+
+    async with create_hh_client(rate_limiter=bucket, breaker=breaker, transport=inner) as hh_client:
+        # второй запрос 5s ждет токен в очереди лимитера - это не медленный ответ HH
+        for _ in range(2):
+            assert (await hh_client.get('/vacancies')).status_code == 200
+
+        assert clock.sleeps == [5.0]
+        assert (breaker.state, breaker.stats()['window_calls'], breaker.stats()['window_slow']) == ('closed', 2, 0)
+
+        # отказ лимитера не ошибка API HH
+        bucket.pause(60)
+        with pytest.raises(RateLimitExceeded):
+            await hh_client.get('/vacancies')
+
+        assert breaker.stats()['window_failures'] == 0 and inner.calls == 2
+
+        # открытый breaker отказывает до очереди лимитера: токен не тратится
+        breaker._open(clock(), 'тест')
+        acquired = bucket.acquired
+
+        with pytest.raises(CircuitOpenError):
+            await hh_client.get('/vacancies')
+
+        assert bucket.acquired == acquired and bucket.stats()['waiting'] == 0
+
+
+class SlowFirstAttempt(httpx.AsyncBaseTransport):
+    '''первая попытка висит, пока ее не отменят или не отпустят; остальные отвечают сразу'''
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.cancelled = asyncio.Event()
+
+
+    async def handle_async_request(self, request):
+        self.calls += 1
+
+        if self.calls == 1:
+            try:
+                await self.release.wait()
+            except asyncio.CancelledError:
+                self.cancelled.set()
+                raise
+
+            return httpx.Response(200, headers={'x-attempt': '1'})
+
+        return httpx.Response(200, headers={'x-attempt': str(self.calls)})
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_cancels_loser():
+    hedger = Hedger(HedgingSettings(enabled=True, min_samples=1, min_delay=0.01))
+    hedger.observe(0.01)
+    request = httpx.Request('GET', 'http://hh.test/vacancies')
+
+    # первая попытка не ответила за задержку хеджирования - побеждает вторая, первая отменяется
+    inner = SlowFirstAttempt()
+    transport = HedgingTransport(inner, hedger, TokenBucket(rate=100, burst=10))
+
+    response = await transport.handle_async_request(request)
+    assert response.headers['x-attempt'] == '2' and (hedger.hedged, hedger.hedge_wins) == (1, 1)
+    await asyncio.wait_for(inner.cancelled.wait(), 1)
+
+    # свободного токена нет - вторая попытка не отправляется, ждем первую
+    bucket = TokenBucket(rate=100, burst=10)
+    bucket.pause(60)
+    inner = SlowFirstAttempt()
+    transport = HedgingTransport(inner, hedger, bucket)
+
+    attempt = asyncio.ensure_future(transport.handle_async_request(request))
+    await asyncio.sleep(0.05)
+    inner.release.set()
+
+    assert (await attempt).headers['x-attempt'] == '1'
+    assert (inner.calls, hedger.hedged, hedger.skipped) == (1, 1, 1)
\ No newline at end of file